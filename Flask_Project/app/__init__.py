@@ -1,27 +1,75 @@
+import os
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from sqlalchemy import text, inspect as sqlalchemy_inspect
+from .routing import RoutingSession, init_routing
 
-db     = SQLAlchemy()
+db     = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 
-def create_app(config_name=None): # Added optional argument
+def create_app(config_name=None):
+    """
+    Build the app with a profile from config.config_profiles: 'production'
+    (default), 'onprem', 'sqlite' or 'testing'. Without an argument the
+    APP_CONFIG environment variable picks the profile.
+    """
+    timings = {}
+    started = phase_start = time.perf_counter()
+
+    def phase(name):
+        nonlocal phase_start
+        now = time.perf_counter()
+        timings[name] = round((now - phase_start) * 1000, 1)
+        phase_start = now
+
+    from config import config_profiles
+    config_name = config_name or os.environ.get('APP_CONFIG', 'production')
+    if config_name not in config_profiles:
+        raise ValueError(f"Unknown config profile '{config_name}'; choose from {', '.join(config_profiles)}.")
+
     app = Flask(__name__)
-    app.config.from_object('config.Config')
+    app.config.from_object(config_profiles[config_name])
+    phase('config')
 
     # allow only your front-end origin
     CORS(app, resources={r"/*": {"origins": ["https://bvp.scrape.ink", "https://www.attendance.scrape.ink"]}})
 
     # Import models here so they are registered with SQLAlchemy
     from .models import Student, Staff, Subject, Department, Batch, Assignment, AttendanceRecord, TotalLectures, HOD
-    
+
+    # Ping pooled connections only after they sat idle, and time pool waits
+    from .pool_health import configure_pool, init_pool_health
+    configure_pool(app)
     db.init_app(app)
     bcrypt.init_app(app)
+    init_pool_health(app, db)
+
+    # WAL and tuned pragmas on every SQLite connection
+    from .dialects import init_sqlite
+    init_sqlite(app)
 
+    # Fast JSON encoding and gzip/brotli for large payloads (reports, grids)
+    from .serialization import init_json
+    from .compression import init_compression
+    init_json(app)
+    init_compression(app)
+
+    # Send opted-in GET report/listing queries to the read replica, if configured
+    init_routing(app, db)
+
+    # Count repeated SQL per request to catch N+1 patterns (debug/testing)
+    from .querylog import init_query_detector
+    init_query_detector(app, db)
+    phase('extensions')
+
+    # Skips create_all (a round trip per table) when the stored schema revision matches
+    from .schema import ensure_schema
     with app.app_context():
-        db.create_all()
+        schema_status = ensure_schema(app, db)
+    phase('schema')
 
     # --- register your blueprints ---
     from .routes.admin import admin_bp
@@ -34,4 +82,21 @@ def create_app(config_name=None): # Added optional argument
     app.register_blueprint(main_bp,    url_prefix='')
     app.register_blueprint(hod_bp,     url_prefix='/hod')
 
+    from .partitions import partitions_cli
+    app.cli.add_command(partitions_cli)
+    from .archive import archive_cli
+    app.cli.add_command(archive_cli)
+    from .bitsets import bitsets_cli
+    app.cli.add_command(bitsets_cli)
+    from .search import search_cli
+    app.cli.add_command(search_cli)
+    phase('blueprints')
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    app.extensions['startup_timings'] = timings
+    app.logger.info(
+        "Startup in %.1f ms (%s; schema %s)", timings['total'],
+        ', '.join(f"{k} {v} ms" for k, v in timings.items() if k != 'total'), schema_status
+    )
+
     return app
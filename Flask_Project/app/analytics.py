@@ -0,0 +1,298 @@
+"""
+In-memory attendance analytics on dense NumPy arrays.
+
+`load_matrix` pulls one batch's (or one department's) students, assignments,
+attended sums and lecture totals in a fixed number of grouped queries and
+lays them out as
+
+    attended[student, assignment]     lectures attended ('present' only)
+    applicable[student, assignment]   the assignment counts for that student
+    totals[assignment]                lectures held
+
+Percentages, thresholds and rankings for every (subject, lecture_type) group
+are then a couple of matrix products instead of a query per student, which
+is what `admin.get_attendance_report` does today (see bench_analytics.py).
+Bitset sessions and archived terms are folded in through `extra_sums`, like the reports.
+
+With `with_slots=True` a second matrix, slot_attended[student, slot], holds
+attendance per lecture slot (assignment, date) for cumulative trends.
+"""
+from collections import namedtuple
+
+from . import db
+from .archive import archived_records
+from .bitsets import session_records
+from .models import Assignment, AttendanceRecord, Batch, Department, Student, Subject, TotalLectures, student_batches
+from .optional import require
+from .reports import extra_sums, filter_dates, LECTURE_TYPE_ORDER
+
+StudentRow = namedtuple('StudentRow', 'id roll_no enrollment_no name batch_id batch_number')
+AssignmentRow = namedtuple('AssignmentRow', 'id batch_id subject_id lecture_type batch_number')
+
+
+def _numpy():
+    return require('numpy', 'Attendance analytics')
+
+
+class AttendanceMatrix:
+    """Dense attendance for a set of students and assignments (see module docstring)."""
+
+    def __init__(self, students, assignments, attended, applicable, totals, slots=None, slot_attended=None, slot_totals=None):
+        self.students = students
+        self.assignments = assignments
+        self.attended = attended
+        self.applicable = applicable
+        self.totals = totals
+        self.slots = slots or []
+        self.slot_attended = slot_attended
+        self.slot_totals = slot_totals
+
+    # --- Grouping ---
+
+    def groups(self):
+        """(subject_id, lecture_type) keys in report order, and the assignment x group one-hot matrix."""
+        np = _numpy()
+        keys = sorted({(a.subject_id, a.lecture_type) for a in self.assignments},
+                      key=lambda k: (k[0], LECTURE_TYPE_ORDER.get(k[1], 99)))
+        index = {k: i for i, k in enumerate(keys)}
+        one_hot = np.zeros((len(self.assignments), len(keys)), dtype=np.int64)
+        if self.assignments:
+            one_hot[np.arange(len(self.assignments)),
+                    [index[(a.subject_id, a.lecture_type)] for a in self.assignments]] = 1
+        return keys, one_hot
+
+    def group_sums(self):
+        """attended[student, group], total[student, group] and the group keys."""
+        keys, one_hot = self.groups()
+        attended = (self.attended * self.applicable) @ one_hot
+        total = (self.applicable * self.totals) @ one_hot
+        return attended, total, keys
+
+    # --- Metrics ---
+
+    @staticmethod
+    def percentage(attended, total):
+        """Element-wise attended/total * 100, rounded to 2 places; 0 where nothing was held."""
+        np = _numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(total > 0, attended / np.maximum(total, 1) * 100, 0.0)
+        return np.round(pct, 2)
+
+    def overall(self):
+        """Per-student attended, total and percentage over every applicable assignment."""
+        attended = (self.attended * self.applicable).sum(axis=1)
+        total = (self.applicable * self.totals).sum(axis=1)
+        return attended, total, self.percentage(attended, total)
+
+    def below(self, threshold):
+        """Boolean [student, group] mask of groups under the threshold (groups with no lectures excluded)."""
+        attended, total, _ = self.group_sums()
+        return (total > 0) & (self.percentage(attended, total) < threshold)
+
+    def rank(self, descending=True):
+        """
+        Competition rank (1, 2, 2, 4, ...) of every student by overall
+        percentage; students with no lectures share the last rank.
+        """
+        np = _numpy()
+        _, total, pct = self.overall()
+        score = np.where(total > 0, pct, -1.0)
+        if descending:
+            score = -score
+        order = np.argsort(score, kind='stable')
+        ranks = np.empty(len(score), dtype=np.int64)
+        sorted_scores = score[order]
+        first = np.r_[True, sorted_scores[1:] != sorted_scores[:-1]]
+        ranks[order] = np.maximum.accumulate(np.where(first, np.arange(1, len(score) + 1), 0))
+        return ranks
+
+    def trend(self):
+        """
+        Cumulative overall percentage per student after each lecture day:
+        (days, pct[student, day]). Requires `with_slots=True`.
+        """
+        np = _numpy()
+        if self.slot_attended is None:
+            raise ValueError('Load the matrix with with_slots=True to compute trends.')
+        days = sorted({day for _, day in self.slots})
+        day_index = np.array([days.index(day) for _, day in self.slots], dtype=np.int64)
+        by_day = np.zeros((len(self.slots), len(days)), dtype=np.int64)
+        by_day[np.arange(len(self.slots)), day_index] = 1
+        attended = np.cumsum(self.slot_attended @ by_day, axis=1)
+        total = np.cumsum(self.slot_totals @ by_day, axis=1)
+        return days, self.percentage(attended, total)
+
+    # --- Output ---
+
+    def report_rows(self, subject_id, lecture_type):
+        """Rows shaped exactly like admin.get_attendance_report for one group."""
+        np = _numpy()
+        selected = np.array([a.subject_id == subject_id and a.lecture_type == lecture_type
+                             for a in self.assignments], dtype=bool)
+        if not selected.any():
+            return []
+        applicable = self.applicable & selected
+        attended = (self.attended * applicable).sum(axis=1)
+        total = (applicable * self.totals).sum(axis=1)
+        pct = self.percentage(attended, total)
+        return [
+            {
+                'student_id': s.id,
+                'name': s.name,
+                'roll_no': s.roll_no,
+                'attended_lectures': int(attended[i]),
+                'total_lectures': int(total[i]),
+                'percentage': float(pct[i]),
+            }
+            for i, s in enumerate(self.students)
+            if lecture_type == 'TH' or s.batch_number is not None
+        ]
+
+    def summary(self, threshold=75.0):
+        """Columnar summary: per-group percentages, defaulter counts and overall ranking."""
+        attended, total, keys = self.group_sums()
+        pct = self.percentage(attended, total)
+        below = (total > 0) & (pct < threshold)
+        overall_attended, overall_total, overall_pct = self.overall()
+        return {
+            'threshold': threshold,
+            'groups': [{'subject_id': s, 'lecture_type': t} for s, t in keys],
+            'students': {
+                'id': [s.id for s in self.students],
+                'roll_no': [s.roll_no for s in self.students],
+                'name': [s.name for s in self.students],
+            },
+            'attended': attended.tolist(),
+            'total': total.tolist(),
+            'percentage': pct.tolist(),
+            'below_threshold': below.sum(axis=0).tolist(),
+            'overall': {
+                'attended': overall_attended.tolist(),
+                'total': overall_total.tolist(),
+                'percentage': overall_pct.tolist(),
+                'rank': self.rank().tolist(),
+            },
+        }
+
+
+def load_matrix(batch_id=None, dept_code=None, subject_id=None, lecture_type=None,
+                date_range=(None, None), with_slots=False):
+    """Build an AttendanceMatrix for one batch or a whole department."""
+    np = _numpy()
+    if batch_id is None and dept_code is None:
+        raise ValueError('load_matrix needs a batch_id or a dept_code.')
+
+    # --- Students (one row per batch membership) ---
+    students_query = db.session.query(
+        Student.id, Student.roll_no, Student.enrollment_no, Student.name,
+        student_batches.c.batch_id, Student.batch_number
+    ).join(student_batches, student_batches.c.student_id == Student.id)
+    if batch_id is not None:
+        students_query = students_query.filter(student_batches.c.batch_id == batch_id)
+    else:
+        students_query = students_query.join(Batch, Batch.id == student_batches.c.batch_id)\
+            .join(Department, Department.dept_name == Batch.dept_name)\
+            .filter(Department.dept_code == dept_code)
+    students = [StudentRow(*r) for r in students_query.order_by(student_batches.c.batch_id, Student.id).all()]
+
+    # --- Assignments ---
+    assignments_query = db.session.query(
+        Assignment.id, Assignment.batch_id, Assignment.subject_id, Assignment.lecture_type, Assignment.batch_number
+    )
+    if batch_id is not None:
+        assignments_query = assignments_query.filter(Assignment.batch_id == batch_id)
+    else:
+        assignments_query = assignments_query.join(Subject, Subject.id == Assignment.subject_id)\
+            .filter(Subject.dept_code == dept_code)
+    if subject_id is not None:
+        assignments_query = assignments_query.filter(Assignment.subject_id == subject_id)
+    if lecture_type is not None:
+        assignments_query = assignments_query.filter(Assignment.lecture_type == lecture_type)
+    assignments = [AssignmentRow(*r) for r in assignments_query.order_by(Assignment.id).all()]
+    assignment_ids = [a.id for a in assignments]
+
+    n_students, n_assignments = len(students), len(assignments)
+    attended = np.zeros((n_students, n_assignments), dtype=np.int64)
+    totals = np.zeros(n_assignments, dtype=np.int64)
+
+    # Theory applies to the whole batch, PR/TU only to the matching sub-batch
+    student_batch = np.array([s.batch_id for s in students], dtype=np.int64)
+    student_sub = np.array([s.batch_number if s.batch_number is not None else -1 for s in students], dtype=np.int64)
+    assignment_batch = np.array([a.batch_id for a in assignments], dtype=np.int64)
+    assignment_sub = np.array([a.batch_number if a.batch_number is not None else -2 for a in assignments], dtype=np.int64)
+    is_theory = np.array([a.lecture_type == 'TH' for a in assignments], dtype=bool)
+    applicable = (student_batch[:, None] == assignment_batch[None, :]) & \
+        (is_theory[None, :] | (student_sub[:, None] == assignment_sub[None, :]))
+
+    if not assignments or not students:
+        return AttendanceMatrix(students, assignments, attended, applicable, totals)
+
+    column = {aid: j for j, aid in enumerate(assignment_ids)}
+    rows_of = {}
+    for i, s in enumerate(students):
+        rows_of.setdefault(s.id, []).append(i)
+
+    # --- Lecture totals per assignment ---
+    total_rows = filter_dates(
+        db.session.query(TotalLectures.assignment_id, db.func.sum(TotalLectures.lecture_count))
+        .filter(TotalLectures.assignment_id.in_(assignment_ids)),
+        TotalLectures.date, date_range
+    ).group_by(TotalLectures.assignment_id).all()
+
+    # --- Attended per (student, assignment) ---
+    attended_rows = filter_dates(
+        db.session.query(AttendanceRecord.student_id, AttendanceRecord.assignment_id,
+                         db.func.sum(AttendanceRecord.lecture_count))
+        .filter(AttendanceRecord.assignment_id.in_(assignment_ids), AttendanceRecord.status == 'present'),
+        AttendanceRecord.date, date_range
+    ).group_by(AttendanceRecord.student_id, AttendanceRecord.assignment_id).all()
+
+    extra_totals, extra_attended = extra_sums(assignment_ids, date_range)
+    for aid, count in list(total_rows) + list(extra_totals.items()):
+        totals[column[aid]] += count or 0
+    extra = [(sid, aid, count) for (aid, sid), count in extra_attended.items()]
+    for sid, aid, count in list(attended_rows) + extra:
+        for i in rows_of.get(sid, ()):
+            attended[i, column[aid]] += count or 0
+
+    if not with_slots:
+        return AttendanceMatrix(students, assignments, attended, applicable, totals)
+
+    # --- Per-slot detail for trends ---
+    slot_total_rows = filter_dates(
+        db.session.query(TotalLectures.assignment_id, TotalLectures.date, TotalLectures.lecture_count)
+        .filter(TotalLectures.assignment_id.in_(assignment_ids)),
+        TotalLectures.date, date_range
+    ).all()
+    slot_record_rows = filter_dates(
+        db.session.query(AttendanceRecord.student_id, AttendanceRecord.assignment_id,
+                         AttendanceRecord.date, AttendanceRecord.lecture_count)
+        .filter(AttendanceRecord.assignment_id.in_(assignment_ids), AttendanceRecord.status == 'present'),
+        AttendanceRecord.date, date_range
+    ).all()
+    old_records, old_totals = archived_records(assignment_ids, date_range)
+    slot_total_rows = list(slot_total_rows) + [(t.assignment_id, t.date, t.lecture_count) for t in old_totals]
+    slot_record_rows = list(slot_record_rows) + [(r.student_id, r.assignment_id, r.date, r.lecture_count)
+                                                 for r in old_records + session_records(assignment_ids, date_range)
+                                                 if r.status == 'present']
+
+    slots = sorted({(aid, day) for aid, day, _ in slot_total_rows}, key=lambda s: (s[1], s[0]))
+    slot_index = {s: k for k, s in enumerate(slots)}
+    slot_assignment = np.array([column[aid] for aid, _ in slots], dtype=np.int64)
+    held = np.zeros(len(slots), dtype=np.int64)
+    for aid, day, count in slot_total_rows:
+        held[slot_index[(aid, day)]] += count or 0
+    # Lectures held per slot, counted only for students the slot's assignment applies to
+    slot_applicable = applicable[:, slot_assignment] if slots else np.zeros((n_students, 0), dtype=bool)
+    slot_totals = slot_applicable * held
+    slot_attended = np.zeros((n_students, len(slots)), dtype=np.int64)
+    for sid, aid, day, count in slot_record_rows:
+        k = slot_index.get((aid, day))
+        if k is None:
+            continue
+        for i in rows_of.get(sid, ()):
+            slot_attended[i, k] += count or 0
+    slot_attended *= slot_applicable
+
+    return AttendanceMatrix(students, assignments, attended, applicable, totals,
+                            slots=slots, slot_attended=slot_attended, slot_totals=slot_totals)
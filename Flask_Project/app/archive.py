@@ -0,0 +1,285 @@
+"""
+Columnar archive for closed terms.
+
+A closed term's attendance never changes, so it is moved out of the OLTP
+tables into three compressed NumPy archives per term under ARCHIVE_DIR:
+
+    <ARCHIVE_DIR>/<term>/attendance_records.npz   id, assignment_id, student_id, day, present, lecture_count
+    <ARCHIVE_DIR>/<term>/total_lectures.npz       id, assignment_id, day, lecture_count
+    <ARCHIVE_DIR>/<term>/attendance_bitsets.npz   assignment_id, day, lecture_count, roster, bits (+ offsets)
+
+(`day` is date.toordinal()). The report endpoints and the historical grid
+merge archived rows back in through `archived_records` / `archived_sums` /
+`archived_sessions`, so callers see the same numbers as before the move.
+
+    flask archive term "2024-25 ODD" --close
+    flask archive list
+"""
+import json
+import os
+import re
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from . import db
+from .cache import cache
+from .models import AttendanceBitset, AttendanceRecord, TotalLectures, Term
+from .optional import require, MissingDependency
+
+# Read-only stand-ins with the attributes the report code uses on the ORM rows
+ArchivedRecord = namedtuple('ArchivedRecord', 'assignment_id student_id date status lecture_count')
+ArchivedTotal = namedtuple('ArchivedTotal', 'assignment_id date lecture_count')
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+def _numpy():
+    # NumPy is only needed once a term is archived; keep app start-up free of it
+    try:
+        return require('numpy', 'The columnar archive')
+    except MissingDependency as e:
+        raise ArchiveError(str(e))
+
+
+def term_dir(term):
+    slug = re.sub(r'[^a-z0-9]+', '_', term.name.lower()).strip('_')
+    return os.path.join(current_app.config['ARCHIVE_DIR'], slug)
+
+
+def archive_term(term):
+    """
+    Export the term's attendance_records, total_lectures and
+    attendance_bitsets rows to the columnar archive, verify the files, then
+    delete the rows from the live tables. Returns a dict of row counts.
+    """
+    np = _numpy()
+    if term.archived_at is not None:
+        raise ArchiveError(f"Term '{term.name}' is already archived.")
+    if not term.is_closed:
+        raise ArchiveError(f"Term '{term.name}' is still open; close it before archiving.")
+
+    in_term = lambda column: column.between(term.start_date, term.end_date)
+
+    records = db.session.query(
+        AttendanceRecord.id, AttendanceRecord.assignment_id, AttendanceRecord.student_id,
+        AttendanceRecord.date, AttendanceRecord.status, AttendanceRecord.lecture_count
+    ).filter(in_term(AttendanceRecord.date)).all()
+    totals = db.session.query(
+        TotalLectures.id, TotalLectures.assignment_id, TotalLectures.date, TotalLectures.lecture_count
+    ).filter(in_term(TotalLectures.date)).all()
+    bitsets = db.session.query(
+        AttendanceBitset.assignment_id, AttendanceBitset.date, AttendanceBitset.lecture_count,
+        AttendanceBitset.roster, AttendanceBitset.bits
+    ).filter(in_term(AttendanceBitset.date)).all()
+
+    directory = term_dir(term)
+    os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(
+        os.path.join(directory, 'attendance_records.npz'),
+        id=np.array([r.id for r in records], dtype=np.int64),
+        assignment_id=np.array([r.assignment_id for r in records], dtype=np.int32),
+        student_id=np.array([r.student_id for r in records], dtype=np.int32),
+        day=np.array([r.date.toordinal() for r in records], dtype=np.int32),
+        present=np.array([r.status == 'present' for r in records], dtype=np.bool_),
+        lecture_count=np.array([r.lecture_count for r in records], dtype=np.int16),
+    )
+    np.savez_compressed(
+        os.path.join(directory, 'total_lectures.npz'),
+        id=np.array([t.id for t in totals], dtype=np.int64),
+        assignment_id=np.array([t.assignment_id for t in totals], dtype=np.int32),
+        day=np.array([t.date.toordinal() for t in totals], dtype=np.int32),
+        lecture_count=np.array([t.lecture_count for t in totals], dtype=np.int16),
+    )
+    # Variable-length blobs are stored concatenated, with offsets[i]:offsets[i + 1] per session
+    np.savez_compressed(
+        os.path.join(directory, 'attendance_bitsets.npz'),
+        assignment_id=np.array([b.assignment_id for b in bitsets], dtype=np.int32),
+        day=np.array([b.date.toordinal() for b in bitsets], dtype=np.int32),
+        lecture_count=np.array([b.lecture_count for b in bitsets], dtype=np.int16),
+        roster=np.frombuffer(b''.join(b.roster for b in bitsets), dtype=np.uint8),
+        roster_offsets=np.cumsum([0] + [len(b.roster) for b in bitsets], dtype=np.int64),
+        bits=np.frombuffer(b''.join(b.bits for b in bitsets), dtype=np.uint8),
+        bits_offsets=np.cumsum([0] + [len(b.bits) for b in bitsets], dtype=np.int64),
+    )
+    counts = {'attendance_records': len(records), 'total_lectures': len(totals), 'attendance_bitsets': len(bitsets)}
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump({'term': term.name, 'start_date': term.start_date.isoformat(),
+                   'end_date': term.end_date.isoformat(), 'rows': counts}, f, indent=2)
+
+    # Never delete live rows unless the files read back complete
+    _load_arrays.cache_clear()
+    if (len(_load_arrays(directory, 'attendance_records')['id']) != len(records)
+            or len(_load_arrays(directory, 'total_lectures')['id']) != len(totals)
+            or len(_load_arrays(directory, 'attendance_bitsets')['day']) != len(bitsets)):
+        raise ArchiveError('Archive verification failed; live rows were left in place.')
+
+    AttendanceRecord.query.filter(in_term(AttendanceRecord.date)).delete(synchronize_session=False)
+    TotalLectures.query.filter(in_term(TotalLectures.date)).delete(synchronize_session=False)
+    AttendanceBitset.query.filter(in_term(AttendanceBitset.date)).delete(synchronize_session=False)
+    term.archived_at = datetime.utcnow()
+    db.session.commit()
+    cache.bump_all()
+    return counts
+
+
+@lru_cache(maxsize=32)
+def _load_arrays(directory, name):
+    np = _numpy()
+    with np.load(os.path.join(directory, f"{name}.npz")) as data:
+        return {key: data[key] for key in data.files}
+
+
+def archived_terms(date_range=(None, None)):
+    """
+    Archived terms overlapping date_range (all archived terms when unbounded).
+
+    Read from `Term.archived_at` on every call rather than cached: a term is
+    archived from the CLI, whose cache bump never reaches the web workers, and
+    any worker still listing it as live would miss its deleted rows.
+    """
+    query = Term.query.filter(Term.archived_at.isnot(None))
+    start, end = date_range
+    if start is not None:
+        query = query.filter(Term.start_date <= end, Term.end_date >= start)
+    return [(t.name, t.start_date, t.end_date, term_dir(t)) for t in query.order_by(Term.start_date)]
+
+
+def frozen_term(day):
+    """
+    The closed or archived term containing `day`, or None. Its attendance must
+    not change: rows written after archiving would be added to the archived
+    ones in every report, and the term could not be archived again.
+    """
+    return Term.query.filter(
+        Term.start_date <= day, Term.end_date >= day,
+        db.or_(Term.is_closed.is_(True), Term.archived_at.isnot(None))
+    ).first()
+
+
+def _selected(arrays, assignment_ids, date_range):
+    np = _numpy()
+    mask = np.isin(arrays['assignment_id'], np.fromiter(assignment_ids, dtype=np.int32))
+    start, end = date_range
+    if start is not None:
+        mask &= (arrays['day'] >= start.toordinal()) & (arrays['day'] <= end.toordinal())
+    return mask
+
+
+def _archived_bitsets(directory, assignment_ids, date_range):
+    """(assignment_id, date, roster, bits, lecture_count) of a term's archived bitset sessions."""
+    from .bitsets import unpack_roster
+
+    # Terms archived before bitsets were archived have no file
+    if not os.path.exists(os.path.join(directory, 'attendance_bitsets.npz')):
+        return
+    arrays = _load_arrays(directory, 'attendance_bitsets')
+    roster_at, bits_at = arrays['roster_offsets'], arrays['bits_offsets']
+    for i in _selected(arrays, assignment_ids, date_range).nonzero()[0]:
+        yield (int(arrays['assignment_id'][i]), date.fromordinal(int(arrays['day'][i])),
+               unpack_roster(arrays['roster'][roster_at[i]:roster_at[i + 1]].tobytes()),
+               arrays['bits'][bits_at[i]:bits_at[i + 1]].tobytes(), int(arrays['lecture_count'][i]))
+
+
+def archived_records(assignment_ids, date_range=(None, None)):
+    """
+    (records, totals) from the archive for these assignments, shaped like the
+    ORM rows; bitset sessions give one record per roster student.
+    """
+    from .bitsets import count_attended
+
+    records, totals = [], []
+    if not assignment_ids:
+        return records, totals
+    for _, _, _, directory in archived_terms(date_range):
+        rec = _load_arrays(directory, 'attendance_records')
+        mask = _selected(rec, assignment_ids, date_range)
+        for aid, sid, day, present, count in zip(rec['assignment_id'][mask], rec['student_id'][mask],
+                                                 rec['day'][mask], rec['present'][mask], rec['lecture_count'][mask]):
+            records.append(ArchivedRecord(int(aid), int(sid), date.fromordinal(int(day)),
+                                          'present' if present else 'absent', int(count)))
+        for aid, day, roster, bits, lecture_count in _archived_bitsets(directory, assignment_ids, date_range):
+            for sid, count in count_attended(roster, bits, lecture_count).items():
+                records.append(ArchivedRecord(aid, sid, day, 'present' if count else 'absent', count))
+        tot = _load_arrays(directory, 'total_lectures')
+        mask = _selected(tot, assignment_ids, date_range)
+        for aid, day, count in zip(tot['assignment_id'][mask], tot['day'][mask], tot['lecture_count'][mask]):
+            totals.append(ArchivedTotal(int(aid), date.fromordinal(int(day)), int(count)))
+    return records, totals
+
+
+def archived_sessions(assignment_ids, date_range=(None, None)):
+    """{(assignment_id, date): list of present-student-id sets} for archived sessions stored as bitsets."""
+    from .bitsets import decode_slots
+
+    sessions = {}
+    if not assignment_ids:
+        return sessions
+    for _, _, _, directory in archived_terms(date_range):
+        for aid, day, roster, bits, lecture_count in _archived_bitsets(directory, assignment_ids, date_range):
+            sessions[(aid, day)] = decode_slots(roster, bits, lecture_count)
+    return sessions
+
+
+def archived_sums(assignment_ids, date_range=(None, None)):
+    """
+    Archived lecture totals per assignment and attended ('present') counts per
+    (assignment, student), for adding to the live SUM()s in the reports.
+    """
+    from .bitsets import count_attended
+
+    totals = defaultdict(int)
+    attended = defaultdict(int)
+    if not assignment_ids:
+        return totals, attended
+    for _, _, _, directory in archived_terms(date_range):
+        tot = _load_arrays(directory, 'total_lectures')
+        mask = _selected(tot, assignment_ids, date_range)
+        for aid, count in zip(tot['assignment_id'][mask], tot['lecture_count'][mask]):
+            totals[int(aid)] += int(count)
+        rec = _load_arrays(directory, 'attendance_records')
+        mask = _selected(rec, assignment_ids, date_range) & rec['present']
+        for aid, sid, count in zip(rec['assignment_id'][mask], rec['student_id'][mask], rec['lecture_count'][mask]):
+            attended[(int(aid), int(sid))] += int(count)
+        for aid, _, roster, bits, lecture_count in _archived_bitsets(directory, assignment_ids, date_range):
+            for sid, count in count_attended(roster, bits, lecture_count).items():
+                attended[(aid, sid)] += count
+    return totals, attended
+
+
+# --- CLI ---
+
+archive_cli = AppGroup('archive', help='Move closed terms to the columnar archive.')
+
+
+@archive_cli.command('term')
+@click.argument('term_name')
+@click.option('--close', is_flag=True, help='Mark the term closed before archiving it.')
+def archive_term_command(term_name, close):
+    """Archive one term and delete its rows from the live tables."""
+    term = Term.query.filter_by(name=term_name).first()
+    if not term:
+        raise click.ClickException(f"No term named '{term_name}'.")
+    if close:
+        term.is_closed = True
+    try:
+        counts = archive_term(term)
+    except ArchiveError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    click.echo(f"Archived '{term_name}' to {term_dir(term)}: "
+               f"{counts['attendance_records']} attendance rows, {counts['total_lectures']} lecture totals, "
+               f"{counts['attendance_bitsets']} session bitsets.")
+
+
+@archive_cli.command('list')
+def list_command():
+    """Show archived terms and where their files are."""
+    for term in Term.query.filter(Term.archived_at.isnot(None)).order_by(Term.start_date):
+        click.echo(f"{term.name}\t{term.start_date} - {term.end_date}\t{term_dir(term)}")
@@ -0,0 +1,186 @@
+"""
+Bulk import of staff/subject/batch assignments from a timetable.
+
+Each row names its references the way a timetable does:
+
+    staff_username, dept_code, semester, subject_code, class_number,
+    academic_year, lecture_type, batch_number
+
+(`batch_number` only for PR/TU; `dept_code` may be omitted by a HOD). All
+staff, subjects, batches and existing assignments are resolved with one
+set query each, duplicates are found in memory, and every valid row is
+inserted in a single transaction. The result has one entry per row.
+"""
+import csv
+import io
+
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .auth import invalidate_scopes
+from .models import Assignment, Batch, Department, Staff, Subject
+
+IMPORT_FIELDS = ['staff_username', 'dept_code', 'semester', 'subject_code',
+                 'class_number', 'academic_year', 'lecture_type', 'batch_number']
+LECTURE_TYPES = ('TH', 'PR', 'TU')
+
+
+class AssignmentImportError(ValueError):
+    pass
+
+
+def read_rows(request):
+    """Rows from an uploaded CSV ('file'), a text/csv body, or a JSON list (optionally under 'rows')."""
+    if 'file' in request.files:
+        text = request.files['file'].stream.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        data = request.get_json(silent=True)
+        rows = data.get('rows') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise AssignmentImportError('Send a CSV file, a text/csv body, or a JSON list of rows.')
+        return rows
+    reader = csv.DictReader(io.StringIO(text))
+    return [{(k or '').strip(): (v or '').strip() for k, v in row.items()} for row in reader]
+
+
+def _clean(row, dept_code):
+    """Normalise one row; raises AssignmentImportError with a message for the report."""
+    value = lambda key: str(row.get(key) if row.get(key) is not None else '').strip()
+    cleaned = {key: value(key) for key in IMPORT_FIELDS}
+    if dept_code is not None:
+        if cleaned['dept_code'] and cleaned['dept_code'] != dept_code:
+            raise AssignmentImportError(f"Department {cleaned['dept_code']} is outside your department.")
+        cleaned['dept_code'] = dept_code
+
+    missing = [key for key in IMPORT_FIELDS if key != 'batch_number' and not cleaned[key]]
+    if missing:
+        raise AssignmentImportError(f"Missing {', '.join(missing)}.")
+
+    cleaned['lecture_type'] = cleaned['lecture_type'].upper()
+    if cleaned['lecture_type'] not in LECTURE_TYPES:
+        raise AssignmentImportError(f"lecture_type must be one of {', '.join(LECTURE_TYPES)}.")
+    try:
+        cleaned['semester'] = int(cleaned['semester'])
+        cleaned['batch_number'] = int(cleaned['batch_number']) if cleaned['batch_number'] else None
+    except ValueError:
+        raise AssignmentImportError('semester and batch_number must be numbers.')
+    if cleaned['lecture_type'] == 'TH':
+        cleaned['batch_number'] = None
+    elif cleaned['batch_number'] is None:
+        raise AssignmentImportError(f"batch_number is required for {cleaned['lecture_type']}.")
+    return cleaned
+
+
+def import_assignments(rows, dept_code=None, dry_run=False):
+    """
+    Validate and insert assignment rows. `dept_code` restricts every row to
+    that department (HOD imports). Returns (results, created_assignments).
+    """
+    results = []
+    valid = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            valid.append((number, _clean(row, dept_code)))
+        except AssignmentImportError as e:
+            results.append({'row': number, 'status': 'error', 'error': str(e)})
+
+    # --- Resolve every reference with one query per table ---
+    usernames = {r['staff_username'] for _, r in valid}
+    staff_ids = dict(db.session.query(Staff.username, Staff.id).filter(Staff.username.in_(usernames))) if usernames else {}
+
+    dept_codes = {r['dept_code'] for _, r in valid}
+    dept_names = dict(db.session.query(Department.dept_code, Department.dept_name)
+                      .filter(Department.dept_code.in_(dept_codes))) if dept_codes else {}
+
+    subject_ids = {}
+    codes = {r['subject_code'] for _, r in valid}
+    if codes:
+        for sid, dcode, semester, code in db.session.query(
+                Subject.id, Subject.dept_code, Subject.semester_number, Subject.subject_code
+        ).filter(Subject.subject_code.in_(codes), Subject.dept_code.in_(dept_codes)):
+            subject_ids.setdefault((dcode, semester, code), []).append(sid)
+
+    batch_ids = {}
+    class_numbers = {r['class_number'] for _, r in valid}
+    if class_numbers:
+        for bid, dname, class_number, year, semester in db.session.query(
+                Batch.id, Batch.dept_name, Batch.class_number, Batch.academic_year, Batch.semester
+        ).filter(Batch.class_number.in_(class_numbers), Batch.dept_name.in_(set(dept_names.values()))):
+            batch_ids[(dname, class_number, year, semester)] = bid
+
+    existing = set()
+    if batch_ids:
+        existing = set(db.session.query(Assignment.subject_id, Assignment.batch_id,
+                                        Assignment.lecture_type, Assignment.batch_number)
+                       .filter(Assignment.batch_id.in_(set(batch_ids.values()))))
+
+    # --- Check rows in memory ---
+    created = []
+    seen = {}
+    for number, r in valid:
+        problem = None
+        staff_id = staff_ids.get(r['staff_username'])
+        subjects = subject_ids.get((r['dept_code'], r['semester'], r['subject_code']), [])
+        batch_id = batch_ids.get((dept_names.get(r['dept_code']), r['class_number'], r['academic_year'], r['semester']))
+        if staff_id is None:
+            problem = f"Unknown staff username '{r['staff_username']}'."
+        elif r['dept_code'] not in dept_names:
+            problem = f"Unknown department '{r['dept_code']}'."
+        elif not subjects:
+            problem = f"No subject {r['subject_code']} in {r['dept_code']} semester {r['semester']}."
+        elif len(subjects) > 1:
+            problem = f"Subject code {r['subject_code']} is ambiguous in {r['dept_code']} semester {r['semester']}."
+        elif batch_id is None:
+            problem = f"No batch {r['class_number']} {r['academic_year']} semester {r['semester']} in {r['dept_code']}."
+        if problem:
+            results.append({'row': number, 'status': 'error', 'error': problem})
+            continue
+
+        key = (subjects[0], batch_id, r['lecture_type'], r['batch_number'])
+        if key in existing:
+            results.append({'row': number, 'status': 'duplicate', 'error': 'This assignment already exists.'})
+        elif key in seen:
+            results.append({'row': number, 'status': 'duplicate',
+                            'error': f"Same assignment as row {seen[key]}."})
+        else:
+            seen[key] = number
+            assignment = Assignment(staff_id=staff_id, subject_id=key[0], batch_id=batch_id,
+                                    lecture_type=r['lecture_type'], batch_number=r['batch_number'])
+            created.append((number, assignment))
+
+    if created and not dry_run:
+        db.session.add_all(a for _, a in created)
+        db.session.commit()
+    for number, assignment in created:
+        results.append({'row': number, 'status': 'would_create' if dry_run else 'created', 'id': assignment.id})
+
+    results.sort(key=lambda r: r['row'])
+    return results, [a for _, a in created]
+
+
+def import_request(request, dept_code=None):
+    """
+    The admin and HOD import endpoints: read the rows, import them (?dry_run=1
+    only validates) and return (response body, status code).
+    """
+    try:
+        rows = read_rows(request)
+    except AssignmentImportError as e:
+        return {'error': str(e)}, 400
+    if not rows:
+        return {'error': 'No rows to import'}, 400
+
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        results, created = import_assignments(rows, dept_code=dept_code, dry_run=dry_run)
+    except IntegrityError:
+        # e.g. a referenced staff member or batch deleted while the import ran
+        db.session.rollback()
+        return {'error': 'The data changed during the import; nothing was imported. Please retry.'}, 409
+    if created and not dry_run:
+        invalidate_scopes()
+    counts = {status: sum(r['status'] == status for r in results)
+              for status in ('created', 'would_create', 'duplicate', 'error')}
+    return {**counts, 'results': results}, 201 if created and not dry_run else 200
@@ -1,5 +1,9 @@
-from flask import session, jsonify
+from flask import session, jsonify, request, current_app, abort
 from functools import wraps
+from .cache import cache
+from .routing import primary
+
+SCOPE_NAMESPACE = 'auth-scope'
 
 def admin_required(f):
     @wraps(f)
@@ -24,3 +28,136 @@ def hod_required(f):
             return jsonify({'error': 'HOD login required'}), 401
         return f(*args, **kwargs)
     return decorated
+
+
+# --- Cached access scope ---
+# The ids a staff member or HOD may touch are computed once (at login, or on
+# first use in another worker) and kept in the versioned cache, so per-request
+# authorization is a set lookup instead of an Assignment/Subject query.
+# A denial is always re-checked against the database before it is returned,
+# so newly created assignments/subjects/batches are visible immediately; only
+# revocations rely on invalidate_scopes() (or SCOPE_CACHE_TTL across workers).
+
+def _compute_staff_scope(staff_id):
+    from . import db
+    from .models import Assignment
+
+    rows = db.session.query(Assignment.id, Assignment.batch_id, Assignment.subject_id)\
+        .filter(Assignment.staff_id == staff_id).all()
+    return {
+        'assignment_ids': frozenset(r.id for r in rows),
+        'batch_ids': frozenset(r.batch_id for r in rows),
+        'subject_ids': frozenset(r.subject_id for r in rows),
+        'batch_subjects': frozenset((r.batch_id, r.subject_id) for r in rows),
+    }
+
+def _compute_hod_scope(dept_code):
+    from . import db
+    from .models import Assignment, Subject, Batch, Department
+
+    subject_ids = frozenset(sid for sid, in db.session.query(Subject.id).filter(Subject.dept_code == dept_code))
+    rows = db.session.query(Assignment.id, Assignment.batch_id, Assignment.subject_id)\
+        .join(Subject, Assignment.subject_id == Subject.id)\
+        .filter(Subject.dept_code == dept_code).all()
+    batch_ids = frozenset(bid for bid, in db.session.query(Batch.id)
+                          .join(Department, Department.dept_name == Batch.dept_name)
+                          .filter(Department.dept_code == dept_code))
+    return {
+        'assignment_ids': frozenset(r.id for r in rows),
+        'batch_ids': batch_ids,
+        'subject_ids': subject_ids,
+        'batch_subjects': frozenset((r.batch_id, r.subject_id) for r in rows),
+    }
+
+def load_scope(role, refresh=False):
+    """Return the cached scope for the logged-in staff member or HOD."""
+    if role == 'hod':
+        key, compute = ('hod', session['department_code']), lambda: _compute_hod_scope(session['department_code'])
+    else:
+        key, compute = ('staff', session['staff_id']), lambda: _compute_staff_scope(session['staff_id'])
+
+    ttl = current_app.config.get('SCOPE_CACHE_TTL', 300)
+    scope = None if refresh else cache.get(SCOPE_NAMESPACE, key, ttl)
+    if scope is None:
+        version = cache.version(SCOPE_NAMESPACE)
+        with primary():
+            scope = compute()
+        cache.set(SCOPE_NAMESPACE, key, scope, version)
+    return scope
+
+def invalidate_scopes():
+    """Call after assignments or HOD departments change so cached scopes are rebuilt."""
+    cache.bump(SCOPE_NAMESPACE)
+
+def _scope_allows(scope, batch_id=None, subject_id=None, assignment_id=None, role='staff'):
+    if assignment_id is not None and assignment_id not in scope['assignment_ids']:
+        return False
+    if role == 'staff' and batch_id is not None and subject_id is not None:
+        return (batch_id, subject_id) in scope['batch_subjects']
+    if batch_id is not None and batch_id not in scope['batch_ids']:
+        return False
+    if subject_id is not None and subject_id not in scope['subject_ids']:
+        return False
+    return True
+
+def in_scope(role, batch_id=None, subject_id=None, assignment_id=None):
+    """Check ids against the cached scope, re-reading the database before denying."""
+    if _scope_allows(load_scope(role), batch_id, subject_id, assignment_id, role):
+        return True
+    return _scope_allows(load_scope(role, refresh=True), batch_id, subject_id, assignment_id, role)
+
+class _InvalidId(ValueError):
+    pass
+
+def _request_int(name):
+    """
+    Look an id up in the URL, then the query string, then the JSON body.
+    None when it is not given; _InvalidId when it is given but not an integer.
+    """
+    if name is None:
+        return None
+    value = (request.view_args or {}).get(name)
+    if value is None:
+        value = request.args.get(name)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise _InvalidId(name)
+
+def _missing_from_url(names, ids):
+    """True when an id taken from the URL names no row, so the request is a 404, not a 403."""
+    from . import db
+    from .models import Assignment, Batch, Subject
+    models = {'batch_id': Batch, 'subject_id': Subject, 'assignment_id': Assignment}
+    return any(
+        name in (request.view_args or {}) and db.session.get(models[key], ids[key]) is None
+        for key, name in names.items() if name is not None and ids[key] is not None
+    )
+
+def scope_required(role, batch=None, subject=None, assignment=None, error='You are not authorized to access this resource.'):
+    """
+    Reject the request with 403 unless the named batch/subject/assignment ids
+    are in the caller's scope. Ids missing from the request are not checked;
+    the endpoint's own validation reports them. A given id that is not an
+    integer is a 400, and a URL id naming no row a 404.
+    """
+    names = {'batch_id': batch, 'subject_id': subject, 'assignment_id': assignment}
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                ids = {key: _request_int(name) for key, name in names.items()}
+            except _InvalidId as e:
+                return jsonify({'error': f'{e} must be an integer'}), 400
+            if any(v is not None for v in ids.values()) and not in_scope(role, **ids):
+                if _missing_from_url(names, ids):
+                    abort(404)
+                return jsonify({'error': error}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -0,0 +1,288 @@
+"""
+Bitset storage of per-lecture attendance.
+
+Each session -- one assignment on one day -- is stored as one
+`AttendanceBitset` row instead of one `AttendanceRecord` row per student:
+
+    roster   sorted student ids, packed as little-endian uint32
+    bits     lecture_count bitmaps of ceil(len(roster) / 8) bytes each;
+             bit i of bitmap k is set when roster[i] attended lecture k
+
+That is exact per lecture (the rows only kept a daily count, so the grid had
+to guess which lectures were missed) and, for a class of 60, one row of
+~260 bytes instead of 60 rows. `mark-attendance` writes bitsets; sessions
+marked before, or created through the session edit endpoints, stay as rows
+until `flask bitsets migrate` converts them. A session is never stored both
+ways, so the reports add `attended_sums` to their SUM()s over the rows (see
+`reports.extra_sums`) and the session views add `session_records`.
+`TotalLectures` still holds the lectures held per session.
+
+    flask bitsets migrate [--before YYYY-MM-DD] [--batch-size 500]
+    flask bitsets stats
+"""
+import struct
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+from . import db
+from .dialects import upsert
+from .models import AttendanceBitset, AttendanceRecord, TotalLectures
+from .reports import filter_dates
+
+# Read-only stand-in for an AttendanceRecord, for sessions stored as bitsets
+SessionRecord = namedtuple('SessionRecord', 'assignment_id student_id date status lecture_count')
+
+
+# --- Encoding ---
+
+def pack_roster(student_ids):
+    ids = sorted(set(student_ids))
+    return struct.pack(f'<{len(ids)}I', *ids)
+
+
+def unpack_roster(blob):
+    return struct.unpack(f'<{len(blob) // 4}I', blob)
+
+
+def encode_slots(roster, slots):
+    """Pack a list of present-student-id sets (one per lecture) against the roster."""
+    position = {sid: i for i, sid in enumerate(roster)}
+    width = (len(roster) + 7) // 8
+    out = bytearray()
+    for present in slots:
+        mask = 0
+        for sid in present:
+            i = position.get(sid)
+            if i is not None:
+                mask |= 1 << i
+        out += mask.to_bytes(width, 'little')
+    return bytes(out)
+
+
+def decode_slots(roster, bits, lecture_count):
+    """Inverse of encode_slots: a list of present-student-id sets, one per lecture."""
+    width = (len(roster) + 7) // 8
+    slots = []
+    for k in range(lecture_count):
+        mask = int.from_bytes(bits[k * width:(k + 1) * width], 'little')
+        slots.append({sid for i, sid in enumerate(roster) if mask >> i & 1})
+    return slots
+
+
+def count_attended(roster, bits, lecture_count):
+    """{student_id: lectures attended}, read off the bitmaps without building the sets."""
+    width = (len(roster) + 7) // 8
+    counts = dict.fromkeys(roster, 0)
+    for k in range(lecture_count):
+        mask = int.from_bytes(bits[k * width:(k + 1) * width], 'little')
+        while mask:
+            low = mask & -mask
+            counts[roster[low.bit_length() - 1]] += 1
+            mask ^= low
+    return counts
+
+
+def decode(row):
+    """(roster, slots) for an AttendanceBitset row."""
+    roster = unpack_roster(row.roster)
+    return roster, decode_slots(roster, row.bits, row.lecture_count)
+
+
+# --- Writes ---
+
+def _stored_session(assignment_id, day):
+    """(roster, slots) of the session's bitset, row-locked until commit, or None."""
+    # A column query, not the entity: the identity map would hand back a stale
+    # row after an earlier upsert in the same transaction
+    row = db.session.query(AttendanceBitset.roster, AttendanceBitset.bits, AttendanceBitset.lecture_count)\
+        .filter_by(assignment_id=assignment_id, date=day)\
+        .with_for_update().first()
+    if row is None:
+        return None
+    roster = unpack_roster(row.roster)
+    return set(roster), decode_slots(roster, row.bits, row.lecture_count)
+
+
+def _load_session(assignment_id, day, held):
+    """
+    (roster, slots) of a session for rewriting it as a bitset. Attendance rows
+    of the session are taken over and deleted: a student with a count of N
+    attended the first N of the `held` lectures, the rule the rows implied.
+    """
+    rows = db.session.query(AttendanceRecord.student_id, AttendanceRecord.status, AttendanceRecord.lecture_count)\
+        .filter_by(assignment_id=assignment_id, date=day).all()
+    counts = {sid: n if status == 'present' else 0 for sid, status, n in rows}
+    if counts:
+        AttendanceRecord.query.filter_by(assignment_id=assignment_id, date=day).delete(synchronize_session=False)
+
+    stored = _stored_session(assignment_id, day)
+    if stored is not None:
+        roster, slots = stored
+        return roster | set(counts), slots
+    held = max(held, *counts.values()) if counts else held
+    return set(counts), [{sid for sid, n in counts.items() if n > k} for k in range(held)]
+
+
+def _save_session(assignment_id, day, roster, slots):
+    roster = tuple(sorted(roster))
+    upsert(AttendanceBitset, [{
+        'assignment_id': assignment_id,
+        'date': day,
+        'lecture_count': len(slots),
+        'roster': pack_roster(roster),
+        'bits': encode_slots(roster, slots),
+    }], conflict_columns=('assignment_id', 'date'), update=('lecture_count', 'roster', 'bits'))
+
+
+def append_lectures(assignment_id, day, held_before, roster_ids, present_per_lecture):
+    """
+    Record lectures of a session, one set of present student ids per lecture,
+    after the `held_before` lectures already recorded. Call after the
+    session's TotalLectures upsert, whose row lock serializes concurrent marks
+    of the session. A session still stored as rows is converted on the way.
+    """
+    roster, slots = _load_session(assignment_id, day, held_before)
+    slots.extend(set(present) for present in present_per_lecture)
+    _save_session(assignment_id, day, roster | set(roster_ids), slots)
+
+
+def set_attended(assignment_id, day, student_id, count):
+    """
+    Set how many of the session's lectures a student attended (the session
+    edit endpoints). Returns False, changing nothing, when the session is not
+    stored as a bitset: the caller edits its rows instead. Lectures already
+    marked are kept; extra ones are taken from the earliest unmarked slots,
+    removals from the latest marked ones.
+    """
+    stored = _stored_session(assignment_id, day)
+    if stored is None:
+        return False
+    roster, slots = stored
+    count = max(0, min(count, len(slots)))
+    marked = [k for k, present in enumerate(slots) if student_id in present]
+    if count < len(marked):
+        for k in marked[count:]:
+            slots[k].discard(student_id)
+    else:
+        for k in [k for k in range(len(slots)) if student_id not in slots[k]][:count - len(marked)]:
+            slots[k].add(student_id)
+    _save_session(assignment_id, day, roster | {student_id}, slots)
+    return True
+
+
+def delete_for_assignment(assignment_id):
+    AttendanceBitset.query.filter_by(assignment_id=assignment_id).delete(synchronize_session=False)
+
+
+def migrate_rows(before=None, batch_size=500):
+    """
+    Convert sessions stored as attendance rows (dated before `before`, if
+    given) into bitsets, committing every `batch_size` sessions. Each session's
+    TotalLectures row is locked first, as a mark of the session would.
+    Returns (sessions, rows) converted.
+    """
+    in_range = [AttendanceRecord.date < before] if before is not None else []
+    count_rows = lambda: AttendanceRecord.query.filter(*in_range).count()
+    rows_before = count_rows()
+    sessions = 0
+    while True:
+        # Converted sessions lose their rows, so each pass picks up where the last one stopped
+        batch = db.session.query(AttendanceRecord.assignment_id, AttendanceRecord.date).filter(*in_range)\
+            .distinct().order_by(AttendanceRecord.date, AttendanceRecord.assignment_id).limit(batch_size).all()
+        if not batch:
+            return sessions, rows_before - count_rows()
+        for assignment_id, day in batch:
+            held = db.session.query(TotalLectures.lecture_count)\
+                .filter_by(assignment_id=assignment_id, date=day).with_for_update().scalar() or 0
+            roster, slots = _load_session(assignment_id, day, held)
+            _save_session(assignment_id, day, roster, slots)
+        db.session.commit()
+        sessions += len(batch)
+
+
+# --- Reads ---
+
+def _rows(assignment_ids, date_range):
+    if not assignment_ids:
+        return []
+    return filter_dates(
+        db.session.query(AttendanceBitset.assignment_id, AttendanceBitset.date, AttendanceBitset.lecture_count,
+                         AttendanceBitset.roster, AttendanceBitset.bits)
+        .filter(AttendanceBitset.assignment_id.in_(list(assignment_ids))),
+        AttendanceBitset.date, date_range
+    ).all()
+
+
+def load_sessions(assignment_ids, date_range=(None, None)):
+    """{(assignment_id, date): list of present-student-id sets} for the sessions stored as bitsets."""
+    sessions = {}
+    for row in _rows(assignment_ids, date_range):
+        sessions[(row.assignment_id, row.date)] = decode(row)[1]
+    return sessions
+
+
+def attended_sums(assignment_ids, date_range=(None, None)):
+    """
+    Lectures attended per (assignment, student) over the sessions stored as
+    bitsets, for adding to the SUM()s over the attendance rows.
+    """
+    attended = defaultdict(int)
+    for row in _rows(assignment_ids, date_range):
+        for sid, count in count_attended(unpack_roster(row.roster), row.bits, row.lecture_count).items():
+            attended[(row.assignment_id, sid)] += count
+    return attended
+
+
+def session_records(assignment_ids, date_range=(None, None)):
+    """The bitset sessions as one record per roster student, shaped like the AttendanceRecord rows."""
+    records = []
+    for row in _rows(assignment_ids, date_range):
+        for sid, count in count_attended(unpack_roster(row.roster), row.bits, row.lecture_count).items():
+            records.append(SessionRecord(row.assignment_id, sid, row.date, 'present' if count else 'absent', count))
+    return records
+
+
+# --- Stats ---
+
+def storage_stats():
+    """Row counts and payload bytes of both formats, for comparing them."""
+    record_rows = db.session.query(db.func.count(AttendanceRecord.id)).scalar() or 0
+    bitset_rows, bitset_bytes = db.session.query(
+        db.func.count(AttendanceBitset.id),
+        db.func.sum(db.func.length(AttendanceBitset.roster) + db.func.length(AttendanceBitset.bits))
+    ).one()
+    return {
+        'attendance_rows': record_rows,
+        # id, assignment_id, student_id, date, status ('present'), lecture_count
+        'attendance_bytes_estimate': record_rows * (4 + 4 + 4 + 4 + 8 + 4),
+        'bitset_rows': bitset_rows or 0,
+        'bitset_bytes': (bitset_bytes or 0) + (bitset_rows or 0) * (4 + 4 + 4 + 4),
+    }
+
+
+# --- CLI ---
+
+bitsets_cli = AppGroup('bitsets', help='Per-lecture attendance bitsets.')
+
+
+@bitsets_cli.command('stats')
+def stats_command():
+    """Compare the size of the row and bitset formats."""
+    for key, value in storage_stats().items():
+        click.echo(f"{key}\t{value:,}")
+
+
+@bitsets_cli.command('migrate')
+@click.option('--before', default=None, help='Only convert sessions before this date (YYYY-MM-DD).')
+@click.option('--batch-size', default=500, show_default=True, help='Sessions converted per transaction.')
+def migrate_command(before, batch_size):
+    """Convert sessions stored as attendance rows into bitsets."""
+    try:
+        before = datetime.strptime(before, '%Y-%m-%d').date() if before else None
+    except ValueError:
+        raise click.BadParameter('Use YYYY-MM-DD.', param_hint='--before')
+    sessions, rows = migrate_rows(before, batch_size)
+    click.echo(f"Converted {sessions:,} sessions ({rows:,} attendance rows) to bitsets.")
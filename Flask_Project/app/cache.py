@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """
+    Small in-process cache whose entries are tied to a namespace version.
+
+    Writers call `bump(namespace)` when the underlying data changes; readers
+    only get an entry back if it was stored under the namespace's current
+    version, so invalidation is O(1) and never has to find the affected keys.
+    Entries also expire after `ttl` seconds, which bounds staleness when
+    several worker processes each hold their own copy.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._epoch = 0
+        self._entries = OrderedDict()
+        self._computing = {}
+
+    def version(self, namespace):
+        return (self._epoch, self._versions.get(namespace, 0))
+
+    def bump(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def get(self, namespace, key, ttl=None):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            version, stored_at, value = entry
+            if version != self.version(namespace) or (ttl is not None and time.monotonic() - stored_at > ttl):
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value, version=None):
+        """
+        Store `value`. Pass the `version()` read before computing it: a write
+        that bumps the namespace meanwhile then makes the entry stale at once,
+        instead of the pre-write value being served under the new version.
+        """
+        with self._lock:
+            if version is None:
+                version = self.version(namespace)
+            self._entries[(namespace, key)] = (version, time.monotonic(), value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, namespace, key, compute, ttl=None):
+        """
+        Return the cached value or compute and store it. Concurrent misses on
+        the same key wait for the first computation instead of all hitting the
+        database at once (a burst of requests right after an invalidation).
+        """
+        value = self.get(namespace, key, ttl)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._computing.setdefault((namespace, key), threading.Lock())
+        try:
+            with key_lock:
+                value = self.get(namespace, key, ttl)
+                if value is None:
+                    version = self.version(namespace)
+                    value = compute()
+                    self.set(namespace, key, value, version)
+        finally:
+            with self._lock:
+                # A later miss may already have registered a new lock for the key
+                if self._computing.get((namespace, key)) is key_lock:
+                    del self._computing[(namespace, key)]
+        return value
+
+
+cache = VersionedCache()
+
+
+def dept_namespace(dept_code):
+    return f"dept:{dept_code}"
+
+
+def student_namespace(student_id):
+    return f"student:{student_id}"
+
+
+def invalidate_students(student_ids):
+    """Drop cached per-student data (attendance profiles) for these students."""
+    cache.bump(*(student_namespace(sid) for sid in student_ids))
+
+
+def attendance_namespaces(assignment_ids, student_ids=None):
+    """
+    Namespaces holding data derived from these assignments' attendance: every
+    department owning one of them, and the affected students (every student of
+    the assignments' batches when `student_ids` is not given).
+    """
+    from . import db
+    from .models import Assignment, Subject, student_batches
+
+    if not assignment_ids:
+        return []
+    dept_codes = db.session.query(Subject.dept_code)\
+        .join(Assignment, Assignment.subject_id == Subject.id)\
+        .filter(Assignment.id.in_(list(assignment_ids)))\
+        .distinct().all()
+    namespaces = [dept_namespace(code) for code, in dept_codes]
+
+    if student_ids is None:
+        student_ids = [sid for sid, in db.session.query(student_batches.c.student_id)
+                       .join(Assignment, Assignment.batch_id == student_batches.c.batch_id)
+                       .filter(Assignment.id.in_(list(assignment_ids)))
+                       .distinct()]
+    return namespaces + [student_namespace(sid) for sid in student_ids]
+
+
+def invalidate_attendance(assignment_ids, student_ids=None):
+    """
+    Bump the namespaces of `attendance_namespaces`. Call after the write has
+    committed, so a concurrent reader cannot cache the old rows again; a
+    delete should collect the namespaces first (they are found through the
+    assignments) and bump them after its commit.
+    """
+    cache.bump(*attendance_namespaces(assignment_ids, student_ids))
@@ -0,0 +1,64 @@
+import gzip
+from flask import request
+
+# brotli is optional; without it only gzip is negotiated.
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the deployment
+    brotli = None
+
+
+def _choose_encoding(accept_encodings):
+    """Pick the best encoding the client accepts, preferring brotli."""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, min_size, level, mimetypes):
+    """
+    Compress a response body in place if it is large enough and the client
+    negotiated an encoding we support. Small bodies are left alone since the
+    framing overhead outweighs the saving.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in mimetypes):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = _choose_encoding(request.accept_encodings)
+    if encoding == 'br':
+        # Brotli quality runs 0-11; map the gzip-style 1-9 level onto it.
+        data = brotli.compress(data, quality=min(11, level + 2))
+    elif encoding == 'gzip':
+        data = gzip.compress(data, compresslevel=level)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(data))
+    return response
+
+
+def init_compression(app):
+    """Register an after_request hook that compresses large JSON responses."""
+    if not app.config.get('COMPRESS_RESPONSES', True):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['application/json']))
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, min_size, level, mimetypes)
@@ -0,0 +1,60 @@
+"""
+Database-dialect helpers, so the same code runs on Postgres and SQLite.
+
+`init_sqlite` applies the profile's SQLITE_PRAGMAS to each new SQLite
+connection. `upsert` is INSERT ... ON CONFLICT DO UPDATE on Postgres and
+SQLite (3.24+), with an UPDATE-then-INSERT fallback for anything else.
+"""
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def init_sqlite(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    for engine in engines:
+        event.listen(engine, 'connect', apply_pragmas)
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def upsert(model, rows, conflict_columns, increment=(), update=()):
+    """
+    Insert `rows` (dicts) into `model`'s table; on a conflict over
+    `conflict_columns` (a unique constraint), add the new values of the
+    `increment` columns to the stored ones and overwrite the `update` columns.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    make_insert = _INSERTS.get(dialect_name())
+
+    if make_insert is not None:
+        stmt = make_insert(table)
+        changes = {c: table.c[c] + stmt.excluded[c] for c in increment}
+        changes.update({c: stmt.excluded[c] for c in update})
+        db.session.execute(stmt.on_conflict_do_update(index_elements=list(conflict_columns), set_=changes), rows)
+        return
+
+    for row in rows:
+        match = [table.c[c] == row[c] for c in conflict_columns]
+        changes = {c: table.c[c] + row[c] for c in increment}
+        changes.update({c: row[c] for c in update})
+        if not db.session.execute(table.update().where(*match).values(changes)).rowcount:
+            db.session.execute(table.insert().values(row))
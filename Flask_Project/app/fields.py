@@ -0,0 +1,66 @@
+"""
+Sparse fieldsets for read endpoints.
+
+`?fields=id,roll_no` trims each item of a list response to the named fields,
+and the endpoint selects only the columns behind them instead of loading
+full ORM entities. Without `fields` the endpoint behaves exactly as before.
+"""
+from flask import request
+from sqlalchemy import String, cast
+from sqlalchemy.engine import Row
+
+from .models import Assignment, Batch, Staff, Student, Subject
+
+
+class FieldsError(ValueError):
+    """Raised for an empty or unknown ?fields= selection."""
+
+
+class FieldSet:
+    """Public field names of an endpoint's items, each backed by a column expression."""
+
+    def __init__(self, **columns):
+        self.columns = columns
+
+    def requested(self):
+        """The names in ?fields=, in request order, or None when all fields are wanted."""
+        raw = request.args.get('fields')
+        if raw is None:
+            return None
+        names = list(dict.fromkeys(n.strip() for n in raw.split(',') if n.strip()))
+        if not names:
+            raise FieldsError('fields must name at least one field')
+        unknown = [n for n in names if n not in self.columns]
+        if unknown:
+            raise FieldsError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(self.columns)}")
+        return names
+
+    def select(self, names):
+        return [self.columns[n].label(n) for n in names]
+
+    @staticmethod
+    def rows(rows, names):
+        # A one-column page from keyset_paginate comes back as bare values
+        return [dict(zip(names, row if isinstance(row, (tuple, Row)) else (row,))) for row in rows]
+
+
+STUDENT_FIELDS = FieldSet(
+    id=Student.id,
+    name=Student.name,
+    roll_no=Student.roll_no,
+    enrollment_no=Student.enrollment_no,
+    batch_number=Student.batch_number,
+)
+
+ASSIGNMENT_FIELDS = FieldSet(
+    id=Assignment.id,
+    staff_id=Assignment.staff_id,
+    staff_name=Staff.full_name,
+    subject_id=Assignment.subject_id,
+    subject_name=Subject.subject_name + ' (' + Subject.subject_code + ')',
+    batch_id=Assignment.batch_id,
+    batch_name=Batch.dept_name + ' ' + Batch.class_number + ' ('
+               + Batch.academic_year + ' Sem ' + cast(Batch.semester, String) + ')',
+    lecture_type=Assignment.lecture_type,
+    batch_number=Assignment.batch_number,
+)
@@ -91,6 +91,8 @@ class AttendanceRecord(db.Model):
     status       = db.Column(db.String, nullable=False) # present, absent
     lecture_count= db.Column(db.Integer, default=0, nullable=False)
     student = relationship("Student", back_populates="attendance_records")
+    # One row per student per session; repeated marks increment it (see app/schema.py for existing databases)
+    __table_args__ = (db.UniqueConstraint('assignment_id', 'student_id', 'date', name='uq_attendance_records_session'),)
 
 
 class TotalLectures(db.Model):
@@ -101,4 +103,30 @@ class TotalLectures(db.Model):
     lecture_count = db.Column(db.Integer, default=1, nullable=False)
     __table_args__ = (db.UniqueConstraint('assignment_id', 'date'),)
 
-    
+
+class AttendanceBitset(db.Model):
+    """Per-lecture attendance for one assignment on one day (see app/bitsets.py)."""
+    __tablename__ = 'attendance_bitsets'
+    id            = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('staff_subject_assignment.id'), nullable=False)
+    date          = db.Column(db.Date, nullable=False)
+    lecture_count = db.Column(db.Integer, default=0, nullable=False) # number of slots in `bits`
+    roster        = db.Column(db.LargeBinary, nullable=False) # sorted student ids, little-endian uint32
+    bits          = db.Column(db.LargeBinary, nullable=False) # one bitmap per lecture slot, bit i = roster[i] present
+    __table_args__ = (db.UniqueConstraint('assignment_id', 'date'),)
+
+
+class Term(db.Model):
+    __tablename__ = 'terms'
+    id            = db.Column(db.Integer, primary_key=True)
+    name          = db.Column(db.String, unique=True, nullable=False) # e.g. 2026-27 ODD
+    start_date    = db.Column(db.Date, nullable=False)
+    end_date      = db.Column(db.Date, nullable=False) # inclusive
+    is_closed     = db.Column(db.Boolean, default=False, nullable=False)
+    archived_at   = db.Column(db.DateTime, nullable=True) # set once moved to the columnar archive
+
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    revision      = db.Column(db.String, primary_key=True)
+    applied_at    = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,13 @@
+import importlib
+
+
+class MissingDependency(RuntimeError):
+    """An optional package needed by a feature is not installed."""
+
+
+def require(module_name, feature):
+    """Import an optional dependency on first use, with an actionable error if it is missing."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise MissingDependency(f"{feature} requires the '{module_name}' package (pip install {module_name}).")
@@ -0,0 +1,105 @@
+import base64
+import json
+from flask import request
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Raised for malformed sort, limit or cursor parameters."""
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_column, id_column):
+    """[sort, last value, last id] from `cursor`, the values typed like their columns."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != 3 or not isinstance(values[0], str):
+        raise PaginationError('Invalid cursor')
+    _, last_value, last_id = values
+    if not (last_value is None or _matches_column(last_value, sort_column)) \
+            or not _matches_column(last_id, id_column):
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def _matches_column(value, column):
+    # A list or object would otherwise reach the SQL comparison and fail there
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return False
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return True
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def is_paginated():
+    """List endpoints only switch to the paged response shape when asked to."""
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def keyset_paginate(query, sort_fields, default_sort, id_column):
+    """
+    Apply keyset (cursor) pagination to `query` using the request's
+    `sort`, `limit` and `cursor` arguments.
+
+    `sort_fields` maps public sort names to columns; `sort=-name` sorts
+    descending. `id_column` breaks ties so the ordering is total, which is
+    what lets the next page start with a WHERE on (sort value, id) instead of
+    an OFFSET scan. Returns (rows, next_cursor); rows keep the shape the
+    original query would have produced.
+    """
+    sort = request.args.get('sort', default_sort)
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in sort_fields:
+        raise PaginationError(f"Cannot sort by '{sort_name}'. Allowed: {', '.join(sorted(sort_fields))}")
+    sort_column = sort_fields[sort_name]
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_sort, last_value, last_id = decode_cursor(cursor, sort_column, id_column)
+        if cursor_sort != sort:
+            raise PaginationError('Cursor does not match the requested sort')
+        if descending:
+            query = query.filter(or_(sort_column < last_value,
+                                     and_(sort_column == last_value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_column > last_value,
+                                     and_(sort_column == last_value, id_column > last_id)))
+
+    single_entity = len(query.column_descriptions) == 1
+    order = (sort_column.desc(), id_column.desc()) if descending else (sort_column.asc(), id_column.asc())
+    rows = query.add_columns(sort_column.label('_sort_value'), id_column.label('_sort_id'))\
+                .order_by(None).order_by(*order)\
+                .limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([sort, rows[-1][-2], rows[-1][-1]])
+
+    rows = [row[0] if single_entity else tuple(row[:-2]) for row in rows]
+    return rows, next_cursor
+
+
+def page_response(items, next_cursor):
+    return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,211 @@
+"""
+Range partitioning of attendance_records and total_lectures by academic term.
+
+Postgres only. Each Term gets one partition per table covering
+[start_date, end_date]; rows outside every term land in a DEFAULT partition.
+Report queries that filter on `date` then only touch the partitions of the
+terms they ask for, and closed terms can be detached and archived whole.
+
+Run from the Flask CLI (FLASK_APP=run.py):
+
+    flask partitions convert            # one-off: turn the plain tables into partitioned ones
+    flask partitions ensure             # create partitions for every term (safe to run from cron)
+    flask partitions archive "2024-25 ODD" --dir archives --drop
+"""
+import gzip
+import os
+import re
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+PARTITIONED_TABLES = {
+    'attendance_records': {
+        'foreign_keys': [('assignment_id', 'staff_subject_assignment'), ('student_id', 'students')],
+        'unique': [('assignment_id', 'student_id', 'date')],
+        'indexes': [('assignment_id', 'date'), ('student_id',)],
+    },
+    'total_lectures': {
+        'foreign_keys': [('assignment_id', 'staff_subject_assignment')],
+        'unique': [('assignment_id', 'date')],
+        'indexes': [],
+    },
+}
+
+
+class PartitionError(RuntimeError):
+    pass
+
+
+def is_supported(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def is_partitioned(connection, table):
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table"
+    ), {'table': table}).scalar() is not None
+
+
+def partition_name(table, term):
+    slug = re.sub(r'[^a-z0-9]+', '_', term.name.lower()).strip('_')
+    return f"{table}_{slug}"
+
+
+def _table_exists(connection, name):
+    return connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None
+
+
+def convert_to_partitioned(connection, terms):
+    """
+    Rebuild both tables as RANGE (date) partitioned tables, keeping ids and the
+    id sequence. Partitioned tables need the partition key in every unique
+    constraint, so the primary key becomes (id, date).
+    """
+    for table, spec in PARTITIONED_TABLES.items():
+        if is_partitioned(connection, table):
+            continue
+
+        legacy = f"{table}_unpartitioned"
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table}).scalar()
+
+        connection.execute(text(f'ALTER TABLE {table} RENAME TO {legacy}'))
+        connection.execute(text(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (date)'
+        ))
+        connection.execute(text(f'ALTER TABLE {table} ADD PRIMARY KEY (id, date)'))
+        for columns in spec['unique']:
+            connection.execute(text(f'ALTER TABLE {table} ADD UNIQUE ({", ".join(columns)})'))
+        for column, target in spec['foreign_keys']:
+            connection.execute(text(f'ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {target} (id)'))
+        for columns in spec['indexes']:
+            connection.execute(text(f'CREATE INDEX ON {table} ({", ".join(columns)})'))
+        connection.execute(text(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT'))
+
+        connection.execute(text(f'INSERT INTO {table} SELECT * FROM {legacy}'))
+        if sequence:
+            # Keep the sequence alive once the legacy table (its owner) is dropped
+            connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id'))
+        connection.execute(text(f'DROP TABLE {legacy}'))
+
+    for term in terms:
+        create_term_partitions(connection, term)
+
+
+def create_term_partitions(connection, term):
+    """
+    Create this term's partition of each table, moving any rows that already
+    landed in the DEFAULT partition for its date range. Returns the names of
+    the partitions that were created.
+    """
+    created = []
+    start = term.start_date.isoformat()
+    end = (term.end_date + timedelta(days=1)).isoformat()
+
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table):
+            raise PartitionError(f"{table} is not partitioned yet; run 'flask partitions convert' first.")
+        name = partition_name(table, term)
+        if _table_exists(connection, name):
+            continue
+
+        connection.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+        connection.execute(text(
+            f'WITH moved AS (DELETE FROM {table}_default WHERE date >= :start AND date < :end RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ), {'start': start, 'end': end})
+        connection.execute(text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        created.append(name)
+    return created
+
+
+def ensure_term_partitions(connection, terms):
+    """Create any missing partitions; a no-op on databases that are not partitioned."""
+    if not is_supported(connection) or not all(is_partitioned(connection, t) for t in PARTITIONED_TABLES):
+        return []
+    created = []
+    for term in terms:
+        created.extend(create_term_partitions(connection, term))
+    return created
+
+
+def archive_term_partitions(connection, term, archive_dir=None, drop=False):
+    """
+    Detach the term's partitions. With `archive_dir`, each one is first dumped
+    as gzipped CSV (COPY ... TO STDOUT); with `drop`, the detached tables are
+    removed. Returns the archive file paths written.
+    """
+    written = []
+    for table in PARTITIONED_TABLES:
+        name = partition_name(table, term)
+        if not _table_exists(connection, name):
+            continue
+
+        connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            path = os.path.join(archive_dir, f"{name}.csv.gz")
+            cursor = connection.connection.driver_connection.cursor()
+            with gzip.open(path, 'wb') as out:
+                cursor.copy_expert(f'COPY {name} TO STDOUT WITH CSV HEADER', out)
+            written.append(path)
+
+        if drop:
+            connection.execute(text(f'DROP TABLE {name}'))
+    return written
+
+
+# --- CLI ---
+
+partitions_cli = AppGroup('partitions', help='Manage term partitions of the attendance tables.')
+
+
+def _terms():
+    from .models import Term
+    return Term.query.order_by(Term.start_date).all()
+
+
+@partitions_cli.command('convert')
+def convert_command():
+    """Convert attendance_records and total_lectures into partitioned tables."""
+    from . import db
+    with db.engine.begin() as connection:
+        if not is_supported(connection):
+            raise click.ClickException('Partitioning is only supported on PostgreSQL.')
+        convert_to_partitioned(connection, _terms())
+    click.echo('Attendance tables are partitioned by term.')
+
+
+@partitions_cli.command('ensure')
+def ensure_command():
+    """Create missing partitions for every term."""
+    from . import db
+    with db.engine.begin() as connection:
+        created = ensure_term_partitions(connection, _terms())
+    click.echo('\n'.join(created) if created else 'All term partitions exist.')
+
+
+@partitions_cli.command('archive')
+@click.argument('term_name')
+@click.option('--dir', 'archive_dir', default=None, help='Write each partition as gzipped CSV here first.')
+@click.option('--drop', is_flag=True, help='Drop the detached partitions.')
+def archive_command(term_name, archive_dir, drop):
+    """Detach (and optionally dump and drop) a term's partitions."""
+    from . import db
+    from .models import Term
+    term = Term.query.filter_by(name=term_name).first()
+    if not term:
+        raise click.ClickException(f"No term named '{term_name}'.")
+    if not term.is_closed and not click.confirm(f"Term '{term_name}' is not closed. Detach anyway?"):
+        return
+    with db.engine.begin() as connection:
+        written = archive_term_partitions(connection, term, archive_dir, drop)
+    for path in written:
+        click.echo(f"Wrote {path}")
+    click.echo(f"Detached partitions of '{term_name}'.")
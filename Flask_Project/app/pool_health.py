@@ -0,0 +1,124 @@
+"""
+Connection liveness checks only where they are needed.
+
+`pool_pre_ping` sends a `SELECT 1` on every checkout, which on a remote
+database doubles the latency of short requests. Instead, a connection is
+pinged only when it has sat idle in the pool for more than
+POOL_PING_IDLE_SECONDS (0 pings on every checkout, as pre-ping did); a
+failed ping makes the pool replace it before it is handed out. A statement that still hits a dropped connection is retried
+once if it is the first statement of the request (RoutingSession.execute).
+
+`metrics` counts checkouts, pings, failed pings, retries, and the checkouts
+that found the pool exhausted and how long they waited for a connection;
+GET /admin/db-health reports them.
+"""
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.retries = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'pings': self.pings,
+                'ping_failures': self.ping_failures,
+                'pings_skipped': self.checkouts - self.pings,
+                'retries': self.retries,
+                'pool_waits': self.waits,
+                'pool_wait_ms_avg': round(self.wait_total / self.waits * 1000, 3) if self.waits else 0,
+                'pool_wait_ms_max': round(self.wait_max * 1000, 3),
+            }
+
+
+metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts that had to wait for a connection waited."""
+
+    def _do_get(self):
+        # The condition QueuePool._do_get blocks on: no idle connection and no
+        # overflow left. Other checkouts return at once (or open a connection)
+        blocks = self._max_overflow > -1 and self._overflow >= self._max_overflow and self._pool.empty()
+        if not blocks:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.record_wait(time.perf_counter() - started)
+
+
+def configure_pool(app):
+    """
+    Use TimedQueuePool for server databases. Call before db.init_app so the
+    engines are created with it.
+    """
+    def adjust(options, url):
+        if str(url).startswith('sqlite'):
+            return options
+        return {'poolclass': TimedQueuePool, **options}
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = adjust(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+                                                     app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_BINDS'] = {
+        name: adjust(bind, bind.get('url', '')) if isinstance(bind, dict) else bind
+        for name, bind in app.config.get('SQLALCHEMY_BINDS', {}).items()
+    }
+
+
+def init_pool_health(app, db):
+    idle_seconds = app.config.get('POOL_PING_IDLE_SECONDS', 30)
+    with app.app_context():
+        pools = [engine.pool for engine in db.engines.values() if engine.dialect.name != 'sqlite']
+
+    def on_checkin(dbapi_connection, connection_record):
+        if dbapi_connection is not None:
+            connection_record.info['idle_since'] = time.monotonic()
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr('checkouts')
+        idle_since = connection_record.info.get('idle_since')
+        # New connections have never been checked in and need no ping
+        if idle_since is None or time.monotonic() - idle_since < idle_seconds:
+            return
+        metrics.incr('pings')
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except Exception:
+            metrics.incr('ping_failures')
+            # The pool discards this connection and checks out a fresh one
+            raise exc.DisconnectionError()
+
+    for pool in pools:
+        event.listen(pool, 'checkin', on_checkin)
+        event.listen(pool, 'checkout', on_checkout)
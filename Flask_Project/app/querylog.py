@@ -0,0 +1,164 @@
+"""
+N+1 query detection for development and tests.
+
+Every SQL statement is reduced to its shape (whitespace collapsed, IN lists
+of any length treated alike) and counted per request. When one shape runs
+QUERY_REPEAT_THRESHOLD times in a request -- the signature of a lazy load or
+a query inside a loop -- the detector logs a warning naming the route and
+the app line that issued it, or raises NPlusOneError when QUERY_DETECTOR is
+'raise'. Responses carry an X-Query-Count header while it is on.
+
+QUERY_DETECTOR is 'off', 'warn' or 'raise'; unset, it warns in debug mode.
+
+`query_budget(n)` counts the statements run inside a `with` block regardless
+of the setting, and fails if there were more than n; app/testing.py wraps it
+as a pytest fixture.
+"""
+import os
+import re
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import request
+from sqlalchemy import event
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Session/engine plumbing every query passes through; the call site is the caller of these
+_PLUMBING = tuple(os.path.join(_APP_DIR, name) for name in ('querylog.py', 'routing.py'))
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_IN_LIST = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+def statement_shape(statement):
+    return _IN_LIST.sub('(...)', _SPACE.sub(' ', statement).strip())
+
+
+def call_site():
+    """The innermost app frame that issued the query, as 'file:line in function'."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _PLUMBING:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+
+class QueryTracker:
+    """Statement counts for one request or `query_budget` block."""
+
+    def __init__(self, label, threshold=None, action=None, logger=None):
+        self.label = label
+        self.threshold = threshold
+        self.action = action
+        self.logger = logger
+        self.total = 0
+        self.shapes = Counter()
+        self.sites = {}
+
+    def record(self, statement):
+        shape = statement_shape(statement)
+        self.total += 1
+        self.shapes[shape] += 1
+        if shape not in self.sites:
+            self.sites[shape] = call_site()
+        if self.threshold and self.shapes[shape] == self.threshold:
+            self.flag(shape)
+
+    def flag(self, shape):
+        message = (f"{self.label}: the same query ran {self.threshold} times (possible N+1) "
+                   f"from {self.sites[shape]}: {shape[:300]}")
+        if self.action == 'raise':
+            raise NPlusOneError(message)
+        self.logger.warning(message)
+
+    def repeated(self, limit=5):
+        return [{'count': n, 'site': self.sites[shape], 'sql': shape[:300]}
+                for shape, n in self.shapes.most_common(limit) if n > 1]
+
+
+def _trackers():
+    if not hasattr(_local, 'trackers'):
+        _local.trackers = []
+    return _local.trackers
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for tracker in _trackers():
+        tracker.record(statement)
+
+
+@contextmanager
+def query_budget(max_queries, label='block'):
+    """Fail with AssertionError if the block runs more than `max_queries` statements."""
+    tracker = QueryTracker(label)
+    _trackers().append(tracker)
+    try:
+        yield tracker
+    finally:
+        _trackers().remove(tracker)
+    if tracker.total > max_queries:
+        details = '\n'.join(f"  {r['count']}x {r['site']}: {r['sql']}" for r in tracker.repeated())
+        raise AssertionError(f"{label} ran {tracker.total} queries (budget {max_queries})"
+                             + (f"; repeated:\n{details}" if details else ''))
+
+
+@contextmanager
+def request_tracking_paused():
+    """
+    Stop counting statements against the current request inside the block,
+    e.g. while it dispatches a sub-request that tracks its own.
+    """
+    tracker = request.environ.get('querylog.tracker')
+    paused = tracker is not None and tracker in _trackers()
+    if paused:
+        _trackers().remove(tracker)
+    try:
+        yield
+    finally:
+        if paused:
+            _trackers().append(tracker)
+
+
+def init_query_detector(app, db):
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+
+    configured = app.config.get('QUERY_DETECTOR')
+    if configured not in (None, '', 'off', 'warn', 'raise'):
+        raise ValueError(f"QUERY_DETECTOR must be 'off', 'warn' or 'raise', not '{configured}'.")
+    if configured == 'off':
+        return
+    threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 10)
+
+    @app.before_request
+    def _start_tracking():
+        # Decided per request: run.py switches debug on after create_app
+        mode = configured or ('warn' if app.debug else None)
+        if mode is None:
+            return
+        rule = request.url_rule.rule if request.url_rule else request.path
+        tracker = QueryTracker(f"{request.method} {rule}", threshold, mode, app.logger)
+        request.environ['querylog.tracker'] = tracker
+        _trackers().append(tracker)
+
+    @app.after_request
+    def _report_count(response):
+        tracker = request.environ.get('querylog.tracker')
+        if tracker is not None:
+            response.headers['X-Query-Count'] = str(tracker.total)
+        return response
+
+    @app.teardown_request
+    def _stop_tracking(exc):
+        tracker = request.environ.pop('querylog.tracker', None)
+        if tracker is not None and tracker in _trackers():
+            _trackers().remove(tracker)
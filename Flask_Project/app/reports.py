@@ -0,0 +1,452 @@
+from collections import defaultdict
+from flask import request
+from sqlalchemy import and_, or_
+from . import db
+from .models import Assignment, AttendanceRecord, TotalLectures, Student, Subject, Batch, Term, student_batches
+
+
+def requested_date_range():
+    """
+    (start, end) of the term named by ?term_id, or (None, None) for all time.
+    Filtering on the term's dates lets Postgres prune to that term's partitions.
+    """
+    term_id = request.args.get('term_id', type=int)
+    if not term_id:
+        return None, None
+    term = Term.query.get_or_404(term_id)
+    return term.start_date, term.end_date
+
+
+def filter_dates(query, column, date_range):
+    start, end = date_range
+    if start is None:
+        return query
+    return query.filter(column.between(start, end))
+
+
+def attendance_summary_query(*extra_columns, dept_code=None, batch_ids=None, subject_ids=None,
+                             student_ids=None, lecture_type=None, date_range=(None, None)):
+    """
+    Build a single grouped query returning one row per
+    (student, batch, subject, lecture_type) with attended and total lecture
+    counts, using the same rules as the per-batch attendance reports:
+
+    - TH assignments apply to every student in the batch.
+    - PR/TU assignments apply only to students whose batch_number matches.
+    - Attended counts only 'present' records.
+
+    Rows have the columns student_id, batch_id, subject_id, lecture_type,
+    attended, total, followed by `extra_columns` (which are also grouped by).
+    `date_range` limits both sums to (start, end) inclusive.
+    """
+    totals = filter_dates(db.session.query(
+        TotalLectures.assignment_id,
+        db.func.sum(TotalLectures.lecture_count).label('total')
+    ), TotalLectures.date, date_range).group_by(TotalLectures.assignment_id).subquery()
+
+    attended = filter_dates(db.session.query(
+        AttendanceRecord.assignment_id,
+        AttendanceRecord.student_id,
+        db.func.sum(AttendanceRecord.lecture_count).label('attended')
+    ).filter(AttendanceRecord.status == 'present'), AttendanceRecord.date, date_range)\
+     .group_by(AttendanceRecord.assignment_id, AttendanceRecord.student_id).subquery()
+
+    group_columns = [Student.id, Assignment.batch_id, Assignment.subject_id, Assignment.lecture_type, *extra_columns]
+
+    query = db.session.query(
+        Student.id.label('student_id'),
+        Assignment.batch_id.label('batch_id'),
+        Assignment.subject_id.label('subject_id'),
+        Assignment.lecture_type.label('lecture_type'),
+        db.func.coalesce(db.func.sum(attended.c.attended), 0).label('attended'),
+        db.func.coalesce(db.func.sum(totals.c.total), 0).label('total'),
+        *extra_columns
+    ).select_from(student_batches)\
+     .join(Student, Student.id == student_batches.c.student_id)\
+     .join(Assignment, and_(
+         Assignment.batch_id == student_batches.c.batch_id,
+         or_(Assignment.lecture_type == 'TH', Assignment.batch_number == Student.batch_number)
+     ))\
+     .join(Subject, Subject.id == Assignment.subject_id)\
+     .outerjoin(totals, totals.c.assignment_id == Assignment.id)\
+     .outerjoin(attended, and_(attended.c.assignment_id == Assignment.id,
+                               attended.c.student_id == Student.id))
+
+    if dept_code is not None:
+        query = query.filter(Subject.dept_code == dept_code)
+    if batch_ids is not None:
+        query = query.filter(Assignment.batch_id.in_(batch_ids))
+    if subject_ids is not None:
+        query = query.filter(Assignment.subject_id.in_(subject_ids))
+    if student_ids is not None:
+        query = query.filter(Student.id.in_(student_ids))
+    if lecture_type is not None:
+        query = query.filter(Assignment.lecture_type == lecture_type)
+
+    return query.group_by(*group_columns)
+
+
+def extra_sums(assignment_ids, date_range=(None, None)):
+    """
+    Lecture totals per assignment and attended counts per (assignment,
+    student) that SUM()s over the attendance tables miss: closed terms in the
+    columnar archive, and sessions stored as bitsets (attended only; their
+    totals are in TotalLectures).
+    """
+    from .archive import archived_sums
+    from .bitsets import attended_sums
+
+    totals, attended = archived_sums(assignment_ids, date_range)
+    for key, count in attended_sums(assignment_ids, date_range).items():
+        attended[key] += count
+    return totals, attended
+
+
+def percentage(attended, total):
+    return round(attended / total * 100, 2) if total else 0
+
+
+def department_defaulters(dept_code, threshold, semester=None, batch_id=None, lecture_type=None,
+                          date_range=(None, None)):
+    """
+    Every (student, subject, lecture type) in the department whose attendance
+    is below `threshold` percent, lowest first. One aggregation over the
+    attendance tables; the threshold is applied once the counts stored
+    elsewhere (bitset sessions, archived terms) are added.
+    """
+    query = attendance_summary_query(
+        Student.roll_no, Student.name, Student.enrollment_no, Student.batch_number,
+        Subject.subject_code, Subject.subject_name,
+        Batch.dept_name, Batch.class_number, Batch.academic_year, Batch.semester,
+        dept_code=dept_code,
+        batch_ids=[batch_id] if batch_id else None,
+        lecture_type=lecture_type,
+        date_range=date_range,
+    ).join(Batch, Batch.id == Assignment.batch_id)
+
+    if semester is not None:
+        query = query.filter(Batch.semester == semester)
+
+    counts = _with_extra_counts(query.all(), dept_code, date_range)
+    counts = [(r, attended, total) for r, attended, total in counts
+              if total > 0 and attended * 100.0 < total * threshold]
+
+    result = [{
+        'student_id': r.student_id,
+        'roll_no': r.roll_no,
+        'name': r.name,
+        'enrollment_no': r.enrollment_no,
+        'batch_id': r.batch_id,
+        'batch_name': f"{r.dept_name} {r.class_number} ({r.academic_year} Sem {r.semester})",
+        'subject_id': r.subject_id,
+        'subject_name': f"{r.subject_name} ({r.subject_code})",
+        'lecture_type': r.lecture_type,
+        'attended_lectures': attended,
+        'total_lectures': total,
+        'percentage': percentage(attended, total),
+    } for r, attended, total in counts]
+    result.sort(key=lambda d: (d['percentage'], d['roll_no'], d['subject_name'], d['lecture_type']))
+    return result
+
+
+def _with_extra_counts(rows, dept_code, date_range):
+    """(row, attended, total) for summary rows, with the `extra_sums` counts added."""
+    assignments = Assignment.query.join(Subject, Subject.id == Assignment.subject_id)\
+        .filter(Subject.dept_code == dept_code).all()
+    extra_totals, extra_attended = extra_sums([a.id for a in assignments], date_range)
+    by_cell = defaultdict(list)
+    for a in assignments:
+        by_cell[(a.batch_id, a.subject_id, a.lecture_type)].append(a)
+
+    counts = []
+    for r in rows:
+        attended, total = int(r.attended), int(r.total)
+        for a in by_cell[(r.batch_id, r.subject_id, r.lecture_type)]:
+            if a.lecture_type == 'TH' or a.batch_number == r.batch_number:
+                attended += extra_attended.get((a.id, r.student_id), 0)
+                total += extra_totals.get(a.id, 0)
+        counts.append((r, attended, total))
+    return counts
+
+
+def _add_extra_cells(batch, students, column_index, attended, total, dept_code, date_range):
+    """Fold the `extra_sums` counts into the consolidated matrix cells."""
+    query = Assignment.query.filter(Assignment.batch_id == batch.id)
+    if dept_code is not None:
+        query = query.join(Subject, Subject.id == Assignment.subject_id).filter(Subject.dept_code == dept_code)
+    assignments = query.all()
+    extra_totals, extra_attended = extra_sums([a.id for a in assignments], date_range)
+
+    for a in assignments:
+        j = column_index.get((a.subject_id, a.lecture_type))
+        if j is None:
+            continue
+        for i, s in enumerate(students):
+            if a.lecture_type == 'TH' or a.batch_number == s.batch_number:
+                total[j][i] = (total[j][i] or 0) + extra_totals.get(a.id, 0)
+                attended[j][i] = (attended[j][i] or 0) + extra_attended.get((a.id, s.id), 0)
+
+
+LECTURE_TYPE_ORDER = {'TH': 0, 'PR': 1, 'TU': 2}
+
+
+def student_profile(student, date_range=(None, None)):
+    """
+    One student's attended/total/percentage for every subject and lecture
+    type across all of their batches, from a single aggregation.
+    """
+    rows = attendance_summary_query(
+        Subject.subject_code, Subject.subject_name,
+        student_ids=[student.id], date_range=date_range
+    ).all()
+    cells = {(r.batch_id, r.subject_id, r.lecture_type): [r.subject_code, r.subject_name, int(r.attended), int(r.total)]
+             for r in rows}
+
+    assignments = Assignment.query.filter(
+        Assignment.batch_id.in_([b.id for b in student.batches]),
+        or_(Assignment.lecture_type == 'TH', Assignment.batch_number == student.batch_number)
+    ).all()
+    extra_totals, extra_attended = extra_sums([a.id for a in assignments], date_range)
+    for a in assignments:
+        cell = cells.get((a.batch_id, a.subject_id, a.lecture_type))
+        if cell is not None:
+            cell[2] += extra_attended.get((a.id, student.id), 0)
+            cell[3] += extra_totals.get(a.id, 0)
+
+    subjects = [{
+        'batch_id': batch_id,
+        'subject_id': subject_id,
+        'subject_code': code,
+        'subject_name': name,
+        'lecture_type': lecture_type,
+        'attended_lectures': attended,
+        'total_lectures': total,
+        'percentage': percentage(attended, total),
+    } for (batch_id, subject_id, lecture_type), (code, name, attended, total) in cells.items()]
+    subjects.sort(key=lambda s: (s['subject_code'], LECTURE_TYPE_ORDER.get(s['lecture_type'], 99)))
+
+    attended = sum(s['attended_lectures'] for s in subjects)
+    total = sum(s['total_lectures'] for s in subjects)
+    return {
+        'student': {
+            'id': student.id,
+            'enrollment_no': student.enrollment_no,
+            'roll_no': student.roll_no,
+            'name': student.name,
+            'batch_number': student.batch_number,
+        },
+        'batches': [{
+            'id': b.id,
+            'dept_name': b.dept_name,
+            'class_number': b.class_number,
+            'academic_year': b.academic_year,
+            'semester': b.semester,
+        } for b in sorted(student.batches, key=lambda b: b.id)],
+        'subjects': subjects,
+        'overall': {'attended_lectures': attended, 'total_lectures': total, 'percentage': percentage(attended, total)},
+    }
+
+
+def consolidated_matrix(batch, dept_code=None, date_range=(None, None)):
+    """
+    The official consolidated sheet for a batch: one row per student and one
+    column per (subject, lecture type), built from a single aggregation.
+
+    The layout is columnar to keep the payload small: student fields are
+    parallel arrays, and `attended`/`total`/`percentage` hold one array per
+    column aligned with the student order. A null cell means the column does
+    not apply to that student (e.g. a PR sub-batch they are not in).
+    """
+    students = sorted(batch.students, key=lambda s: s.roll_no)
+    row_index = {s.id: i for i, s in enumerate(students)}
+
+    rows = attendance_summary_query(
+        Subject.subject_code, Subject.subject_name,
+        dept_code=dept_code, batch_ids=[batch.id], date_range=date_range
+    ).all()
+
+    column_keys = sorted(
+        {(r.subject_id, r.lecture_type, r.subject_code, r.subject_name) for r in rows},
+        key=lambda c: (c[2], LECTURE_TYPE_ORDER.get(c[1], 99), c[1])
+    )
+    column_index = {(c[0], c[1]): i for i, c in enumerate(column_keys)}
+
+    attended = [[None] * len(students) for _ in column_keys]
+    total = [[None] * len(students) for _ in column_keys]
+    percent = [[None] * len(students) for _ in column_keys]
+    for r in rows:
+        i = row_index.get(r.student_id)
+        if i is None:
+            continue
+        j = column_index[(r.subject_id, r.lecture_type)]
+        attended[j][i] = int(r.attended)
+        total[j][i] = int(r.total)
+
+    _add_extra_cells(batch, students, column_index, attended, total, dept_code, date_range)
+    for j in range(len(column_keys)):
+        for i in range(len(students)):
+            if total[j][i] is not None:
+                percent[j][i] = percentage(attended[j][i], total[j][i])
+
+    return {
+        'batch': {
+            'id': batch.id,
+            'dept_name': batch.dept_name,
+            'class_number': batch.class_number,
+            'academic_year': batch.academic_year,
+            'semester': batch.semester,
+        },
+        'columns': [{
+            'subject_id': subject_id,
+            'subject_code': subject_code,
+            'subject_name': subject_name,
+            'lecture_type': lecture_type,
+        } for subject_id, lecture_type, subject_code, subject_name in column_keys],
+        'students': {
+            'id': [s.id for s in students],
+            'roll_no': [s.roll_no for s in students],
+            'enrollment_no': [s.enrollment_no for s in students],
+            'name': [s.name for s in students],
+            'batch_number': [s.batch_number for s in students],
+        },
+        'attended': attended,
+        'total': total,
+        'percentage': percent,
+    }
+
+
+# --- Compact historical grid ---
+def historical_grid(students, assignments, start_date, end_date, column_offset=0, column_limit=None):
+    """
+    Per-lecture P/A grid of `students` over `assignments` (one subject of a
+    batch) between two dates, as (headers, student_rows, total_columns). Each
+    lecture held is a column labelled "Lec no. N dd-mm-yyyy"; a student gets a
+    row only if at least one assignment applies to them (theory, or their
+    practical sub-batch).
+
+    `column_offset`/`column_limit` select a window of the lecture columns.
+    Numbering is over the whole range, so "Lec no." stays the same in every
+    window, and attendance is only read for the window's dates.
+    """
+    from .archive import archived_records, archived_sessions
+    from .bitsets import load_sessions
+
+    assignment_ids = [a.id for a in assignments]
+    assignment_map = {a.id: a for a in assignments}
+
+    # Lecture totals are one row per session, so the full sequence is cheap to build
+    total_lectures = TotalLectures.query.filter(
+        TotalLectures.assignment_id.in_(assignment_ids),
+        TotalLectures.date.between(start_date, end_date)
+    ).order_by(TotalLectures.date, TotalLectures.assignment_id).all()
+
+    # Closed terms live in the columnar archive instead of the tables
+    archived, archived_totals = archived_records(assignment_ids, (start_date, end_date))
+    if archived_totals:
+        total_lectures = sorted(total_lectures + archived_totals, key=lambda lec: (lec.date, lec.assignment_id))
+
+    # One instance per lecture held; multi-hour sessions get one per hour (slot)
+    sequence = [(lec, slot) for lec in total_lectures for slot in range(lec.lecture_count)]
+    held = {assignment_map[lec.assignment_id] for lec, _ in sequence}
+    window_end = len(sequence) if column_limit is None else column_offset + column_limit
+
+    lecture_instances = {}
+    session_keys = defaultdict(list)
+    for number, (lec, slot) in enumerate(sequence, start=1):
+        if not column_offset < number <= window_end:
+            continue
+        key = f"{lec.date.isoformat()}-{lec.assignment_id}-{slot}"
+        lecture_instances[key] = {'id': number, 'date': lec.date, 'assignment_id': lec.assignment_id, 'slot': slot}
+        session_keys[(lec.assignment_id, lec.date)].append(key)
+
+    headers = [{
+        'id': key,
+        'label': f"Lec no. {details['id']} {details['date'].strftime('%d-%m-%Y')}"
+    } for key, details in lecture_instances.items()]
+
+    student_attendance_map = defaultdict(dict)
+    if lecture_instances:
+        days = [details['date'] for details in lecture_instances.values()]
+        window_dates = (days[0], days[-1])
+        all_records = AttendanceRecord.query.filter(
+            AttendanceRecord.assignment_id.in_(assignment_ids),
+            AttendanceRecord.date.between(*window_dates)
+        ).all()
+        all_records += [r for r in archived if window_dates[0] <= r.date <= window_dates[1]]
+
+        # Sessions stored as bitsets have exact per-lecture attendance
+        sessions = load_sessions(assignment_ids, window_dates)
+        if archived_totals:
+            sessions.update(archived_sessions(assignment_ids, window_dates))
+        for key, details in lecture_instances.items():
+            slots = sessions.get((details['assignment_id'], details['date']))
+            if slots is not None and details['slot'] < len(slots):
+                for student_id in slots[details['slot']]:
+                    student_attendance_map[student_id][key] = 'P'
+
+        # Otherwise only the count is known: the first N lectures of the day are 'P'
+        for record in all_records:
+            if (record.assignment_id, record.date) in sessions:
+                continue
+            for key in session_keys.get((record.assignment_id, record.date), ()):
+                i = lecture_instances[key]['slot']
+                student_attendance_map[record.student_id][key] = 'P' if i < record.lecture_count else 'A'
+
+    def applies_to(assignment, student):
+        # Theory applies to everyone; practicals/tutorials only to the matching sub-batch
+        return assignment.lecture_type == 'TH' or (assignment.batch_number and assignment.batch_number == student.batch_number)
+
+    student_rows = []
+    for student in students:
+        # Rows depend on the whole range, not the window, so every window has the same rows
+        if not any(applies_to(a, student) for a in held):
+            continue
+        attendance = {}
+        for key, details in lecture_instances.items():
+            if applies_to(assignment_map[details['assignment_id']], student):
+                attendance[key] = student_attendance_map[student.id].get(key, 'A')
+        student_rows.append({
+            'id': student.id,
+            'roll_no': student.roll_no,
+            'enrollment_no': student.enrollment_no,
+            'name': student.name,
+            'batch_number': student.batch_number,
+            'attendance': attendance
+        })
+    return headers, student_rows, len(sequence)
+
+
+# The historical grid's per-student {header_id: 'P'|'A'} dicts repeat every
+# header id once per student. The compact formats send the headers once and
+# one string per student aligned to header order:
+#   packed: one character per header, 'P', 'A', or '-' (not applicable)
+#   rle:    runs of the packed string, e.g. 'P12A1P7-20'
+# src/lib/compactGrid.ts expands both back to the full layout.
+
+GRID_FORMATS = ('full', 'packed', 'rle')
+MAX_COLUMN_WINDOW = 500  # most lecture columns one historical grid window may return
+NOT_APPLICABLE = '-'
+
+
+def pack_attendance(attendance, header_ids):
+    return ''.join(attendance.get(h, NOT_APPLICABLE) for h in header_ids)
+
+
+def run_length(packed):
+    runs = []
+    start = 0
+    for i in range(1, len(packed) + 1):
+        if i == len(packed) or packed[i] != packed[start]:
+            runs.append(f"{packed[start]}{i - start}")
+            start = i
+    return ''.join(runs)
+
+
+def compact_grid(headers, student_rows, fmt):
+    """Re-encode a historical grid ({'headers', 'students'}) as 'packed' or 'rle'."""
+    header_ids = [h['id'] for h in headers]
+    students = []
+    for row in student_rows:
+        packed = pack_attendance(row['attendance'], header_ids)
+        students.append({**row, 'attendance': run_length(packed) if fmt == 'rle' else packed})
+    return {'format': fmt, 'headers': headers, 'students': students}
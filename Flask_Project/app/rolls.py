@@ -0,0 +1,117 @@
+"""
+Roll-number expressions for marking attendance.
+
+Staff can type `1-10,15,22-25` instead of listing every roll. Ranges keep
+zero padding (`01-03` -> 01, 02, 03) and a shared prefix (`A1-A3` ->
+A1, A2, A3); anything else is taken as a literal roll number. A roll
+matches the roster by number as well, so `1-10` finds `01` and `A7`
+finds `A07`.
+"""
+import re
+
+MAX_RANGE = 1000
+
+_RANGE = re.compile(r'^([^\d\s-]*)(\d+)-\1?(\d+)$')
+_NUMBERED = re.compile(r'^([^\d\s-]*)0*(\d+)$')
+
+
+class RollExpressionError(ValueError):
+    pass
+
+
+def parse_rolls(expression, known=()):
+    """
+    Expand a roll expression into roll numbers, in order and without
+    duplicates. A string is split on commas, then on whitespace; a list is
+    taken element by element, each split on commas only. Pieces found in
+    `known` are taken literally, so a roll number that contains a space
+    ("A 12") is never split and one with a hyphen never read as a range.
+    """
+    if isinstance(expression, (list, tuple)):
+        tokens = [t for part in expression for t in _split(str(part), known, r',')]
+    else:
+        tokens = [t for piece in str(expression).split(',') for t in _split(piece, known, r'\s+')]
+    rolls = []
+    seen = set()
+    for token in tokens:
+        for roll in ([token] if token in known else _expand(token)):
+            if roll not in seen:
+                seen.add(roll)
+                rolls.append(roll)
+    return rolls
+
+
+def _split(text, known, separators):
+    text = text.strip()
+    if text in known:
+        return [text]
+    return [t.strip() for t in re.split(separators, text) if t.strip()]
+
+
+def _expand(token):
+    match = _RANGE.match(token)
+    if not match:
+        return [token]
+    prefix, start, end = match.groups()
+    low, high = int(start), int(end)
+    if high < low:
+        raise RollExpressionError(f"Range '{token}' runs backwards.")
+    if high - low >= MAX_RANGE:
+        raise RollExpressionError(f"Range '{token}' is too large.")
+    width = len(start) if start.startswith('0') else 0
+    return [f"{prefix}{n:0{width}d}" for n in range(low, high + 1)]
+
+
+def _number_key(roll):
+    match = _NUMBERED.match(roll)
+    return (match.group(1).lower(), int(match.group(2))) if match else None
+
+
+class RollIndex:
+    """Roll number -> student for one attendance session's roster."""
+
+    def __init__(self, students):
+        self.students = list(students)
+        self.by_roll = {s.roll_no: s for s in self.students}
+        # (prefix, number) -> student, for rolls typed without their zero padding;
+        # None where two rolls share a number ("7" and "07")
+        self.by_number = {}
+        for roll, student in self.by_roll.items():
+            key = _number_key(roll)
+            if key is not None:
+                self.by_number[key] = None if key in self.by_number else student
+
+    def parse(self, expression):
+        return parse_rolls(expression, known=self.by_roll)
+
+    def find(self, roll):
+        """The student with this roll number, exactly or by number; None if unknown."""
+        roll = str(roll).strip()
+        student = self.by_roll.get(roll)
+        if student is None:
+            key = _number_key(roll)
+            student = self.by_number.get(key) if key is not None else None
+        return student
+
+    def resolve(self, rolls):
+        """(students found, rolls not on the roster)."""
+        found, invalid = [], []
+        seen = set()
+        for roll in rolls:
+            student = self.find(roll)
+            if student is None:
+                invalid.append(roll)
+            elif id(student) not in seen:
+                seen.add(id(student))
+                found.append(student)
+        return found, invalid
+
+    @staticmethod
+    def describe(student):
+        return {
+            'id': student.id,
+            'name': student.name,
+            'roll_no': student.roll_no,
+            'enrollment_no': student.enrollment_no,
+            'batch_number': student.batch_number
+        }
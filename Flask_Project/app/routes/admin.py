@@ -1,17 +1,33 @@
 
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app, send_file
 from sqlalchemy.exc import IntegrityError, OperationalError
 from ..models import (
     Staff, Subject, Assignment, Department,
-    Batch, Student, student_batches, TotalLectures, AttendanceRecord, HOD
+    Batch, Student, student_batches, TotalLectures, AttendanceRecord, HOD, Term
 )
 from .. import db, bcrypt
-from ..auth import admin_required
+from ..auth import admin_required, load_scope, invalidate_scopes
+from ..routing import replica_read
+from ..pagination import keyset_paginate, is_paginated, page_response, PaginationError
+from ..fields import STUDENT_FIELDS, ASSIGNMENT_FIELDS, FieldsError
+from ..cache import cache, attendance_namespaces, invalidate_attendance, invalidate_students
+from ..reports import (
+    consolidated_matrix, requested_date_range, filter_dates, extra_sums, compact_grid, historical_grid, GRID_FORMATS,
+    MAX_COLUMN_WINDOW
+)
+from ..partitions import ensure_term_partitions, PartitionError
+from ..archive import frozen_term
+from ..analytics import load_matrix
+from ..bitsets import set_attended, session_records, delete_for_assignment as delete_bitsets
+from ..optional import MissingDependency
+from ..pool_health import metrics as pool_metrics
+from ..assignment_import import import_request
+from ..workbook import start_export, read_job, workbook_path, download_name
+from ..search import search_students, invalidate_search
 import csv
 import io
 from datetime import datetime, timedelta, date
-from collections import defaultdict
 
 
 admin_bp = Blueprint('admin', __name__)
@@ -103,7 +119,11 @@ def _process_student_csv(file_stream, batch_id):
                 if student.id not in existing_student_ids:
                     batch.students.append(student)
 
+        # Ids taken now: the commit expires every uploaded student
+        student_ids = [s.id for s in students_to_associate]
         db.session.commit()
+        invalidate_students(student_ids)
+        invalidate_search()
 
     except ValueError as e:
         db.session.rollback()
@@ -132,12 +152,34 @@ def admin_login():
 # -- Staff CRUD --
 @admin_bp.route('/staff', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_staff():
     if request.method == 'GET':
-        result = [
-            {'id': s.id, 'username': s.username, 'full_name': s.full_name}
-            for s in Staff.query.all()
-        ]
+        query = Staff.query
+        dept = request.args.get('dept')
+        if dept:
+            # Staff who teach at least one subject of the department
+            dept_staff_ids = db.session.query(Assignment.staff_id)\
+                .join(Subject, Assignment.subject_id == Subject.id)\
+                .filter(Subject.dept_code == dept)
+            query = query.filter(Staff.id.in_(dept_staff_ids))
+
+        if not is_paginated():
+            staff = query.order_by(Staff.id).all()
+            next_cursor = None
+        else:
+            try:
+                staff, next_cursor = keyset_paginate(
+                    query,
+                    {'id': Staff.id, 'full_name': Staff.full_name, 'username': Staff.username},
+                    'id', Staff.id
+                )
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+
+        result = [{'id': s.id, 'username': s.username, 'full_name': s.full_name} for s in staff]
+        if is_paginated():
+            return jsonify(page_response(result, next_cursor)), 200
         return jsonify(result), 200
 
     # POST → create new staff
@@ -193,10 +235,12 @@ def update_delete_staff(staff_id):
         for assignment in assignments_to_delete:
             AttendanceRecord.query.filter_by(assignment_id=assignment.id).delete()
             TotalLectures.query.filter_by(assignment_id=assignment.id).delete()
+            delete_bitsets(assignment.id)
             db.session.delete(assignment)
             
         db.session.delete(staff)
         db.session.commit()
+        cache.bump_all()
     except IntegrityError:
         db.session.rollback()
         return jsonify({'error': 'Cannot delete staff as they are referenced elsewhere.'}), 400
@@ -209,6 +253,7 @@ def update_delete_staff(staff_id):
 # -- Department CRUD --
 @admin_bp.route('/departments', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_departments():
     if request.method == 'GET':
         result = [
@@ -250,6 +295,7 @@ def update_delete_department(dept_code):
             dept.dept_name = data['dept_name']
         try:
             db.session.commit()
+            invalidate_scopes()
         except OperationalError:
             db.session.rollback()
             return jsonify({'error': 'Database connection error, please retry'}), 500
@@ -275,9 +321,29 @@ def update_delete_department(dept_code):
 # -- Subject CRUD --
 @admin_bp.route('/subjects', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_subjects():
     if request.method == 'GET':
-        subjects = Subject.query.all()
+        query = Subject.query
+        if request.args.get('dept'):
+            query = query.filter(Subject.dept_code == request.args['dept'])
+        if request.args.get('semester', type=int):
+            query = query.filter(Subject.semester_number == request.args.get('semester', type=int))
+
+        if not is_paginated():
+            subjects = query.order_by(Subject.id).all()
+            next_cursor = None
+        else:
+            try:
+                subjects, next_cursor = keyset_paginate(
+                    query,
+                    {'id': Subject.id, 'subject_name': Subject.subject_name,
+                     'subject_code': Subject.subject_code, 'semester_number': Subject.semester_number},
+                    'id', Subject.id
+                )
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+
         result = [{
             'id': sub.id,
             'course_code': sub.course_code,
@@ -286,6 +352,8 @@ def manage_subjects():
             'subject_code': sub.subject_code,
             'subject_name': sub.subject_name
         } for sub in subjects]
+        if is_paginated():
+            return jsonify(page_response(result, next_cursor)), 200
         return jsonify(result), 200
 
     data = request.json or {}
@@ -340,10 +408,12 @@ def update_delete_subject(sub_id):
         for assignment in assignments_to_delete:
             AttendanceRecord.query.filter_by(assignment_id=assignment.id).delete()
             TotalLectures.query.filter_by(assignment_id=assignment.id).delete()
+            delete_bitsets(assignment.id)
             db.session.delete(assignment)
 
         db.session.delete(sub)
         db.session.commit()
+        cache.bump_all()
     except IntegrityError:
         db.session.rollback()
         return jsonify({'error': 'Cannot delete subject as it is referenced elsewhere.'}), 400
@@ -356,18 +426,48 @@ def update_delete_subject(sub_id):
 # -- Batch and Student Management --
 @admin_bp.route('/batches', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_batches():
     if request.method == 'GET':
-        # ... (GET logic remains the same) ...
-        batches = Batch.query.all()
+        # Count students in SQL instead of loading every batch's student list
+        student_counts = db.session.query(
+            student_batches.c.batch_id, db.func.count().label('student_count')
+        ).group_by(student_batches.c.batch_id).subquery()
+
+        query = db.session.query(Batch, db.func.coalesce(student_counts.c.student_count, 0))\
+            .outerjoin(student_counts, student_counts.c.batch_id == Batch.id)
+        if request.args.get('dept'):
+            dept_names = db.session.query(Department.dept_name).filter(Department.dept_code == request.args['dept'])
+            query = query.filter(Batch.dept_name.in_(dept_names))
+        if request.args.get('semester', type=int):
+            query = query.filter(Batch.semester == request.args.get('semester', type=int))
+        if request.args.get('academic_year'):
+            query = query.filter(Batch.academic_year == request.args['academic_year'])
+
+        if not is_paginated():
+            batches = query.order_by(Batch.id).all()
+            next_cursor = None
+        else:
+            try:
+                batches, next_cursor = keyset_paginate(
+                    query,
+                    {'id': Batch.id, 'semester': Batch.semester,
+                     'academic_year': Batch.academic_year, 'class_number': Batch.class_number},
+                    'id', Batch.id
+                )
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+
         result = [{
             'id': b.id,
             'dept_name': b.dept_name,
             'class_number': b.class_number,
             'academic_year': b.academic_year,
             'semester': b.semester,
-            'student_count': len(b.students)
-        } for b in batches]
+            'student_count': student_count
+        } for b, student_count in batches]
+        if is_paginated():
+            return jsonify(page_response(result, next_cursor))
         return jsonify(result)
 
     # POST
@@ -420,14 +520,27 @@ def manage_batches():
 def manage_single_batch(batch_id):
     batch = Batch.query.get_or_404(batch_id)
     if request.method == 'GET':
-        students = sorted(batch.students, key=lambda s: s.roll_no)
+        # ?fields=id,roll_no selects just those student columns
+        try:
+            fields = STUDENT_FIELDS.requested()
+        except FieldsError as e:
+            return jsonify({'error': str(e)}), 400
+        if fields:
+            rows = db.session.query(*STUDENT_FIELDS.select(fields)).select_from(Student)\
+                .join(student_batches, student_batches.c.student_id == Student.id)\
+                .filter(student_batches.c.batch_id == batch.id)\
+                .order_by(Student.roll_no).all()
+            student_items = STUDENT_FIELDS.rows(rows, fields)
+        else:
+            students = sorted(batch.students, key=lambda s: s.roll_no)
+            student_items = [{'id': s.id, 'name': s.name, 'roll_no': s.roll_no, 'enrollment_no': s.enrollment_no, 'batch_number': s.batch_number} for s in students]
         return jsonify({
             'id': batch.id,
             'dept_name': batch.dept_name,
             'class_number': batch.class_number,
             'academic_year': batch.academic_year,
             'semester': batch.semester,
-            'students': [{'id': s.id, 'name': s.name, 'roll_no': s.roll_no, 'enrollment_no': s.enrollment_no, 'batch_number': s.batch_number} for s in students]
+            'students': student_items
         })
 
     # DELETE
@@ -437,6 +550,7 @@ def manage_single_batch(batch_id):
         for assignment in assignments_to_delete:
             AttendanceRecord.query.filter_by(assignment_id=assignment.id).delete()
             TotalLectures.query.filter_by(assignment_id=assignment.id).delete()
+            delete_bitsets(assignment.id)
             db.session.delete(assignment)
 
         # Get students BEFORE disassociating them
@@ -456,6 +570,7 @@ def manage_single_batch(batch_id):
         # Finally, delete the batch itself
         db.session.delete(batch)
         db.session.commit()
+        cache.bump_all()
     except IntegrityError as e:
         db.session.rollback()
         return jsonify({'error': 'Cannot delete batch due to a data conflict.', 'details': str(e)}), 400
@@ -466,32 +581,99 @@ def manage_single_batch(batch_id):
     return jsonify({'message': 'Batch and all its students deleted'})
 
 
+@admin_bp.route('/batches/<int:batch_id>/consolidated', methods=['GET'])
+@admin_required
+@replica_read
+def get_consolidated_report(batch_id):
+    """Consolidated attendance sheet for a batch across all its subjects."""
+    batch = Batch.query.get_or_404(batch_id)
+    return jsonify(consolidated_matrix(batch, date_range=requested_date_range()))
+
+
+@admin_bp.route('/batches/<int:batch_id>/analytics', methods=['GET'])
+@admin_required
+@replica_read
+def get_batch_analytics(batch_id):
+    """Per-subject percentages, defaulter counts and overall ranking for a batch."""
+    Batch.query.get_or_404(batch_id)
+    try:
+        threshold = float(request.args.get('threshold', 75))
+    except ValueError:
+        return jsonify({'error': 'threshold must be a number'}), 400
+    try:
+        matrix = load_matrix(batch_id=batch_id, subject_id=request.args.get('subject_id', type=int),
+                             lecture_type=request.args.get('lecture_type'), date_range=requested_date_range())
+    except MissingDependency as e:
+        return jsonify({'error': str(e)}), 501
+    return jsonify(matrix.summary(threshold))
+
+
 # -- Assignment CRUD --
 @admin_bp.route('/assignments', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_assignments():
     if request.method == 'GET':
-        assignments = db.session.query(
+        try:
+            fields = ASSIGNMENT_FIELDS.requested()
+        except FieldsError as e:
+            return jsonify({'error': str(e)}), 400
+
+        query = db.session.query(
             Assignment, Staff.full_name, Subject.subject_name, Subject.subject_code, 
             Batch.dept_name, Batch.class_number, Batch.academic_year, Batch.semester
-        ).join(Staff, Assignment.staff_id == Staff.id)\
+        ).select_from(Assignment)\
+         .join(Staff, Assignment.staff_id == Staff.id)\
          .join(Subject, Assignment.subject_id == Subject.id)\
-         .join(Batch, Assignment.batch_id == Batch.id).all()
-
-        result = []
-        for a, staff_name, subject_name, subject_code, dept_name, class_number, academic_year, semester in assignments:
-            batch_name = f"{dept_name} {class_number} ({academic_year} Sem {semester})"
-            result.append({
-                'id': a.id,
-                'staff_id': a.staff_id,
-                'staff_name': staff_name,
-                'subject_id': a.subject_id,
-                'subject_name': f"{subject_name} ({subject_code})",
-                'batch_id': a.batch_id,
-                'batch_name': batch_name,
-                'lecture_type': a.lecture_type,
-                'batch_number': a.batch_number,
-            })
+         .join(Batch, Assignment.batch_id == Batch.id)
+
+        if request.args.get('dept'):
+            query = query.filter(Subject.dept_code == request.args['dept'])
+        if request.args.get('semester', type=int):
+            query = query.filter(Batch.semester == request.args.get('semester', type=int))
+        if request.args.get('academic_year'):
+            query = query.filter(Batch.academic_year == request.args['academic_year'])
+        if request.args.get('staff_id', type=int):
+            query = query.filter(Assignment.staff_id == request.args.get('staff_id', type=int))
+        if request.args.get('batch_id', type=int):
+            query = query.filter(Assignment.batch_id == request.args.get('batch_id', type=int))
+        if fields:
+            # Only the requested columns (joins and filters stay as they are)
+            query = query.with_entities(*ASSIGNMENT_FIELDS.select(fields))
+
+        if not is_paginated():
+            assignments = query.order_by(Assignment.id).all()
+            next_cursor = None
+        else:
+            try:
+                assignments, next_cursor = keyset_paginate(
+                    query,
+                    {'id': Assignment.id, 'staff_name': Staff.full_name,
+                     'subject_name': Subject.subject_name, 'semester': Batch.semester},
+                    'id', Assignment.id
+                )
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+
+        if fields:
+            result = ASSIGNMENT_FIELDS.rows(assignments, fields)
+        else:
+            result = []
+            for a, staff_name, subject_name, subject_code, dept_name, class_number, academic_year, semester in assignments:
+                batch_name = f"{dept_name} {class_number} ({academic_year} Sem {semester})"
+                result.append({
+                    'id': a.id,
+                    'staff_id': a.staff_id,
+                    'staff_name': staff_name,
+                    'subject_id': a.subject_id,
+                    'subject_name': f"{subject_name} ({subject_code})",
+                    'batch_id': a.batch_id,
+                    'batch_name': batch_name,
+                    'lecture_type': a.lecture_type,
+                    'batch_number': a.batch_number,
+                })
+        if is_paginated():
+            return jsonify(page_response(result, next_cursor)), 200
         return jsonify(result), 200
 
     data = request.json or {}
@@ -523,21 +705,38 @@ def manage_assignments():
     except OperationalError:
         db.session.rollback()
         return jsonify({'error': 'Database connection error, please retry'}), 500
-        
+
+    invalidate_scopes()
     return jsonify({'message': 'Assignment created', 'id': new_assignment.id}), 201
 
+
+@admin_bp.route('/assignments/import', methods=['POST'])
+@admin_required
+def import_assignments_bulk():
+    """
+    Create many assignments from a timetable (CSV upload or JSON rows); see
+    app/assignment_import.py for the columns. ?dry_run=1 only validates.
+    """
+    body, status = import_request(request)
+    return jsonify(body), status
+
 @admin_bp.route('/assignments/<int:assign_id>', methods=['DELETE'])
 @admin_required
 def delete_assignment(assign_id):
     assignment = Assignment.query.get_or_404(assign_id)
     
     try:
+        # Found through the assignment, so collected before it is deleted
+        namespaces = attendance_namespaces([assign_id])
         # Manually delete dependent records before deleting the assignment
         AttendanceRecord.query.filter_by(assignment_id=assign_id).delete(synchronize_session=False)
         TotalLectures.query.filter_by(assignment_id=assign_id).delete(synchronize_session=False)
+        delete_bitsets(assign_id)
         
         db.session.delete(assignment)
         db.session.commit()
+        cache.bump(*namespaces)
+        invalidate_scopes()
     except OperationalError:
         db.session.rollback()
         return jsonify({'error': 'Database connection error, please retry'}), 500
@@ -550,6 +749,7 @@ def delete_assignment(assign_id):
 # --- Attendance Reports ---
 @admin_bp.route('/attendance-report', methods=['GET'])
 @admin_required
+@replica_read
 def get_attendance_report():
     batch_id = request.args.get('batch_id')
     subject_id = request.args.get('subject_id')
@@ -559,6 +759,7 @@ def get_attendance_report():
         return jsonify({'error': 'batch_id, subject_id, and lecture_type are required'}), 400
 
     batch = Batch.query.get_or_404(batch_id)
+    date_range = requested_date_range()
     
     # Base query for assignments, filtered by all required parameters from the start
     base_assignments_query = Assignment.query.filter_by(
@@ -572,6 +773,9 @@ def get_attendance_report():
     if not all_filtered_assignments:
         return jsonify([]) # No assignments match, so return empty report
 
+    # Bitset sessions and closed terms in the columnar archive are added to the row sums
+    extra_totals, extra_attended = extra_sums([a.id for a in all_filtered_assignments], date_range)
+
     report = []
 
     for student in batch.students:
@@ -596,15 +800,18 @@ def get_attendance_report():
             assignment_ids = [a.id for a in student_specific_assignments]
 
             # Calculate total lectures for this student's specific assignments
-            total_lectures = db.session.query(db.func.sum(TotalLectures.lecture_count))\
-                .filter(TotalLectures.assignment_id.in_(assignment_ids)).scalar() or 0
+            total_lectures = filter_dates(db.session.query(db.func.sum(TotalLectures.lecture_count))\
+                .filter(TotalLectures.assignment_id.in_(assignment_ids)), TotalLectures.date, date_range).scalar() or 0
 
             # Calculate attended lectures for this student (CORRECTED)
-            attended_lectures = db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
+            attended_lectures = filter_dates(db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
                 AttendanceRecord.assignment_id.in_(assignment_ids),
                 AttendanceRecord.student_id == student.id,
                 AttendanceRecord.status == 'present' # Only count 'present' records
-            ).scalar() or 0
+            ), AttendanceRecord.date, date_range).scalar() or 0
+
+            total_lectures += sum(extra_totals.get(aid, 0) for aid in assignment_ids)
+            attended_lectures += sum(extra_attended.get((aid, student.id), 0) for aid in assignment_ids)
 
         percentage = (attended_lectures / total_lectures * 100) if total_lectures > 0 else 0
         
@@ -624,6 +831,7 @@ def get_attendance_report():
 
 @admin_bp.route('/subjects-by-batch/<int:batch_id>', methods=['GET'])
 @admin_required
+@replica_read
 def get_subjects_by_batch(batch_id):
     """
     Returns a list of unique subjects assigned to a specific batch.
@@ -640,6 +848,7 @@ def get_subjects_by_batch(batch_id):
 
 @admin_bp.route('/staff-assignments', methods=['GET'])
 @admin_required
+@replica_read
 def get_staff_assignments_report():
     # Query all assignments with staff, subject, and batch info
     assignments_query = db.session.query(
@@ -702,6 +911,8 @@ def add_student_to_batch(batch_id):
     except IntegrityError:
         db.session.rollback()
         return jsonify({'error': 'Student with that roll number or enrollment number may already exist in another context.'}), 409
+    invalidate_students([student.id])
+    invalidate_search()
     
     return jsonify({
         'id': student.id,
@@ -725,8 +936,27 @@ def update_student(student_id):
         student.batch_number = data.get('batch_number') # Handles null/empty string
         
     db.session.commit()
+    invalidate_students([student.id])
+    invalidate_search()
     return jsonify({'message': 'Student updated'}), 200
 
+@admin_bp.route('/students/search', methods=['GET'])
+@admin_required
+@replica_read
+def search_all_students():
+    """
+    Fuzzy search across every batch by name, roll number or enrollment number.
+    ?q=<text>&limit=<n> returns ranked students, each with the batches they are in.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    limit = request.args.get('limit', 20, type=int)
+    max_results = current_app.config.get('STUDENT_SEARCH_MAX_RESULTS', 100)
+    if not 1 <= limit <= max_results:
+        return jsonify({'error': f"limit must be between 1 and {max_results}"}), 400
+    return jsonify({'query': query, 'results': search_students(query, limit)})
+
 @admin_bp.route('/batches/<int:batch_id>/students/<int:student_id>', methods=['DELETE'])
 @admin_required
 def remove_student_from_batch(batch_id, student_id):
@@ -736,6 +966,8 @@ def remove_student_from_batch(batch_id, student_id):
     if student in batch.students:
         batch.students.remove(student)
         db.session.commit()
+        invalidate_students([student.id])
+        invalidate_search()
         return jsonify({'message': 'Student removed from batch'}), 200
     
     return jsonify({'error': 'Student not found in this batch'}), 404
@@ -784,7 +1016,7 @@ def get_attendance_for_session():
     records = AttendanceRecord.query.filter(
         AttendanceRecord.assignment_id.in_(assignment_ids),
         AttendanceRecord.date == attendance_date
-    ).all()
+    ).all() + session_records(assignment_ids, (attendance_date, attendance_date))
     
     records_by_student = {r.student_id: r for r in records}
 
@@ -826,15 +1058,21 @@ def update_attendance_for_session():
         attendance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    term = frozen_term(attendance_date)
+    if term:
+        return jsonify({'error': f"Term '{term.name}' is closed; its attendance can no longer be changed."}), 409
 
     for update in updates:
+        attended_count = int(update.get('attended_lectures', 0))
+        # Sessions stored as a bitset are edited there; older ones still have rows
+        if set_attended(update['assignment_id'], attendance_date, update['student_id'], attended_count):
+            continue
+
         record = AttendanceRecord.query.filter_by(
             student_id=update['student_id'],
             assignment_id=update['assignment_id'],
             date=attendance_date
         ).first()
-        
-        attended_count = int(update.get('attended_lectures', 0))
 
         if record:
             # Update existing record
@@ -853,11 +1091,116 @@ def update_attendance_for_session():
             db.session.add(new_record)
 
     db.session.commit()
+    invalidate_attendance({u['assignment_id'] for u in updates}, {u['student_id'] for u in updates})
     return jsonify({'message': 'Attendance updated successfully'}), 200
 
+# --- Academic Terms ---
+@admin_bp.route('/terms', methods=['GET', 'POST'])
+@admin_required
+def manage_terms():
+    if request.method == 'GET':
+        terms = Term.query.order_by(Term.start_date).all()
+        return jsonify([{
+            'id': t.id, 'name': t.name,
+            'start_date': t.start_date.isoformat(), 'end_date': t.end_date.isoformat(),
+            'is_closed': t.is_closed
+        } for t in terms]), 200
+
+    data = request.json or {}
+    for field in ('name', 'start_date', 'end_date'):
+        if field not in data:
+            return jsonify({'error': f'{field} is required'}), 400
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if end_date < start_date:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
+
+    overlapping = Term.query.filter(Term.start_date <= end_date, Term.end_date >= start_date).first()
+    if overlapping:
+        return jsonify({'error': f"Dates overlap with term '{overlapping.name}'."}), 409
+
+    term = Term(name=data['name'], start_date=start_date, end_date=end_date)
+    db.session.add(term)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'A term with this name already exists'}), 400
+
+    # Semester rollover: give the new term its own attendance partitions (Postgres only)
+    try:
+        with db.engine.begin() as connection:
+            partitions = ensure_term_partitions(connection, [term])
+    except PartitionError as e:
+        return jsonify({'message': 'Term added', 'id': term.id, 'warning': str(e)}), 201
+
+    return jsonify({'message': 'Term added', 'id': term.id, 'partitions': partitions}), 201
+
+
+# --- Workbook Exports ---
+@admin_bp.route('/exports/workbook', methods=['POST'])
+@admin_required
+def export_department_workbook():
+    """Start building a department's XLSX workbook for a term; poll the returned job."""
+    data = request.json or {}
+    if not data.get('dept_code') or not data.get('term_id'):
+        return jsonify({'error': 'dept_code and term_id are required'}), 400
+    if not Department.query.get(data['dept_code']):
+        return jsonify({'error': 'Department not found'}), 404
+    term = Term.query.get_or_404(data['term_id'])
+    try:
+        job = start_export(data['dept_code'], term, requested_by='admin')
+    except MissingDependency as e:
+        return jsonify({'error': str(e)}), 501
+    return jsonify(job), 202
+
+
+@admin_bp.route('/exports/<string:job_id>', methods=['GET'])
+@admin_required
+def get_export_job(job_id):
+    job = read_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    return jsonify(job), 200
+
+
+@admin_bp.route('/exports/<string:job_id>/download', methods=['GET'])
+@admin_required
+def download_export(job_id):
+    job = read_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Export is {job['status']}", **job}), 409
+    return send_file(workbook_path(job_id), as_attachment=True, download_name=download_name(job))
+
+
+# --- Database Health ---
+@admin_bp.route('/db-health', methods=['GET'])
+@admin_required
+def db_health():
+    """Liveness-check counters and connection pool state for each engine."""
+    pools = {}
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        pools[name or 'primary'] = {
+            'class': type(pool).__name__,
+            'status': pool.status(),
+        }
+    return jsonify({
+        'ping_idle_seconds': current_app.config.get('POOL_PING_IDLE_SECONDS'),
+        'metrics': pool_metrics.snapshot(),
+        'pools': pools,
+    }), 200
+
+
 # --- HOD Management ---
 @admin_bp.route('/hods', methods=['GET', 'POST'])
 @admin_required
+@replica_read
 def manage_hods():
     if request.method == 'GET':
         hods = db.session.query(HOD, Staff, Department).join(Staff).join(Department).all()
@@ -886,6 +1229,7 @@ def manage_hods():
     db.session.add(new_hod)
     try:
         db.session.commit()
+        invalidate_scopes()
         return jsonify({'message': 'HOD created', 'id': new_hod.id}), 201
     except IntegrityError as e:
         db.session.rollback()
@@ -909,15 +1253,18 @@ def update_delete_hod(hod_id):
             
         hod.dept_code = data['dept_code']
         db.session.commit()
+        invalidate_scopes()
         return jsonify({'message': 'HOD updated'}), 200
         
     # DELETE
     db.session.delete(hod)
     db.session.commit()
+    invalidate_scopes()
     return jsonify({'message': 'HOD deleted'}), 200
 
 
 @admin_bp.route('/historical-attendance', methods=['GET'])
+@replica_read
 def get_historical_attendance():
     # --- 0. Universal access check (no decorator) ---
     is_admin = session.get('is_admin', False)
@@ -939,6 +1286,17 @@ def get_historical_attendance():
     end_date_str = request.args.get('end_date')
     lecture_type = request.args.get('lecture_type') # e.g., 'TH', 'PR', 'TU'
     batch_number = request.args.get('batch_number', type=int) # For PR/TU sub-batch filtering
+    grid_format = request.args.get('format', 'full') # 'packed'/'rle': one string per student, see reports.compact_grid
+    if grid_format not in GRID_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(GRID_FORMATS)}"}), 400
+    # Optional window over the lecture columns, for scrolling a long range in slices
+    column_offset = request.args.get('column_offset', 0, type=int)
+    column_limit = request.args.get('column_limit', type=int)
+    windowed = 'column_offset' in request.args or 'column_limit' in request.args
+    if column_offset < 0 or (column_limit is not None and not 1 <= column_limit <= MAX_COLUMN_WINDOW):
+        return jsonify({'error': f'column_offset must be >= 0 and column_limit between 1 and {MAX_COLUMN_WINDOW}'}), 400
+    if windowed and column_limit is None:
+        column_limit = MAX_COLUMN_WINDOW
 
     # Default to last 30 days if no dates are provided
     try:
@@ -956,8 +1314,8 @@ def get_historical_attendance():
     
     # Apply role-based filtering
     if hod_id:
-        hod_dept_code = session.get('department_code')
-        assignment_query = assignment_query.join(Subject).filter(Subject.dept_code == hod_dept_code)
+        # The HOD's department subjects come from the cached access scope
+        assignment_query = assignment_query.filter(Assignment.subject_id.in_(load_scope('hod')['subject_ids']))
     elif staff_id:
         assignment_query = assignment_query.filter(Assignment.staff_id == staff_id)
     
@@ -970,94 +1328,28 @@ def get_historical_attendance():
     assignments = assignment_query.all()
     if not assignments:
         return jsonify({'error': 'No assignments found for the given criteria.'}), 404
-    
-    assignment_ids = [a.id for a in assignments]
-    assignment_map = {a.id: a for a in assignments} # For quick lookup
 
-    # --- 4. Get all relevant attendance records and total lectures in one go ---
-    all_records = AttendanceRecord.query.filter(
-        AttendanceRecord.assignment_id.in_(assignment_ids),
-        AttendanceRecord.date.between(start_date, end_date)
-    ).all()
+    # --- 4. Build the spreadsheet-like grid (see reports.historical_grid) ---
+    headers, student_rows, total_columns = historical_grid(students, assignments, start_date, end_date,
+                                                          column_offset, column_limit)
 
-    total_lectures = TotalLectures.query.filter(
-        TotalLectures.assignment_id.in_(assignment_ids),
-        TotalLectures.date.between(start_date, end_date)
-    ).order_by(TotalLectures.date).all()
-    
-    # --- 5. Process data into the desired spreadsheet-like format ---
-    
-    lecture_instances = {}
-    lecture_sequence = 1
-    for lec in total_lectures:
-      for i in range(lec.lecture_count):
-        # ** FIX: Make key unique per lecture instance **
-        # Using date, assignment_id, and an index for multi-hour lectures
-        key = f"{lec.date.isoformat()}-{lec.assignment_id}-{i}"
-        lecture_instances[key] = {
-            'id': lecture_sequence,
-            'date': lec.date,
-            'assignment_id': lec.assignment_id
-        }
-        lecture_sequence += 1
-            
-    student_attendance_map = defaultdict(dict)
-    for record in all_records:
-        # Find the keys for all lectures this record's assignment had on this day
-        matching_keys = [
-            k for k, v in lecture_instances.items() 
-            if v['date'] == record.date and v['assignment_id'] == record.assignment_id
-        ]
-        
-        # Mark as 'P' for the number of lectures attended, 'A' for the rest
-        for i, key in enumerate(matching_keys):
-            status = 'P' if i < record.lecture_count else 'A'
-            student_attendance_map[record.student_id][key] = status
-
-
-    # --- 6. Build the final response ---
-    
-    headers = [{
-        'id': key, # Use the unique key for the header ID
-        'label': f"Lec no. {details['id']} {details['date'].strftime('%d-%m-%Y')}"
-    } for key, details in sorted(lecture_instances.items(), key=lambda item: (item[1]['date'], item[1]['id']))]
-    
-    student_rows = []
-    for student in students:
-        student_data = {
-            'id': student.id,
-            'roll_no': student.roll_no,
-            'enrollment_no': student.enrollment_no,
-            'name': student.name,
-            'batch_number': student.batch_number,
-            'attendance': {}
-        }
-        
-        is_student_relevant = False
-        # Iterate through all lecture instances to build the row
-        for key, details in lecture_instances.items():
-            assignment = assignment_map.get(details['assignment_id'])
-            if not assignment:
-                continue
-
-            # Student is relevant if it's a theory class OR their sub-batch number matches the assignment's
-            if assignment.lecture_type == 'TH' or (assignment.batch_number and assignment.batch_number == student.batch_number):
-                is_student_relevant = True
-                header_id = key # Use the unique key for the header ID
-                # If there's no record, the student was absent for that lecture instance.
-                status = student_attendance_map[student.id].get(key, 'A')
-                student_data['attendance'][header_id] = status
-        
-        if is_student_relevant:
-            student_rows.append(student_data)
-
-    return jsonify({
+    grid = compact_grid(headers, student_rows, grid_format) if grid_format != 'full' else {
         'headers': headers,
         'students': student_rows
-    })
+    }
+    if windowed:
+        next_offset = column_offset + column_limit
+        grid['window'] = {
+            'column_offset': column_offset,
+            'column_limit': column_limit,
+            'total_columns': total_columns,
+            'next_offset': next_offset if next_offset < total_columns else None,
+        }
+    return jsonify(grid)
 
 @admin_bp.route('/batches-by-department/<string:dept_code>', methods=['GET'])
 @admin_required
+@replica_read
 def get_batches_by_department(dept_code):
     """
     Returns a list of batches for a specific department.
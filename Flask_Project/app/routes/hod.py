@@ -1,9 +1,18 @@
 
 
-from flask import Blueprint, request, jsonify, session
-from ..models import Staff, Subject, Assignment, Batch, Student, AttendanceRecord, TotalLectures, HOD, Department
+from flask import Blueprint, request, jsonify, session, current_app, send_file
+from ..models import Staff, Subject, Assignment, Batch, Student, AttendanceRecord, TotalLectures, HOD, Department, Term
 from .. import db, bcrypt
-from ..auth import hod_required
+from ..auth import hod_required, scope_required, in_scope, load_scope, invalidate_scopes
+from ..routing import replica_read, on_primary
+from ..pagination import keyset_paginate, is_paginated, page_response, PaginationError
+from ..reports import department_defaulters, consolidated_matrix, requested_date_range, filter_dates, extra_sums
+from ..cache import cache, attendance_namespaces, dept_namespace, invalidate_attendance
+from ..archive import frozen_term
+from ..bitsets import set_attended, session_records, delete_for_assignment as delete_bitsets
+from ..assignment_import import import_request
+from ..workbook import start_export, read_job, workbook_path, download_name
+from ..optional import MissingDependency
 from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime
@@ -29,6 +38,7 @@ def hod_login():
         session['staff_id'] = hod_staff.id # Also log in as staff
         session['department_code'] = hod_details.dept_code
         session['staff_full_name'] = hod_staff.full_name
+        load_scope('hod', refresh=True)
         
         return jsonify({
             'message': 'HOD Login successful',
@@ -41,6 +51,7 @@ def hod_login():
 
 @hod_bp.route('/subjects', methods=['GET'])
 @hod_required
+@replica_read
 def get_hod_subjects():
     dept_code = session['department_code']
     subjects = Subject.query.filter_by(dept_code=dept_code).order_by(Subject.subject_name).all()
@@ -53,6 +64,7 @@ def get_hod_subjects():
 
 @hod_bp.route('/batches', methods=['GET'])
 @hod_required
+@replica_read
 def get_hod_batches():
     # An HOD's department is identified by a code (e.g., 'AN'), but the Batch model stores the full department name (e.g., 'Animation').
     # We need to get the HOD's department name to filter the batches correctly.
@@ -74,12 +86,46 @@ def get_hod_batches():
     return jsonify(result)
 
 
+@hod_bp.route('/batches/<int:batch_id>/consolidated', methods=['GET'])
+@hod_required
+@scope_required('hod', batch='batch_id', error='You can only view batches in your department.')
+@replica_read
+def get_consolidated_report(batch_id):
+    """Consolidated sheet for a department batch, limited to the department's subjects."""
+    dept_code = session['department_code']
+    batch = Batch.query.get_or_404(batch_id)
+    return jsonify(consolidated_matrix(batch, dept_code=dept_code, date_range=requested_date_range()))
+
+
 @hod_bp.route('/staff', methods=['GET', 'POST'])
 @hod_required
+@replica_read
 def manage_hod_staff():
     if request.method == 'GET':
-        staff = Staff.query.order_by(Staff.full_name).all()
+        query = Staff.query
+        dept = request.args.get('dept')
+        if dept:
+            dept_staff_ids = db.session.query(Assignment.staff_id)\
+                .join(Subject, Assignment.subject_id == Subject.id)\
+                .filter(Subject.dept_code == dept)
+            query = query.filter(Staff.id.in_(dept_staff_ids))
+
+        if not is_paginated():
+            staff = query.order_by(Staff.full_name).all()
+            next_cursor = None
+        else:
+            try:
+                staff, next_cursor = keyset_paginate(
+                    query,
+                    {'id': Staff.id, 'full_name': Staff.full_name, 'username': Staff.username},
+                    'full_name', Staff.id
+                )
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+
         result = [{'id': s.id, 'username': s.username, 'full_name': s.full_name} for s in staff]
+        if is_paginated():
+            return jsonify(page_response(result, next_cursor)), 200
         return jsonify(result), 200
     
     # POST - HOD can add new staff
@@ -141,13 +187,10 @@ def create_hod_subject():
 
 @hod_bp.route('/subjects/<int:sub_id>', methods=['PUT'])
 @hod_required
+@scope_required('hod', subject='sub_id', error='You cannot modify subjects outside your department.')
 def update_hod_subject(sub_id):
-    dept_code = session['department_code']
     sub = Subject.query.get_or_404(sub_id)
 
-    if sub.dept_code != dept_code:
-        return jsonify({'error': 'You cannot modify subjects outside your department.'}), 403
-
     data = request.json or {}
     if 'subject_name' in data:
         sub.subject_name = data['subject_name']
@@ -161,6 +204,7 @@ def update_hod_subject(sub_id):
 
 @hod_bp.route('/assignments', methods=['GET', 'POST'])
 @hod_required
+@replica_read
 def manage_hod_assignments():
     dept_code = session['department_code']
     if request.method == 'GET':
@@ -190,8 +234,7 @@ def manage_hod_assignments():
         return jsonify({'error': 'Missing required fields'}), 400
 
     # Authorization Check: Can HOD assign this subject?
-    subject = Subject.query.get(data['subject_id'])
-    if not subject or subject.dept_code != dept_code:
+    if not in_scope('hod', subject_id=data['subject_id']):
         return jsonify({'error': "You can only create assignments for subjects in your department."}), 403
 
     # Check for duplicate assignment
@@ -209,24 +252,35 @@ def manage_hod_assignments():
     )
     db.session.add(new_assignment)
     db.session.commit()
+    invalidate_scopes()
     return jsonify({'message': 'Assignment created', 'id': new_assignment.id}), 201
 
+
+@hod_bp.route('/assignments/import', methods=['POST'])
+@hod_required
+def import_hod_assignments():
+    """
+    Create many assignments from a timetable (CSV upload or JSON rows); see
+    app/assignment_import.py for the columns. ?dry_run=1 only validates.
+    """
+    body, status = import_request(request, dept_code=session['department_code'])
+    return jsonify(body), status
+
 @hod_bp.route('/assignments/<int:assign_id>', methods=['DELETE'])
 @hod_required
+@scope_required('hod', assignment='assign_id', error="You cannot delete assignments outside your department.")
 def delete_hod_assignment(assign_id):
-    dept_code = session['department_code']
     assignment = Assignment.query.get_or_404(assign_id)
-    
-    # Authorization Check
-    subject = Subject.query.get(assignment.subject_id)
-    if not subject or subject.dept_code != dept_code:
-        return jsonify({'error': "You cannot delete assignments outside your department."}), 403
 
     # Deletion logic (same as admin)
+    namespaces = attendance_namespaces([assign_id])
     AttendanceRecord.query.filter_by(assignment_id=assign_id).delete()
     TotalLectures.query.filter_by(assignment_id=assign_id).delete()
+    delete_bitsets(assign_id)
     db.session.delete(assignment)
     db.session.commit()
+    cache.bump(*namespaces)
+    invalidate_scopes()
     return jsonify({'message': 'Assignment deleted'}), 200
 
 
@@ -234,6 +288,7 @@ def delete_hod_assignment(assign_id):
 
 @hod_bp.route('/staff-assignments', methods=['GET'])
 @hod_required
+@replica_read
 def get_staff_assignments_report():
     dept_code = session['department_code']
     
@@ -267,22 +322,19 @@ def get_staff_assignments_report():
 
 @hod_bp.route('/attendance-report', methods=['GET'])
 @hod_required
+@scope_required('hod', subject='subject_id', error='You can only view reports for your department.')
+@replica_read
 def get_attendance_report():
     # This logic is identical to the admin route, but we could add HOD-specific constraints if needed
     batch_id = request.args.get('batch_id')
     subject_id = request.args.get('subject_id')
     lecture_type = request.args.get('lecture_type')
-    dept_code = session['department_code']
 
     if not all([batch_id, subject_id, lecture_type]):
         return jsonify({'error': 'batch_id, subject_id, and lecture_type are required'}), 400
 
-    # Authorization check: Ensure the subject belongs to the HOD's department
-    subject = Subject.query.get(subject_id)
-    if not subject or subject.dept_code != dept_code:
-        return jsonify({'error': 'You can only view reports for your department.'}), 403
-
     batch = Batch.query.get_or_404(batch_id)
+    date_range = requested_date_range()
     base_assignments_query = Assignment.query.filter_by(
         batch_id=batch_id,
         subject_id=subject_id,
@@ -293,6 +345,8 @@ def get_attendance_report():
     if not all_filtered_assignments:
         return jsonify([])
 
+    extra_totals, extra_attended = extra_sums([a.id for a in all_filtered_assignments], date_range)
+
     report = []
     for student in batch.students:
         total_lectures = 0
@@ -307,12 +361,14 @@ def get_attendance_report():
 
         if student_specific_assignments:
             assignment_ids = [a.id for a in student_specific_assignments]
-            total_lectures = db.session.query(db.func.sum(TotalLectures.lecture_count)).filter(TotalLectures.assignment_id.in_(assignment_ids)).scalar() or 0
-            attended_lectures = db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
+            total_lectures = filter_dates(db.session.query(db.func.sum(TotalLectures.lecture_count)).filter(TotalLectures.assignment_id.in_(assignment_ids)), TotalLectures.date, date_range).scalar() or 0
+            attended_lectures = filter_dates(db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
                 AttendanceRecord.assignment_id.in_(assignment_ids),
                 AttendanceRecord.student_id == student.id,
                 AttendanceRecord.status == 'present'
-            ).scalar() or 0
+            ), AttendanceRecord.date, date_range).scalar() or 0
+            total_lectures += sum(extra_totals.get(aid, 0) for aid in assignment_ids)
+            attended_lectures += sum(extra_attended.get((aid, student.id), 0) for aid in assignment_ids)
 
         percentage = (attended_lectures / total_lectures * 100) if total_lectures > 0 else 0
         
@@ -330,6 +386,7 @@ def get_attendance_report():
 
 @hod_bp.route('/subjects-by-batch/<int:batch_id>', methods=['GET'])
 @hod_required
+@replica_read
 def get_subjects_by_batch(batch_id):
     dept_code = session['department_code']
     subjects = db.session.query(
@@ -344,22 +401,17 @@ def get_subjects_by_batch(batch_id):
     
 @hod_bp.route('/attendance/session', methods=['GET'])
 @hod_required
+@scope_required('hod', subject='subject_id', error='Unauthorized to access this subject.')
 def get_attendance_for_session():
     # This logic is identical to the admin route, but we could add HOD-specific constraints if needed
     batch_id = request.args.get('batch_id')
     subject_id = request.args.get('subject_id')
     lecture_type = request.args.get('lecture_type')
     date_str = request.args.get('date')
-    dept_code = session['department_code']
 
     if not all([batch_id, subject_id, lecture_type, date_str]):
         return jsonify({'error': 'All filter parameters are required'}), 400
 
-    # Authorization check
-    subject = Subject.query.get(subject_id)
-    if not subject or subject.dept_code != dept_code:
-        return jsonify({'error': 'Unauthorized to access this subject.'}), 403
-
     try:
         attendance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except ValueError:
@@ -382,7 +434,7 @@ def get_attendance_for_session():
     
     records = AttendanceRecord.query.filter(
         AttendanceRecord.assignment_id.in_(assignment_ids), AttendanceRecord.date == attendance_date
-    ).all()
+    ).all() + session_records(assignment_ids, (attendance_date, attendance_date))
     records_by_student = {r.student_id: r for r in records}
 
     result = []
@@ -410,7 +462,6 @@ def update_attendance_for_session():
     data = request.json
     date_str = data.get('date')
     updates = data.get('updates', [])
-    dept_code = session['department_code']
 
     if not date_str or not updates:
         return jsonify({'error': 'Date and updates are required'}), 400
@@ -419,25 +470,30 @@ def update_attendance_for_session():
         attendance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    term = frozen_term(attendance_date)
+    if term:
+        return jsonify({'error': f"Term '{term.name}' is closed; its attendance can no longer be changed."}), 409
 
-    # Authorization check for the first assignment to ensure it's in the HOD's department
-    if updates:
-        first_assignment_id = updates[0].get('assignment_id')
-        assignment = Assignment.query.get(first_assignment_id)
-        if not assignment:
-             return jsonify({'error': 'Invalid assignment ID provided.'}), 400
-        subject = Subject.query.get(assignment.subject_id)
-        if not subject or subject.dept_code != dept_code:
+    # Authorization check: every assignment being edited must be in the HOD's department
+    try:
+        assignment_ids = {int(u.get('assignment_id')) for u in updates}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid assignment ID provided.'}), 400
+    for assignment_id in assignment_ids:
+        if not in_scope('hod', assignment_id=assignment_id):
             return jsonify({'error': 'You are not authorized to modify attendance for this department.'}), 403
 
     for update in updates:
+        attended_count = int(update.get('attended_lectures', 0))
+        # Sessions stored as a bitset are edited there; older ones still have rows
+        if set_attended(update['assignment_id'], attendance_date, update['student_id'], attended_count):
+            continue
+
         record = AttendanceRecord.query.filter_by(
             student_id=update['student_id'],
             assignment_id=update['assignment_id'],
             date=attendance_date
         ).first()
-        
-        attended_count = int(update.get('attended_lectures', 0))
 
         if record:
             record.lecture_count = attended_count
@@ -453,4 +509,85 @@ def update_attendance_for_session():
             db.session.add(new_record)
 
     db.session.commit()
+    invalidate_attendance({u['assignment_id'] for u in updates}, {u['student_id'] for u in updates})
     return jsonify({'message': 'Attendance updated successfully'}), 200
+
+
+@hod_bp.route('/defaulters', methods=['GET'])
+@hod_required
+@replica_read
+def get_department_defaulters():
+    """
+    Students below the attendance threshold in any subject/lecture type of the
+    HOD's department, computed in one aggregated query and cached until the
+    department's attendance changes.
+    """
+    dept_code = session['department_code']
+    threshold = request.args.get('threshold', 75, type=float)
+    semester = request.args.get('semester', type=int)
+    batch_id = request.args.get('batch_id', type=int)
+    lecture_type = request.args.get('lecture_type')
+
+    if not 0 <= threshold <= 100:
+        return jsonify({'error': 'threshold must be between 0 and 100'}), 400
+
+    date_range = requested_date_range()
+
+    def compute():
+        return department_defaulters(dept_code, threshold, semester=semester, batch_id=batch_id,
+                                     lecture_type=lecture_type, date_range=date_range)
+
+    ttl = current_app.config.get('DEFAULTERS_CACHE_TTL', 0)
+    if ttl and not request.args.get('fresh'):
+        key = ('defaulters', threshold, semester, batch_id, lecture_type, date_range)
+        defaulters = cache.get_or_compute(dept_namespace(dept_code), key, on_primary(compute), ttl)
+    else:
+        defaulters = compute()
+
+    return jsonify({
+        'threshold': threshold,
+        'count': len(defaulters),
+        'defaulters': defaulters
+    })
+
+
+# --- Workbook Exports ---
+def _own_export(job_id):
+    job = read_job(job_id)
+    return job if job and job['dept_code'] == session['department_code'] else None
+
+
+@hod_bp.route('/exports/workbook', methods=['POST'])
+@hod_required
+def export_department_workbook():
+    """Start building the department's XLSX workbook (its own subjects) for a term."""
+    term_id = (request.json or {}).get('term_id')
+    if not term_id:
+        return jsonify({'error': 'term_id is required'}), 400
+    term = Term.query.get_or_404(term_id)
+    try:
+        job = start_export(session['department_code'], term, requested_by=f"hod:{session['hod_id']}",
+                           department_subjects_only=True)
+    except MissingDependency as e:
+        return jsonify({'error': str(e)}), 501
+    return jsonify(job), 202
+
+
+@hod_bp.route('/exports/<string:job_id>', methods=['GET'])
+@hod_required
+def get_export_job(job_id):
+    job = _own_export(job_id)
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    return jsonify(job), 200
+
+
+@hod_bp.route('/exports/<string:job_id>/download', methods=['GET'])
+@hod_required
+def download_export(job_id):
+    job = _own_export(job_id)
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Export is {job['status']}", **job}), 409
+    return send_file(workbook_path(job_id), as_attachment=True, download_name=download_name(job))
@@ -1,4 +1,10 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, session, current_app
+from ..models import Student
+from ..auth import in_scope
+from ..routing import replica_read, on_primary
+from ..reports import requested_date_range, student_profile
+from ..cache import cache, student_namespace
+from ..subrequests import parse_requests, dispatch_get, SubrequestError
 
 main_bp = Blueprint('main', __name__)
 
@@ -8,3 +14,49 @@ def index():
         'status': 'ok',
         'message': 'Welcome to the BVP Attendance API'
     })
+
+
+@main_bp.route('/batch', methods=['POST'])
+def batch_requests():
+    """
+    Several GET endpoints in one round trip (see app/subrequests.py). Each
+    sub-request runs its own auth checks; the batch itself is always 200.
+    """
+    try:
+        subrequests = parse_requests(request.get_json(silent=True), current_app.config.get('BATCH_MAX_REQUESTS', 10))
+    except SubrequestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    responses = []
+    for path, query in subrequests:
+        status, body = dispatch_get(path, query)
+        responses.append({'path': path, 'status': status, 'body': body})
+    return jsonify({'responses': responses})
+
+
+@main_bp.route('/students/<enrollment_no>/attendance', methods=['GET'])
+@replica_read
+def get_student_attendance(enrollment_no):
+    """
+    Attendance across every subject and lecture type of a student's batches.
+    Open to admins, the HOD of one of the student's batches and staff who
+    teach one of them; cached per student until their attendance changes.
+    """
+    if not session.get('is_admin') and not session.get('hod_id') and not session.get('staff_id'):
+        return jsonify({'error': 'Login required'}), 401
+
+    student = Student.query.filter_by(enrollment_no=enrollment_no).first_or_404()
+
+    if not session.get('is_admin'):
+        role = 'hod' if session.get('hod_id') else 'staff'
+        if not any(in_scope(role, batch_id=b.id) for b in student.batches):
+            return jsonify({'error': 'You are not authorized to view this student'}), 403
+
+    date_range = requested_date_range()
+    ttl = current_app.config.get('STUDENT_PROFILE_CACHE_TTL', 0)
+    if ttl and not request.args.get('fresh'):
+        profile = cache.get_or_compute(student_namespace(student.id), ('profile', date_range),
+                                       on_primary(lambda: student_profile(student, date_range)), ttl)
+    else:
+        profile = student_profile(student, date_range)
+    return jsonify(profile)
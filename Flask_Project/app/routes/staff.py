@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify, session
-from ..models import Staff, Subject, Assignment, Batch, Student, AttendanceRecord, TotalLectures
+from flask import Blueprint, request, jsonify, session, current_app
+from ..models import Staff, Subject, Assignment, Batch, Student, AttendanceRecord, TotalLectures, student_batches
 from .. import db, bcrypt
-from ..auth import staff_required
-from datetime import date
+from ..auth import staff_required, scope_required, load_scope
+from ..routing import replica_read
+from ..cache import invalidate_attendance
+from ..reports import requested_date_range, filter_dates, extra_sums
+from ..archive import frozen_term
+from ..bitsets import append_lectures
+from ..rolls import RollIndex, RollExpressionError
+from ..dialects import upsert
+from ..fields import STUDENT_FIELDS, FieldsError
+from datetime import date, datetime, timedelta
 from sqlalchemy.orm import joinedload
 
 
@@ -15,6 +23,7 @@ def staff_login():
     if u and bcrypt.check_password_hash(u.password_hash, d['password']):
         session['staff_id'] = u.id
         session['staff_full_name'] = u.full_name
+        load_scope('staff', refresh=True)
         return jsonify({'message':'Login successful', 'full_name': u.full_name})
     return jsonify({'error':'Invalid credentials'}),401
 
@@ -55,7 +64,6 @@ def validate_absentees():
     data = request.json
     batch_id = data.get('batch_id')
     batch_number = data.get('batch_number') # For PR/TU
-    absent_rolls = [r.strip() for r in data.get('absent_rolls', [])]
 
     batch = Batch.query.get(batch_id)
     if not batch:
@@ -67,26 +75,15 @@ def validate_absentees():
     else:
         students_for_session = batch.students
         
-    student_roll_map = {s.roll_no: s for s in students_for_session}
-    
-    valid_absentees = []
-    invalid_rolls = []
-    
-    for roll in absent_rolls:
-        if roll in student_roll_map:
-            student = student_roll_map[roll]
-            valid_absentees.append({
-                'id': student.id,
-                'name': student.name,
-                'roll_no': student.roll_no,
-                'enrollment_no': student.enrollment_no,
-                'batch_number': student.batch_number
-            })
-        else:
-            invalid_rolls.append(roll)
-            
+    # absent_rolls may be a list of rolls or a range expression such as "1-10,15"
+    roll_index = RollIndex(students_for_session)
+    try:
+        absentees, invalid_rolls = roll_index.resolve(roll_index.parse(data.get('absent_rolls', [])))
+    except RollExpressionError as e:
+        return jsonify({'error': str(e)}), 400
+
     return jsonify({
-        'valid_absentees': valid_absentees,
+        'valid_absentees': [RollIndex.describe(s) for s in absentees],
         'invalid_rolls': invalid_rolls
     })
 
@@ -102,7 +99,26 @@ def mark_attendance():
     batch_id = data.get('batch_id')
     lecture_type = data.get('lecture_type')
     batch_number = data.get('batch_number') # Can be None for TH
-    absent_rolls = [r.strip() for r in data.get('absent_rolls', [])]
+
+    # Session date (default today, at most ATTENDANCE_BACKDATE_DAYS back) and
+    # how many lectures it covers (default 1)
+    try:
+        session_date = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else date.today()
+        lecture_count = int(data.get('lecture_count', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date or lecture_count. Use YYYY-MM-DD and a whole number.'}), 400
+    max_lectures = current_app.config.get('ATTENDANCE_MAX_LECTURES', 8)
+    if not 1 <= lecture_count <= max_lectures:
+        return jsonify({'error': f'lecture_count must be between 1 and {max_lectures}'}), 400
+    backdate_days = current_app.config.get('ATTENDANCE_BACKDATE_DAYS', 7)
+    if session_date > date.today():
+        return jsonify({'error': 'Attendance cannot be marked for a future date'}), 400
+    if session_date < date.today() - timedelta(days=backdate_days):
+        return jsonify({'error': f'Attendance can only be marked up to {backdate_days} days back; '
+                                 'ask an admin or HOD to edit older sessions.'}), 403
+    term = frozen_term(session_date)
+    if term:
+        return jsonify({'error': f"Term '{term.name}' is closed; its attendance can no longer be changed."}), 409
 
     # 2. Find the correct assignment
     assignment_query = Assignment.query.filter_by(
@@ -134,71 +150,86 @@ def mark_attendance():
         students_for_session = [s for s in all_students_in_batch if s.batch_number == batch_number]
     else: # For Theory (TH), all students in the main batch attend
         students_for_session = all_students_in_batch
-    
-    # 4. Record attendance
-    today = date.today()
-
-    # Increment total lectures count for this specific assignment
-    total_record = TotalLectures.query.filter_by(
-        assignment_id=assignment.id,
-        date=today
-    ).first()
-
-    if total_record:
-        total_record.lecture_count += 1
-    else:
-        total_record = TotalLectures(
-            assignment_id=assignment.id,
-            date=today,
-            lecture_count=1
-        )
-        db.session.add(total_record)
-
-    # Record for each student in the session
-    for student in students_for_session:
-        is_present = student.roll_no not in absent_rolls
-        
-        # Check if a record for this student, for this assignment, on this day exists
-        existing_record = AttendanceRecord.query.filter_by(
-            assignment_id=assignment.id,
-            student_id=student.id,
-            date=today
-        ).first()
-
-        if existing_record:
-            # If the student is present for this new lecture, increment their count.
-            if is_present:
-                existing_record.lecture_count += 1
-                # If they were previously marked absent for the day, update their status to present
-                # as they have now attended at least one lecture.
-                if existing_record.status == 'absent':
-                    existing_record.status = 'present'
-            # If they are absent for this new lecture, their attended count doesn't change.
-            # Their status remains 'present' if they attended other lectures today, or 'absent' if they've attended none.
-            # The status is only set to 'absent' if their lecture_count is 0. This is handled below.
 
+    # 4. Resolve absentees against the session roster. `absent_rolls` (a list or
+    # a range expression like "1-10,15") names the absent students; `present_rolls`
+    # names the present ones instead. Unknown rolls reject the whole request.
+    roll_index = RollIndex(students_for_session)
+    try:
+        if data.get('present_rolls') is not None:
+            present, invalid_rolls = roll_index.resolve(roll_index.parse(data['present_rolls']))
+            present_ids = {s.id for s in present}
+            absentees = [s for s in students_for_session if s.id not in present_ids]
         else:
-            # Create a new record if one doesn't exist for the student today
-            new_record = AttendanceRecord(
-                assignment_id=assignment.id,
-                student_id=student.id,
-                date=today,
-                status='present' if is_present else 'absent',
-                lecture_count=1 if is_present else 0
-            )
-            db.session.add(new_record)
+            absentees, invalid_rolls = roll_index.resolve(roll_index.parse(data.get('absent_rolls', [])))
+    except RollExpressionError as e:
+        return jsonify({'error': str(e)}), 400
 
+    validation = {
+        'valid_absentees': [RollIndex.describe(s) for s in absentees],
+        'invalid_rolls': invalid_rolls
+    }
+    if invalid_rolls:
+        return jsonify({'error': 'Some roll numbers are not part of this session', **validation}), 400
+    absent_ids = {s.id for s in absentees}
+
+    # Optional per-student attended counts ({roll_no: n}) for multi-lecture sessions;
+    # everyone else attended all lectures, or none if absent
+    attended = {s.id: 0 if s.id in absent_ids else lecture_count for s in students_for_session}
+    attended_counts = data.get('attended') or {}
+    if not isinstance(attended_counts, dict):
+        return jsonify({'error': 'attended must be an object of {roll_no: lectures attended}'}), 400
+    for roll, count in attended_counts.items():
+        student = roll_index.find(roll)
+        if student is None:
+            invalid_rolls.append(roll)
+            continue
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = -1
+        if not 0 <= count <= lecture_count:
+            return jsonify({'error': f"Attended count for roll {roll} must be between 0 and {lecture_count}"}), 400
+        attended[student.id] = count
+    if invalid_rolls:
+        return jsonify({'error': 'Some roll numbers are not part of this session', **validation}), 400
+
+    # 5. Record attendance
+    # All increments are applied in SQL (lecture_count = lecture_count + n), so
+    # concurrent submissions for the same session add up instead of overwriting.
+    # The upsert also locks the session's row until commit, serializing them.
+    upsert(TotalLectures, [{'assignment_id': assignment.id, 'date': session_date, 'lecture_count': lecture_count}],
+           conflict_columns=('assignment_id', 'date'), increment=('lecture_count',))
+    held_before = db.session.query(TotalLectures.lecture_count)\
+        .filter_by(assignment_id=assignment.id, date=session_date).scalar() - lecture_count
+
+    # The session is stored as one bitset: who attended each of its lectures
+    append_lectures(assignment.id, session_date, held_before, attended.keys(),
+                    [{sid for sid, n in attended.items() if n > k} for k in range(lecture_count)])
+
+    # Read before the commit expires the Student objects (one SELECT each after)
+    student_ids = [s.id for s in students_for_session]
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to save attendance', 'details': str(e)}), 500
 
-    return jsonify({'message': 'Attendance marked successfully'})
+    invalidate_attendance([assignment.id], student_ids)
+    return jsonify({
+        'message': 'Attendance marked successfully',
+        'date': session_date.isoformat(),
+        'lecture_count': lecture_count,
+        'present_count': len(students_for_session) - len(absent_ids),
+        'absent_count': len(absent_ids),
+        **validation
+    })
 
 
 @staff_bp.route('/attendance-report', methods=['GET'])
 @staff_required
+@scope_required('staff', batch='batch_id', subject='subject_id', error='You are not authorized to view this report')
+@replica_read
 def get_staff_attendance_report():
     staff_id = session['staff_id']
     batch_id = request.args.get('batch_id')
@@ -209,16 +240,8 @@ def get_staff_attendance_report():
     if not all([batch_id, subject_id, lecture_type]):
         return jsonify({'error': 'batch_id, subject_id, and lecture_type are required'}), 400
 
-    # Authorization Check: Does this staff teach this subject to this batch?
-    auth_query = Assignment.query.filter_by(
-        staff_id=staff_id, 
-        batch_id=batch_id, 
-        subject_id=subject_id
-    )
-    if not auth_query.first():
-        return jsonify({'error': 'You are not authorized to view this report'}), 403
-
     batch = Batch.query.get_or_404(batch_id)
+    date_range = requested_date_range()
 
     # Base query for assignments, filtered by all required parameters from the start
     base_assignments_query = Assignment.query.filter_by(
@@ -232,6 +255,8 @@ def get_staff_attendance_report():
     if not all_filtered_assignments:
         return jsonify([]) # This staff has no assignments for the selected lecture type
 
+    extra_totals, extra_attended = extra_sums([a.id for a in all_filtered_assignments], date_range)
+
     report = []
     
     # Determine the pool of students this staff teaches for this lecture type
@@ -259,13 +284,16 @@ def get_staff_attendance_report():
         if student_specific_assignments:
             assignment_ids = [a.id for a in student_specific_assignments]
 
-            total_lectures = db.session.query(db.func.sum(TotalLectures.lecture_count))\
-                .filter(TotalLectures.assignment_id.in_(assignment_ids)).scalar() or 0
+            total_lectures = filter_dates(db.session.query(db.func.sum(TotalLectures.lecture_count))\
+                .filter(TotalLectures.assignment_id.in_(assignment_ids)), TotalLectures.date, date_range).scalar() or 0
             
-            attended_lectures = db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
+            attended_lectures = filter_dates(db.session.query(db.func.sum(AttendanceRecord.lecture_count)).filter(
                 AttendanceRecord.assignment_id.in_(assignment_ids),
                 AttendanceRecord.student_id == student.id,
-            ).scalar() or 0
+            ), AttendanceRecord.date, date_range).scalar() or 0
+
+            total_lectures += sum(extra_totals.get(aid, 0) for aid in assignment_ids)
+            attended_lectures += sum(extra_attended.get((aid, student.id), 0) for aid in assignment_ids)
 
         percentage = (attended_lectures / total_lectures * 100) if total_lectures > 0 else 0
         
@@ -297,26 +325,36 @@ def get_staff_assigned_subjects(batch_id):
 
 @staff_bp.route('/roster/<int:batch_id>', methods=['GET'])
 @staff_required
+@scope_required('staff', batch='batch_id', error='You are not assigned to this batch.')
 def get_roster(batch_id):
     batch = Batch.query.get_or_404(batch_id)
-    
-    # Check if this staff is assigned to this batch
-    staff_id = session['staff_id']
-    is_assigned = Assignment.query.filter_by(staff_id=staff_id, batch_id=batch_id).first()
-    if not is_assigned:
-        return jsonify({'error': 'You are not assigned to this batch.'}), 403
 
     # Filter by sub-batch if parameters are provided
     lecture_type = request.args.get('lecture_type')
     batch_number_str = request.args.get('batch_number')
-
-    students = batch.students
+    batch_number = None
     if lecture_type and lecture_type != 'TH' and batch_number_str:
         try:
             batch_number = int(batch_number_str)
-            students = [s for s in batch.students if s.batch_number == batch_number]
         except (ValueError, TypeError):
             # Ignore invalid batch_number
             pass
 
+    # ?fields=id,roll_no selects just those columns instead of whole students
+    try:
+        fields = STUDENT_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    if fields:
+        query = db.session.query(*STUDENT_FIELDS.select(fields)).select_from(Student)\
+            .join(student_batches, student_batches.c.student_id == Student.id)\
+            .filter(student_batches.c.batch_id == batch.id)
+        if batch_number is not None:
+            query = query.filter(Student.batch_number == batch_number)
+        return jsonify(STUDENT_FIELDS.rows(query.order_by(Student.id).all(), fields))
+
+    students = batch.students
+    if batch_number is not None:
+        students = [s for s in batch.students if s.batch_number == batch_number]
+
     return jsonify([{'id': s.id, 'name': s.name, 'roll_no': s.roll_no, 'enrollment_no': s.enrollment_no, 'batch_number': s.batch_number} for s in students])
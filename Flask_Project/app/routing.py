@@ -0,0 +1,110 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import g, request, session, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import DBAPIError
+
+from .pool_health import metrics
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the read replica when the current request
+    opted in (see `replica_read`). Anything else -- flushes, INSERT/UPDATE/
+    DELETE, and every statement after the session's first write -- goes to
+    the primary, so a request always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        if self._flushing or (clause is not None and not isinstance(clause, sa.Select)):
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def execute(self, statement, *args, **kwargs):
+        """
+        Retry the session's first statement once if its connection turned out
+        to be dead. Nothing ran in the transaction before it, so rolling back
+        and replaying on a fresh connection is safe; later statements are not.
+        """
+        first = not self.info.get('executed') and not (self.new or self.dirty or self.deleted)
+        try:
+            result = super().execute(statement, *args, **kwargs)
+        except DBAPIError as e:
+            if not (first and e.connection_invalidated and current_app.config.get('RETRY_FIRST_STATEMENT')):
+                raise
+            self.rollback()
+            metrics.incr('retries')
+            result = super().execute(statement, *args, **kwargs)
+        self.info['executed'] = True
+        return result
+
+    def _use_replica(self, clause):
+        return (
+            g.get('db_target') == 'replica'
+            and not self._flushing
+            and not self.info.get('wrote')
+            and isinstance(clause, sa.Select)
+            and REPLICA_BIND in self._db.engines
+        )
+
+
+def _wants_primary():
+    # Per-request override, e.g. right after an import when the replica may lag
+    if request.headers.get('X-DB-Target') == 'primary' or request.args.get('consistency') == 'primary':
+        return True
+    # Read-after-write: this client wrote recently, so the replica may not have it yet
+    last_write = session.get('_last_write')
+    sticky = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    return last_write is not None and time.time() - last_write < sticky
+
+
+def replica_read(f):
+    """Route the GET branch of a report/listing endpoint to the read replica."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == 'GET' and not _wants_primary():
+            g.db_target = 'replica'
+        return f(*args, **kwargs)
+    return decorated
+
+
+@contextmanager
+def primary():
+    """
+    Read from the primary inside a `replica_read` view. Values that go into a
+    shared cache are computed this way: a lagging replica read right after a
+    write's version bump would otherwise be cached as current for the TTL.
+    """
+    target = g.pop('db_target', None)
+    try:
+        yield
+    finally:
+        if target is not None:
+            g.db_target = target
+
+
+def on_primary(compute):
+    """`compute` wrapped to run under `primary()`, for cache.get_or_compute."""
+    def wrapped():
+        with primary():
+            return compute()
+    return wrapped
+
+
+def init_routing(app, db):
+    """Remember when a client last wrote so its next reads stay on the primary."""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @app.after_request
+    def _track_writes(response):
+        if db.session().info.get('wrote') and response.status_code < 400:
+            session['_last_write'] = time.time()
+        return response
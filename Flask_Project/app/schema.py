@@ -0,0 +1,152 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, ensure_schema falls back to catching the conflict
+    fcntl = None
+
+# pg_advisory_lock key held while one worker syncs the schema (any constant bigint)
+SCHEMA_LOCK_KEY = 720_360_031
+
+
+def schema_revision(metadata):
+    """
+    Fingerprint of the model definitions: tables, columns, types, keys and
+    indexes. Any model change produces a new revision, so a matching stored
+    revision means the database was already created from these models.
+    """
+    digest = hashlib.sha1()
+    for table in metadata.sorted_tables:
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"|{column.name}:{column.type}:{column.nullable}:{column.primary_key}".encode())
+            for fk in column.foreign_keys:
+                digest.update(f">{fk.target_fullname}".encode())
+        for constraint in sorted(table.constraints, key=lambda c: str(c.name)):
+            digest.update(f"#{type(constraint).__name__}:{constraint.name}".encode())
+        for index in sorted(table.indexes, key=lambda i: str(i.name)):
+            digest.update(f"@{index.name}:{','.join(c.name for c in index.columns)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def ensure_attendance_unique(db):
+    """
+    Give an existing attendance_records table its one-row-per-session unique
+    key (create_all only adds it to new tables). Duplicate rows left by
+    concurrent first marks are merged into the lowest id first, summing
+    their lecture counts. Returns the number of rows merged away.
+    """
+    columns = ['assignment_id', 'student_id', 'date']
+    inspector = inspect(db.engine)
+    existing = [c['column_names'] for c in inspector.get_unique_constraints('attendance_records')]
+    existing += [i['column_names'] for i in inspector.get_indexes('attendance_records') if i['unique']]
+    if columns in existing:
+        return 0
+
+    duplicates = db.session.execute(text(
+        "SELECT min(id), sum(lecture_count), assignment_id, student_id, date FROM attendance_records "
+        "GROUP BY assignment_id, student_id, date HAVING count(*) > 1"
+    )).all()
+    merged = 0
+    for keep_id, total, assignment_id, student_id, day in duplicates:
+        merged += db.session.execute(text(
+            "DELETE FROM attendance_records WHERE assignment_id = :a AND student_id = :s AND date = :d AND id != :keep"
+        ), {'a': assignment_id, 's': student_id, 'd': day, 'keep': keep_id}).rowcount
+        db.session.execute(text(
+            "UPDATE attendance_records SET lecture_count = :total, status = :status WHERE id = :keep"
+        ), {'total': total, 'status': 'present' if total else 'absent', 'keep': keep_id})
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX uq_attendance_records_session ON attendance_records (assignment_id, student_id, date)"
+    ))
+    db.session.commit()
+    return merged
+
+
+@contextmanager
+def schema_lock(db):
+    """
+    Hold a lock shared by every worker starting on this database, so only one
+    of them runs create_all and the migrations at a time: a Postgres advisory
+    lock, or a lock file next to a SQLite database file. No-op elsewhere
+    (in-memory SQLite is private to its process).
+    """
+    engine = db.engine
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': SCHEMA_LOCK_KEY})
+                connection.commit()
+        return
+
+    path = engine.url.database if engine.dialect.name == 'sqlite' else None
+    if not path or path == ':memory:' or fcntl is None:
+        yield
+        return
+    with open(f"{path}.schema-lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _stored_revision(db):
+    from .models import SchemaVersion
+    try:
+        revision = db.session.query(SchemaVersion.revision).scalar()
+    except (OperationalError, ProgrammingError):
+        # schema_version does not exist yet: first start on this database
+        revision = None
+    # Don't hold a transaction open while waiting for the schema lock
+    db.session.rollback()
+    return revision
+
+
+def ensure_schema(app, db):
+    """
+    Create missing tables unless the stored schema revision already matches.
+
+    SCHEMA_SYNC selects the behaviour:
+    - 'auto':   one SELECT on schema_version; run create_all only on mismatch
+    - 'always': run create_all on every start (the old behaviour)
+    - 'skip':   never touch the schema (schema managed out of band)
+
+    Returns a short status string for the startup log.
+    """
+    from .models import SchemaVersion
+
+    mode = app.config.get('SCHEMA_SYNC', 'auto')
+    if mode == 'skip':
+        return 'skipped'
+
+    revision = schema_revision(db.metadata)
+    if mode == 'auto' and _stored_revision(db) == revision:
+        return 'up-to-date'
+
+    # Every worker boots at once after a deploy: one syncs, the others wait and
+    # then find the new revision stored
+    with schema_lock(db):
+        if mode == 'auto' and _stored_revision(db) == revision:
+            return 'up-to-date'
+        # The primary only: a read replica gets its schema through replication
+        db.create_all(bind_key=None)
+        ensure_attendance_unique(db)
+        SchemaVersion.query.delete()
+        db.session.add(SchemaVersion(revision=revision, applied_at=datetime.utcnow()))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Without a lock (Windows, other databases) a concurrent worker can
+            # store the revision first; the schema is in place either way
+            db.session.rollback()
+            if _stored_revision(db) != revision:
+                raise
+    return 'created'
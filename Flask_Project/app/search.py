@@ -0,0 +1,243 @@
+"""
+Fuzzy student search over name, roll number and enrollment number.
+
+On Postgres with the pg_trgm extension, a GIN trigram index on the three
+fields lets substring `LIKE` and word similarity (`<%`) run without a
+sequential scan. Everywhere else (SQLite, or before the index is created)
+an in-memory trigram index of the students is built on first use and kept
+in the versioned cache until a student is added, edited or removed.
+
+Both score matches with `match_score`: exact roll/enrollment number first,
+then prefixes, then substrings, then misspellings by trigram similarity.
+
+    flask search init      # Postgres: CREATE EXTENSION pg_trgm + the index
+"""
+import re
+import heapq
+from collections import Counter, defaultdict
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from . import db
+from .cache import cache
+from .models import Batch, Student, student_batches
+from .routing import on_primary
+
+SEARCH_NAMESPACE = 'student-search'
+INDEX_NAME = 'ix_students_search_trgm'
+# Share of the query's trigrams a field must contain to count as a fuzzy match
+MIN_SIMILARITY = 0.5
+
+_DOCUMENT = "lower(name || ' ' || roll_no || ' ' || enrollment_no)"
+
+
+def normalize(value):
+    return re.sub(r'\s+', ' ', (value or '').lower()).strip()
+
+
+def trigrams(value):
+    """Trigrams of each word, padded like pg_trgm ('  a', ' ab', 'abc', ..., 'yz ')."""
+    grams = set()
+    for word in re.findall(r'\w+', value):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def substrings(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def match_score(query, fields):
+    """
+    Score of normalized (name, roll_no, enrollment_no) for a normalized query:
+    1.0 exact roll/enrollment number, 0.9 prefix of a field or word, 0.8 substring,
+    below 0.8 trigram similarity (misspellings), 0 no match.
+    """
+    if query in fields[1:]:
+        return 1.0
+    if any(v.startswith(query) or f" {query}" in v for v in fields):
+        return 0.9
+    if any(query in v for v in fields):
+        return 0.8
+    wanted = trigrams(query)
+    if not wanted:
+        return 0.0
+    similarity = max(len(wanted & trigrams(v)) / len(wanted) for v in fields)
+    return round(0.7 * similarity, 3) if similarity >= MIN_SIMILARITY else 0.0
+
+
+# --- In-memory index (SQLite, or Postgres without pg_trgm) ---
+
+class TrigramIndex:
+    """
+    Two posting lists per trigram: plain trigrams of each field, whose
+    intersection finds substring matches, and padded word trigrams, whose
+    overlap counts find misspellings. Only the candidates are scored.
+    """
+
+    def __init__(self, rows):
+        self.fields = {}
+        self.substrings = defaultdict(set)
+        self.words = defaultdict(set)
+        for student_id, *values in rows:
+            values = tuple(normalize(v) for v in values)
+            self.fields[student_id] = values
+            for value in values:
+                for gram in substrings(value):
+                    self.substrings[gram].add(student_id)
+                for gram in trigrams(value):
+                    self.words[gram].add(student_id)
+
+    def candidates(self, query):
+        grams = substrings(query)
+        if grams:
+            found = set.intersection(*(self.substrings.get(g, set()) for g in grams))
+        else:
+            # One or two characters: too short for trigrams, scan the fields
+            found = {sid for sid, values in self.fields.items() if any(query in v for v in values)}
+
+        wanted = trigrams(query)
+        overlap = Counter()
+        for gram in wanted:
+            overlap.update(self.words.get(gram, ()))
+        needed = MIN_SIMILARITY * len(wanted)
+        found.update(sid for sid, n in overlap.items() if n >= needed)
+        return found
+
+    def search(self, query, limit):
+        scored = []
+        for student_id in self.candidates(query):
+            score = match_score(query, self.fields[student_id])
+            if score:
+                scored.append((-score, self.fields[student_id][0], student_id))
+        return [(student_id, -score) for score, _, student_id in heapq.nsmallest(limit, scored)]
+
+
+def memory_index():
+    def build():
+        rows = db.session.query(Student.id, Student.name, Student.roll_no, Student.enrollment_no).all()
+        return TrigramIndex(rows)
+    return cache.get_or_compute(SEARCH_NAMESPACE, 'index', on_primary(build),
+                                current_app.config.get('STUDENT_SEARCH_INDEX_TTL', 300))
+
+
+def invalidate_search():
+    """Drop the in-memory index after students are added or edited."""
+    cache.bump(SEARCH_NAMESPACE)
+
+
+# --- Postgres trigram index ---
+
+def trigram_index_ready():
+    """
+    True when pg_trgm and the search index exist. The answer is cached for
+    STUDENT_SEARCH_TRGM_CHECK_TTL seconds, so workers that started before
+    `flask search init` (whose cache bump only reaches its own process) pick
+    the index up without a restart.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+
+    def check():
+        return db.session.execute(text(
+            "SELECT 1 FROM pg_extension e, pg_class c WHERE e.extname = 'pg_trgm' AND c.relname = :index"
+        ), {'index': INDEX_NAME}).scalar() is not None
+
+    return cache.get_or_compute(SEARCH_NAMESPACE, 'trgm-ready', on_primary(check),
+                                current_app.config.get('STUDENT_SEARCH_TRGM_CHECK_TTL', 60))
+
+
+def _search_postgres(query, limit):
+    # The SQL narrows the candidates through the index, best match_score tier
+    # first (exact number, prefix, substring, misspelling) so the LIMIT never
+    # drops a better match; they are then scored like the in-memory path
+    rows = db.session.execute(text(f"""
+        SELECT id, name, roll_no, enrollment_no, word_similarity(:q, {_DOCUMENT}) AS similarity
+        FROM students
+        WHERE {_DOCUMENT} LIKE :pattern OR :q <% {_DOCUMENT}
+        ORDER BY CASE
+                     WHEN lower(roll_no) = :q OR lower(enrollment_no) = :q THEN 0
+                     WHEN lower(name) LIKE :prefix OR lower(roll_no) LIKE :prefix
+                          OR lower(enrollment_no) LIKE :prefix OR lower(name) LIKE :word_prefix THEN 1
+                     WHEN lower(name) LIKE :pattern OR lower(roll_no) LIKE :pattern
+                          OR lower(enrollment_no) LIKE :pattern THEN 2
+                     ELSE 3
+                 END, similarity DESC, name
+        LIMIT :candidates
+    """), {'q': query, 'pattern': f"%{_escape_like(query)}%", 'prefix': f"{_escape_like(query)}%",
+           'word_prefix': f"% {_escape_like(query)}%", 'candidates': limit * 4}).all()
+    scored = []
+    for r in rows:
+        fields = tuple(normalize(v) for v in (r.name, r.roll_no, r.enrollment_no))
+        score = match_score(query, fields)
+        if score:
+            scored.append((-score, fields[0], r.id))
+    return [(student_id, -score) for score, _, student_id in sorted(scored)[:limit]]
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# --- Search ---
+
+def search_students(query, limit=20):
+    """
+    Ranked matches for `query` as dicts with the student's fields, a
+    match score and the batches they belong to.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+    if trigram_index_ready():
+        matches = _search_postgres(query, limit)
+    else:
+        matches = memory_index().search(query, limit)
+    if not matches:
+        return []
+
+    ids = [student_id for student_id, _ in matches]
+    students = {s.id: s for s in Student.query.filter(Student.id.in_(ids))}
+    batches = defaultdict(list)
+    for student_id, batch in db.session.query(student_batches.c.student_id, Batch)\
+            .join(Batch, Batch.id == student_batches.c.batch_id)\
+            .filter(student_batches.c.student_id.in_(ids))\
+            .order_by(Batch.academic_year.desc(), Batch.semester.desc()):
+        batches[student_id].append({
+            'id': batch.id,
+            'name': f"{batch.dept_name} {batch.class_number} ({batch.academic_year} Sem {batch.semester})",
+        })
+
+    return [{
+        'id': student_id,
+        'name': students[student_id].name,
+        'roll_no': students[student_id].roll_no,
+        'enrollment_no': students[student_id].enrollment_no,
+        'batch_number': students[student_id].batch_number,
+        'score': score,
+        'batches': batches[student_id],
+    } for student_id, score in matches if student_id in students]
+
+
+# --- CLI ---
+
+search_cli = AppGroup('search', help='Student search index.')
+
+
+@search_cli.command('init')
+def init_command():
+    """Create the pg_trgm extension and the trigram index on students (Postgres)."""
+    if db.engine.dialect.name != 'postgresql':
+        click.echo('Not Postgres: search uses the in-memory index, nothing to create.')
+        return
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON students USING gin (({_DOCUMENT}) gin_trgm_ops)"
+        ))
+    cache.bump(SEARCH_NAMESPACE)
+    click.echo(f"Created {INDEX_NAME}.")
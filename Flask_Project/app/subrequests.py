@@ -0,0 +1,87 @@
+"""
+In-process GET sub-requests for the /batch endpoint.
+
+A page that needs several endpoints can fetch them in one round trip:
+
+    POST /batch {"requests": ["/staff/assignments",
+                              {"path": "/staff/roster/3", "query": {"lecture_type": "PR", "batch_number": 1}}]}
+
+Each sub-request is dispatched through the normal view, with its auth
+checks and hooks, inside the outer request's app context. It shares the
+already-decoded session and the same DB session, so the batch checks out
+one connection. Responses come back in order as {path, status, body}.
+"""
+from urllib.parse import urlsplit
+
+from flask import current_app, g, request, session
+from flask.ctx import RequestContext
+from werkzeug.test import EnvironBuilder
+
+from . import db
+from .querylog import request_tracking_paused
+
+# Headers not forwarded: the sub-request has no body, and its response is
+# embedded in the batch response (compressed once, as a whole)
+_DROPPED_HEADERS = {'content-length', 'content-type', 'accept-encoding'}
+
+
+class SubrequestError(ValueError):
+    pass
+
+
+def parse_requests(data, limit):
+    """[(path, query)] from the /batch body, validated."""
+    items = data.get('requests') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise SubrequestError("Send {'requests': [...]} with at least one path.")
+    if len(items) > limit:
+        raise SubrequestError(f"At most {limit} requests per batch.")
+    parsed = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise SubrequestError('Each request is a path or {"path": ..., "query": {...}}.')
+        parts = urlsplit(item['path'])
+        if parts.scheme or parts.netloc or not parts.path.startswith('/'):
+            raise SubrequestError(f"'{item['path']}' must be a path on this API, e.g. /staff/assignments.")
+        if parts.path.rstrip('/') == request.path.rstrip('/'):
+            raise SubrequestError('Batches cannot be nested.')
+        query = item.get('query') or {}
+        if not isinstance(query, dict):
+            raise SubrequestError(f"query for '{item['path']}' must be an object.")
+        parsed.append((parts.path, [parts.query] if parts.query else query))
+    return parsed
+
+
+def dispatch_get(path, query):
+    """Run one GET through the app in the current context; returns (status, body)."""
+    app = current_app._get_current_object()
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _DROPPED_HEADERS]
+    builder = EnvironBuilder(path=path, base_url=request.host_url, method='GET', headers=headers,
+                             query_string=query[0] if isinstance(query, list) else query,
+                             environ_base={'REMOTE_ADDR': request.remote_addr})
+    # Per-request state starts fresh for each sub-request: its replica opt-in
+    # is per view, and it counts its own queries (X-Query-Count, N+1 warnings)
+    target = g.pop('db_target', None)
+    try:
+        with request_tracking_paused(), \
+                RequestContext(app, builder.get_environ(), session=session._get_current_object()):
+            response = app.full_dispatch_request()
+    except Exception:
+        app.logger.exception("Batched request GET %s failed", path)
+        # The DB session is shared: clear the failed transaction so the next sub-request can run
+        db.session.rollback()
+        return 500, {'error': 'Internal server error'}
+    finally:
+        g.pop('db_target', None)
+        if target is not None:
+            g.db_target = target
+        builder.close()
+
+    if response.is_json:
+        return response.status_code, response.get_json()
+    if response.status_code >= 400:
+        # e.g. Werkzeug's HTML 404 page for an unknown path
+        return response.status_code, {'error': response.status}
+    return response.status_code, response.get_data(as_text=True)
@@ -0,0 +1,38 @@
+"""
+pytest helpers. Enable them in a conftest.py with
+
+    pytest_plugins = ['app.testing']
+
+`app` is built from the 'testing' profile (a fresh in-memory SQLite database
+per test), `client` is its test client, and `query_budget` caps the queries
+an endpoint may run:
+
+    def test_batches_list(client, query_budget):
+        with query_budget(3, 'GET /admin/batches'):
+            client.get('/admin/batches')
+"""
+import pytest
+
+from . import create_app, db
+from .querylog import query_budget as _query_budget
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def query_budget():
+    """`with query_budget(n, label):` fails the test if the block runs more than n statements."""
+    return _query_budget
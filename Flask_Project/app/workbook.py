@@ -0,0 +1,174 @@
+"""
+Department workbook export: one XLSX with a sheet per batch x subject.
+
+Each sheet is the historical attendance grid for the term (roll no,
+enrollment no, name, one P/A column per lecture) followed by attended,
+total and percentage columns. The workbook is built by a background thread
+with openpyxl in write-only mode, so rows are streamed to disk one sheet at
+a time and memory stays flat however large the department is.
+
+Jobs are files in EXPORT_DIR: `<job_id>.json` holds the status and
+`<job_id>.xlsx` the finished workbook, so any worker on the host can report
+on or serve a job. openpyxl is optional (pip install openpyxl).
+
+    POST /admin/exports/workbook {"dept_code": "AN", "term_id": 3}   -> 202 {job_id}
+    GET  /admin/exports/<job_id>                                      -> status
+    GET  /admin/exports/<job_id>/download                             -> the .xlsx
+"""
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+
+from flask import current_app
+
+from . import db
+from .models import Assignment, Batch, Department, Subject, Term
+from .optional import require
+from .reports import historical_grid, percentage, LECTURE_TYPE_ORDER
+
+LECTURE_TYPE_NAMES = {'TH': 'Theory', 'PR': 'Practical', 'TU': 'Tutorial'}
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ExportError(RuntimeError):
+    pass
+
+
+# --- Job files ---
+
+def _path(job_id, ext):
+    if not _JOB_ID.match(job_id or ''):
+        raise ExportError('Unknown export job.')
+    return os.path.join(current_app.config['EXPORT_DIR'], f"{job_id}.{ext}")
+
+
+def read_job(job_id):
+    """The job's status dict, or None if there is no such job."""
+    try:
+        with open(_path(job_id, 'json')) as f:
+            return json.load(f)
+    except (ExportError, FileNotFoundError):
+        return None
+
+
+def _write_job(job):
+    path = _path(job['id'], 'json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(job, f)
+    os.replace(path + '.tmp', path)
+
+
+def workbook_path(job_id):
+    return _path(job_id, 'xlsx')
+
+
+# --- Building the workbook ---
+
+def _sheet_title(batch, subject, used):
+    # Excel limits titles to 31 characters and forbids []:*?/\
+    base = re.sub(r'[\[\]:*?/\\]', '-', f"{batch.class_number} S{batch.semester} {subject.subject_code}")[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title.lower())
+    return title
+
+
+def build_workbook(path, dept_code, term, department_subjects_only=False):
+    """
+    Write the department's workbook for `term` to `path`. Returns
+    (sheets, student rows) written.
+    """
+    openpyxl = require('openpyxl', 'Workbook export')
+    department = Department.query.get(dept_code)
+    if department is None:
+        raise ExportError(f"Department '{dept_code}' not found.")
+
+    query = db.session.query(Assignment, Batch, Subject)\
+        .join(Batch, Assignment.batch_id == Batch.id)\
+        .join(Subject, Assignment.subject_id == Subject.id)\
+        .filter(Batch.dept_name == department.dept_name)
+    if department_subjects_only:
+        query = query.filter(Subject.dept_code == dept_code)
+    groups = {}
+    for assignment, batch, subject in query.order_by(Batch.semester, Batch.class_number, Subject.subject_code):
+        groups.setdefault((batch.id, subject.id), (batch, subject, []))[2].append(assignment)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    used_titles = set()
+    sheets = rows = 0
+    for batch, subject, assignments in groups.values():
+        students = sorted(batch.students, key=lambda s: s.roll_no)
+        headers, student_rows, _ = historical_grid(students, assignments, term.start_date, term.end_date)
+        types = sorted({a.lecture_type for a in assignments}, key=lambda t: LECTURE_TYPE_ORDER.get(t, 99))
+
+        sheet = workbook.create_sheet(_sheet_title(batch, subject, used_titles))
+        sheet.append([f"{batch.dept_name} {batch.class_number} - Semester {batch.semester} ({batch.academic_year})"])
+        sheet.append([f"{subject.subject_code} {subject.subject_name} - "
+                      f"{', '.join(LECTURE_TYPE_NAMES.get(t, t) for t in types)} - {term.name}"])
+        sheet.append(['Roll No', 'Enrollment No', 'Name', 'Batch'] + [h['label'] for h in headers]
+                     + ['Attended', 'Total', 'Percentage'])
+        for row in student_rows:
+            marks = [row['attendance'].get(h['id'], '-') for h in headers]
+            attended, total = marks.count('P'), len(marks) - marks.count('-')
+            sheet.append([row['roll_no'], row['enrollment_no'], row['name'], row['batch_number']]
+                         + marks + [attended, total, percentage(attended, total)])
+        sheets += 1
+        rows += len(student_rows)
+
+    if not sheets:
+        workbook.create_sheet('No data').append([f"No assignments for {department.dept_name} in {term.name}."])
+    workbook.save(path)
+    return sheets, rows
+
+
+# --- Jobs ---
+
+def start_export(dept_code, term, requested_by, department_subjects_only=False):
+    """Queue the export on a background thread and return the job dict."""
+    require('openpyxl', 'Workbook export')  # fail the request, not the job, when it is missing
+    os.makedirs(current_app.config['EXPORT_DIR'], exist_ok=True)
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'dept_code': dept_code,
+        'term_id': term.id,
+        'term_name': term.name,
+        'requested_by': requested_by,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+    _write_job(job)
+    app = current_app._get_current_object()
+    thread = threading.Thread(target=_run, args=(app, job, term.id, department_subjects_only),
+                              name=f"workbook-export-{job['id'][:8]}", daemon=True)
+    thread.start()
+    return job
+
+
+def _run(app, job, term_id, department_subjects_only):
+    with app.app_context():
+        job['status'] = 'running'
+        _write_job(job)
+        path = workbook_path(job['id'])
+        try:
+            term = db.session.get(Term, term_id)
+            sheets, rows = build_workbook(path + '.part', job['dept_code'], term, department_subjects_only)
+            os.replace(path + '.part', path)
+            job.update(status='done', sheets=sheets, rows=rows, size=os.path.getsize(path))
+        except Exception as e:
+            app.logger.exception("Workbook export %s failed", job['id'])
+            job.update(status='failed', error=str(e))
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+        finally:
+            db.session.remove()
+        job['finished_at'] = datetime.utcnow().isoformat(timespec='seconds')
+        _write_job(job)
+
+
+def download_name(job):
+    return f"attendance_{job['dept_code']}_{re.sub(r'[^A-Za-z0-9]+', '_', job['term_name']).strip('_')}.xlsx"
@@ -0,0 +1,76 @@
+"""
+Benchmark the NumPy analytics engine against the per-student report loop.
+
+Both run as HTTP requests through the test client, so each time includes the
+same auth, routing, query and JSON work: `/admin/attendance-report` (two SUM
+queries per student) against `/admin/batches/<id>/analytics` filtered to the
+same subject and lecture type (one `load_matrix`). The per-student sums of the
+two must agree, and the median time of each is printed. Also times the
+unfiltered analytics request (every subject and lecture type, with ranking),
+which the loop would need one request per group for.
+
+    python bench_analytics.py --batch-id 3 --subject-id 12 --lecture-type TH
+    python bench_analytics.py --batch-id 3 --subject-id 12 --lecture-type PR --repeat 20
+    python bench_analytics.py --config sqlite --batch-id 1 --subject-id 1
+"""
+import argparse
+import statistics
+import time
+
+from app import create_app
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return out, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-id', type=int, required=True)
+    parser.add_argument('--subject-id', type=int, required=True)
+    parser.add_argument('--lecture-type', default='TH', choices=['TH', 'PR', 'TU'])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--config', help='Config profile (production, onprem, sqlite); default APP_CONFIG')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    app.config['COMPRESS_RESPONSES'] = False
+    client = app.test_client()
+    client.post('/admin/login', json={'username': 'bvp@admin', 'password': 'bvp@pass'})
+    params = {'batch_id': args.batch_id, 'subject_id': args.subject_id, 'lecture_type': args.lecture_type}
+
+    def get(path, **query):
+        # Both read the primary, so replica lag cannot make them differ
+        res = client.get(path, query_string=query, headers={'X-DB-Target': 'primary'})
+        if res.status_code != 200:
+            raise SystemExit(f"GET {path} returned {res.status_code}: {res.get_data(as_text=True)}")
+        return res.get_json()
+
+    analytics = f'/admin/batches/{args.batch_id}/analytics'
+    loop_rows, loop_ms = time_it(lambda: get('/admin/attendance-report', **params), args.repeat)
+    vector, vector_ms = time_it(
+        lambda: get(analytics, subject_id=args.subject_id, lecture_type=args.lecture_type), args.repeat)
+    summary, summary_ms = time_it(lambda: get(analytics), args.repeat)
+
+    # The analytics summary is columnar: one row per student, one column per group (here one)
+    vector_sums = {student_id: (attended[0], total[0]) for student_id, attended, total
+                   in zip(vector['students']['id'], vector['attended'], vector['total']) if vector['groups']}
+    if any(vector_sums.get(r['student_id'], (0, 0)) != (r['attended_lectures'], r['total_lectures'])
+           for r in loop_rows):
+        raise SystemExit('Mismatch between the per-student loop and the analytics engine.')
+
+    print(f"Batch {args.batch_id}, subject {args.subject_id} {args.lecture_type}: {len(loop_rows)} students (results match)")
+    print(f"{'variant (HTTP request)':<44}{'median ms':>12}")
+    print(f"{'before: GET /admin/attendance-report':<44}{loop_ms:>12.2f}")
+    print(f"{'after: GET .../analytics (same group)':<44}{vector_ms:>12.2f}")
+    print(f"{'after: GET .../analytics (whole batch)':<44}{summary_ms:>12.2f}"
+          f"  ({len(summary['groups'])} groups, {len(summary['students']['id'])} students)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark JSON serialization and bytes-on-wire for the historical attendance grid.
+
+Compares the stock Flask JSON provider (uncompressed) against the fast provider
+with gzip/brotli, on a synthetic full-semester grid shaped exactly like the
+response of `admin.get_historical_attendance`, and the same grid in the
+compact `format=packed` / `format=rle` layouts.
+
+    python bench_serialization.py --students 70 --lectures 300
+    python bench_serialization.py --live --batch-id 3 --subject-id 12 --start-date 2026-07-01
+"""
+import argparse
+import gzip
+import statistics
+import time
+from datetime import date, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.serialization import FastJSONProvider, orjson
+from app.compression import brotli
+from app.reports import compact_grid
+
+
+def build_grid(num_students, num_lectures, assignment_id=17):
+    """Build a payload with the same keys and layout as the historical endpoint."""
+    start = date(2026, 7, 1)
+    headers = []
+    keys = []
+    for i in range(num_lectures):
+        day = start + timedelta(days=i // 2)
+        key = f"{day.isoformat()}-{assignment_id}-{i % 2}"
+        keys.append(key)
+        headers.append({'id': key, 'label': f"Lec no. {i + 1} {day.strftime('%d-%m-%Y')}"})
+
+    students = []
+    for s in range(num_students):
+        students.append({
+            'id': s + 1,
+            'roll_no': str(s + 1),
+            'enrollment_no': f"2300{s + 1:06d}",
+            'name': f"Student {s + 1}",
+            'batch_number': s % 3 + 1,
+            'attendance': {k: ('P' if (s + i) % 5 else 'A') for i, k in enumerate(keys)},
+        })
+    return {'headers': headers, 'students': students}
+
+
+def fetch_live_grid(args):
+    """Fetch a real grid through the app's test client as an admin."""
+    from app import create_app
+    app = create_app()
+    app.config['COMPRESS_RESPONSES'] = False
+    client = app.test_client()
+    client.post('/admin/login', json={'username': 'bvp@admin', 'password': 'bvp@pass'})
+    params = {'batch_id': args.batch_id, 'subject_id': args.subject_id}
+    if args.start_date:
+        params['start_date'] = args.start_date
+    if args.end_date:
+        params['end_date'] = args.end_date
+    res = client.get('/admin/historical-attendance', query_string=params)
+    if res.status_code != 200:
+        raise SystemExit(f"Endpoint returned {res.status_code}: {res.get_data(as_text=True)}")
+    return res.get_json()
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return out, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=70)
+    parser.add_argument('--lectures', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--live', action='store_true', help='Use a real grid from the configured database')
+    parser.add_argument('--batch-id', type=int)
+    parser.add_argument('--subject-id', type=int)
+    parser.add_argument('--start-date')
+    parser.add_argument('--end-date')
+    args = parser.parse_args()
+
+    payload = fetch_live_grid(args) if args.live else build_grid(args.students, args.lectures)
+
+    app = Flask(__name__)
+    stock = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+
+    with app.app_context():
+        stock_body, stock_ms = time_it(lambda: stock.response(payload).get_data(), args.repeat)
+        fast_body, fast_ms = time_it(lambda: fast.response(payload).get_data(), args.repeat)
+
+    gz_body, gz_ms = time_it(lambda: gzip.compress(fast_body, compresslevel=6), args.repeat)
+
+    print(f"Grid: {len(payload['students'])} students x {len(payload['headers'])} lectures")
+    print(f"{'variant':<28}{'encode ms':>12}{'bytes':>14}")
+    print(f"{'before: stdlib json':<28}{stock_ms:>12.2f}{len(stock_body):>14,}")
+    label = 'after: orjson' if orjson is not None else 'after: stdlib (no orjson)'
+    print(f"{label:<28}{fast_ms:>12.2f}{len(fast_body):>14,}")
+    print(f"{'after: + gzip-6':<28}{fast_ms + gz_ms:>12.2f}{len(gz_body):>14,}")
+    if brotli is not None:
+        br_body, br_ms = time_it(lambda: brotli.compress(fast_body, quality=8), args.repeat)
+        print(f"{'after: + brotli-8':<28}{fast_ms + br_ms:>12.2f}{len(br_body):>14,}")
+    else:
+        print("brotli not installed; skipping brotli variant")
+
+    for fmt in ('packed', 'rle'):
+        with app.app_context():
+            body, ms = time_it(
+                lambda: fast.response(compact_grid(payload['headers'], payload['students'], fmt)).get_data(),
+                args.repeat,
+            )
+        gz, gz_ms = time_it(lambda: gzip.compress(body, compresslevel=6), args.repeat)
+        print(f"{'compact: ' + fmt:<28}{ms:>12.2f}{len(body):>14,}")
+        print(f"{'compact: ' + fmt + ' + gzip-6':<28}{ms + gz_ms:>12.2f}{len(gz):>14,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,9 +8,128 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-     # instruct SQLAlchemy pool to pre-ping, recycle, and require SSL
+     # instruct SQLAlchemy pool to recycle and require SSL; liveness checks are in app/pool_health.py
     SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_pre_ping": True,
         "pool_recycle": 280,                   # a bit under PythonAnywhere’s ~300s timeout
         "connect_args": {"sslmode": "require"}  # enforce SSL on every new connection
     }
+
+    # JSON encoding backend: 'auto' uses orjson when installed, 'orjson' requires it, 'stdlib' disables it
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+    # gzip/brotli compression for responses larger than COMPRESS_MIN_SIZE bytes
+    COMPRESS_RESPONSES = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = ['application/json']
+
+    # Seconds a cached department defaulter list may be served (0 disables the cache)
+    DEFAULTERS_CACHE_TTL = 300
+
+    # Optional read replica for GET report/listing endpoints. Writes, and reads by a
+    # client within REPLICA_STICKY_SECONDS of its last write, stay on the primary.
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = (
+        {'replica': {'url': REPLICA_DATABASE_URL, **SQLALCHEMY_ENGINE_OPTIONS}}
+        if REPLICA_DATABASE_URL else {}
+    )
+    REPLICA_STICKY_SECONDS = 5
+
+    # Ping a pooled connection on checkout only after it sat idle this long (0 pings every
+    # checkout); a request's first statement is retried once if its connection was dropped
+    POOL_PING_IDLE_SECONDS = int(os.environ.get('POOL_PING_IDLE_SECONDS', 30))
+    RETRY_FIRST_STATEMENT = True
+
+    # Schema creation at startup: 'auto' runs create_all only when the model revision
+    # changed, 'always' runs it on every start, 'skip' leaves the schema alone
+    SCHEMA_SYNC = os.environ.get('SCHEMA_SYNC', 'auto')
+
+    # Seconds a cached staff/HOD access scope is trusted before being rebuilt
+    SCOPE_CACHE_TTL = 300
+
+    # Seconds a cached student attendance profile may be served (0 disables the cache);
+    # attendance writes for the student invalidate it immediately
+    STUDENT_PROFILE_CACHE_TTL = 300
+
+    # Student search: seconds the in-memory index (used without Postgres pg_trgm) may be
+    # served before a rebuild, and the most results one search may return
+    STUDENT_SEARCH_INDEX_TTL = 300
+    STUDENT_SEARCH_MAX_RESULTS = 100
+    # Seconds a "pg_trgm index missing" answer is trusted before asking Postgres again
+    STUDENT_SEARCH_TRGM_CHECK_TTL = 60
+
+    # How many days back staff may mark attendance (admins/HODs use the session editor),
+    # and the most lectures one mark-attendance call may record
+    ATTENDANCE_BACKDATE_DAYS = int(os.environ.get('ATTENDANCE_BACKDATE_DAYS', 7))
+    ATTENDANCE_MAX_LECTURES = 8
+
+    # Where closed terms are written by 'flask archive term' (compressed NumPy columns)
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+    # Most GET sub-requests one POST /batch call may bundle
+    BATCH_MAX_REQUESTS = 10
+
+    # N+1 detection (app/querylog.py): 'off', 'warn' or 'raise' when one SQL shape runs
+    # QUERY_REPEAT_THRESHOLD times in a request; unset means 'warn' in debug mode only
+    QUERY_DETECTOR = os.environ.get('QUERY_DETECTOR')
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 10))
+
+    # Where department workbook exports (app/workbook.py) and their job status files are kept
+    EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports'))
+
+
+# --- Deployment profiles, selected by create_app(name) or APP_CONFIG ---
+
+def replica_binds(engine_options):
+    url = os.environ.get('REPLICA_DATABASE_URL')
+    return {'replica': {'url': url, **engine_options}} if url else {}
+
+
+class ProductionConfig(Config):
+    """The hosted PythonAnywhere Postgres (SSL, recycled before the host's idle timeout)."""
+
+
+class OnPremConfig(Config):
+    """A Postgres server on the campus network: no SSL requirement, a larger pool."""
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://localhost/bvpattendance')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": 10,
+        "max_overflow": 20,
+    }
+    SQLALCHEMY_BINDS = replica_binds(SQLALCHEMY_ENGINE_OPTIONS)
+
+
+class SQLiteConfig(Config):
+    """
+    Single-server deployment on a local SQLite file (relative paths live in
+    the Flask instance folder). WAL lets reports read while attendance is
+    being written; the pragmas are applied to every new connection.
+    """
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///bvpattendance.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',   # durable at checkpoints; safe with WAL
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,      # ms to wait on a locked database instead of failing
+        'cache_size': -20000,      # ~20 MB page cache
+        'temp_store': 'MEMORY',
+    }
+
+
+class TestingConfig(SQLiteConfig):
+    """In-memory SQLite (Flask-SQLAlchemy shares one connection across threads)."""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SCHEMA_SYNC = 'always'
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+    QUERY_DETECTOR = 'warn'
+
+
+config_profiles = {
+    'production': ProductionConfig,
+    'onprem': OnPremConfig,
+    'sqlite': SQLiteConfig,
+    'testing': TestingConfig,
+}
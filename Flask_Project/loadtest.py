@@ -0,0 +1,235 @@
+"""
+Load test replaying the morning marking rush against a running server.
+
+Each virtual user is a staff member who logs in, lists their assignments,
+opens a roster and marks attendance, once per simulated period. Users start
+over a ramp-up window (the first minutes of a period) and then loop until
+the duration ends. The report gives throughput, p50/p95/p99 latency and the
+error rate per endpoint.
+
+Marking writes real attendance for --date (default today), so point this at
+a local server backed by a scratch copy of the database:
+
+    python run.py                                   # or gunicorn -w 4 run:app
+    python loadtest.py --users-file staff.csv --concurrency 200 --duration 120
+    python loadtest.py --password pw --config sqlite --concurrency 50 --mix mark=70,view=30
+    python loadtest.py --users-file staff.csv --ramp-up 30 --json results.json
+
+--users-file is a CSV of username,password. Without it, staff who have
+assignments are read from the --config database and all use --password.
+"""
+import argparse
+import csv
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from urllib.parse import urlencode, urlsplit
+
+
+class Client:
+    """One staff member's keep-alive connection and session cookie."""
+
+    def __init__(self, base_url, stats, timeout):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+        self.stats = stats
+        self.cookies = {}
+
+    def request(self, method, path, label, body=None, query=None):
+        url = self.prefix + path + (f"?{urlencode(query)}" if query else '')
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'identity'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, url, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            self.stats.record(label, time.perf_counter() - started, error=type(e).__name__)
+            return None, None
+        elapsed = time.perf_counter() - started
+
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name.strip()] = rest.split(';', 1)[0]
+        self.stats.record(label, elapsed, error=None if response.status < 400 else str(response.status))
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def record(self, label, seconds, error=None):
+        with self._lock:
+            self.latencies[label].append(seconds * 1000)
+            if error:
+                self.errors[label][error] += 1
+
+    def report(self, wall_seconds):
+        rows = []
+        for label in sorted(self.latencies):
+            samples = sorted(self.latencies[label])
+            cuts = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+            errors = sum(self.errors[label].values())
+            rows.append({
+                'endpoint': label,
+                'requests': len(samples),
+                'rps': round(len(samples) / wall_seconds, 2),
+                'p50_ms': round(cuts[49], 1),
+                'p95_ms': round(cuts[94], 1),
+                'p99_ms': round(cuts[98], 1),
+                'max_ms': round(samples[-1], 1),
+                'errors': errors,
+                'error_rate': round(errors / len(samples) * 100, 2),
+                'error_kinds': dict(self.errors[label]),
+            })
+        return rows
+
+
+# --- Scenario ---
+
+def pick_session(assignments, rng):
+    """A (subject, batch, lecture type, sub-batch) this staff member teaches."""
+    entry = rng.choice(assignments)
+    lecture_type = rng.choice(sorted(entry['lecture_types']))
+    batch_number = rng.choice(entry['lecture_types'][lecture_type])
+    return entry, lecture_type, batch_number
+
+
+def run_user(args, credentials, stats, deadline, start_delay, seed):
+    rng = random.Random(seed)
+    time.sleep(start_delay)
+    client = Client(args.base_url, stats, args.timeout)
+    username, password = credentials
+    status, _ = client.request('POST', '/staff/login', 'POST /staff/login',
+                               body={'username': username, 'password': password})
+    if status != 200:
+        return
+    marks = rng.choices(list(args.mix), weights=list(args.mix.values()))[0] == 'mark'
+
+    while time.monotonic() < deadline:
+        status, assignments = client.request('GET', '/staff/assignments', 'GET /staff/assignments')
+        if status != 200 or not assignments:
+            return
+        entry, lecture_type, batch_number = pick_session(assignments, rng)
+        query = {'lecture_type': lecture_type}
+        if batch_number is not None:
+            query['batch_number'] = batch_number
+        status, roster = client.request('GET', f"/staff/roster/{entry['batch_id']}", 'GET /staff/roster/<id>',
+                                        query=query)
+        if status == 200 and roster and marks:
+            absent = [s['roll_no'] for s in roster if rng.random() < args.absent_rate]
+            client.request('POST', '/staff/mark-attendance', 'POST /staff/mark-attendance', body={
+                'subject_id': entry['subject_id'],
+                'batch_id': entry['batch_id'],
+                'lecture_type': lecture_type,
+                'batch_number': batch_number,
+                'absent_rolls': absent,
+                'date': args.date,
+            })
+        time.sleep(rng.uniform(*args.think_time))
+        if args.once:
+            return
+
+
+# --- Setup ---
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('mark', 'view'):
+            raise argparse.ArgumentTypeError("mix entries are 'mark' and 'view', e.g. mark=80,view=20")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def load_users(args):
+    if args.users_file:
+        with open(args.users_file, newline='') as f:
+            return [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2 and row[0].strip()]
+    if not args.password:
+        raise SystemExit('Give --users-file, or --password to use the staff in the --config database.')
+    from app import create_app, db
+    from app.models import Assignment, Staff
+
+    with create_app(args.config).app_context():
+        names = db.session.query(Staff.username).join(Assignment, Assignment.staff_id == Staff.id)\
+            .distinct().order_by(Staff.username).all()
+    return [(name, args.password) for name, in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users-file', help='CSV of username,password')
+    parser.add_argument('--password', help='Password shared by the staff read from the database')
+    parser.add_argument('--config', help='Config profile used to read staff (production, onprem, sqlite)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous staff (users are reused round-robin)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to keep looping after ramp-up starts')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users log in')
+    parser.add_argument('--think-time', type=float, nargs=2, default=(1.0, 3.0), metavar=('MIN', 'MAX'))
+    parser.add_argument('--mix', type=parse_mix, default={'mark': 1.0}, help="Share of users who mark vs only view, e.g. mark=80,view=20")
+    parser.add_argument('--absent-rate', type=float, default=0.1)
+    parser.add_argument('--date', default=date.today().isoformat(), help='Date to mark (YYYY-MM-DD)')
+    parser.add_argument('--once', action='store_true', help='One period per user instead of looping')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    users = load_users(args)
+    if not users:
+        raise SystemExit('No staff users to simulate.')
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_user, daemon=True, args=(
+            args, users[i % len(users)], stats, deadline,
+            args.ramp_up * i / max(args.concurrency - 1, 1), args.seed + i))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+
+    rows = stats.report(wall)
+    total = sum(r['requests'] for r in rows)
+    print(f"{args.concurrency} users ({len(users)} accounts), {wall:.1f} s, {total} requests, "
+          f"{total / wall:.1f} req/s")
+    print(f"{'endpoint':<32}{'reqs':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'err%':>7}")
+    for r in rows:
+        print(f"{r['endpoint']:<32}{r['requests']:>7}{r['rps']:>8.1f}{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}"
+              f"{r['p99_ms']:>8.1f}{r['max_ms']:>8.1f}{r['error_rate']:>7.2f}"
+              + (f"  {r['error_kinds']}" if r['errors'] else ''))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'wall_seconds': round(wall, 2), 'endpoints': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
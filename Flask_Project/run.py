@@ -1,8 +1,6 @@
-from app import create_app, db
+from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,42 @@
+import pytest
+
+from app import bcrypt, db
+from app.models import Assignment, Batch, Department, HOD, Staff, Student, Subject
+
+pytest_plugins = ['app.testing']
+
+
+@pytest.fixture
+def school(app, tmp_path):
+    """
+    One department with a staff member (t1), its HOD (h1), a subject and a
+    batch of two students with a theory assignment; returns their ids.
+    """
+    app.config['ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    password = bcrypt.generate_password_hash('pw').decode()
+    staff = Staff(username='t1', full_name='Teacher One', password_hash=password)
+    head = Staff(username='h1', full_name='Head One', password_hash=password)
+    subject = Subject(course_code='C1', dept_code='AN', semester_number=3, subject_code='DMS', subject_name='Discrete')
+    batch = Batch(dept_name='Animation', class_number='A', academic_year='2026-27', semester=3)
+    batch.students = [Student(roll_no=str(i), enrollment_no=f'E{i:03d}', name=f'Stu {i}') for i in (1, 2)]
+    db.session.add_all([Department(dept_code='AN', dept_name='Animation'), staff, head, subject, batch])
+    db.session.flush()
+    db.session.add(HOD(staff_id=head.id, dept_code='AN'))
+    assignment = Assignment(staff_id=staff.id, subject_id=subject.id, batch_id=batch.id, lecture_type='TH')
+    db.session.add(assignment)
+    db.session.commit()
+    return {'assignment': assignment.id, 'subject': subject.id, 'batch': batch.id,
+            'students': [s.id for s in batch.students]}
+
+
+@pytest.fixture
+def login():
+    """`login(client, 'admin' | 'staff' | 'hod')` signs in as the `school` user for that role."""
+    def sign_in(client, role):
+        if role == 'admin':
+            response = client.post('/admin/login', json={'username': 'bvp@admin', 'password': 'bvp@pass'})
+        else:
+            username = 't1' if role == 'staff' else 'h1'
+            response = client.post(f'/{role}/login', json={'username': username, 'password': 'pw'})
+        assert response.status_code == 200
+    return sign_in
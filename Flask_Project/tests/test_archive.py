@@ -0,0 +1,81 @@
+"""
+Closed and archived terms: their attendance is frozen, and every worker sees
+an archive as soon as `Term.archived_at` is set.
+"""
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.archive import archive_term, archived_terms
+from app.models import AttendanceBitset, AttendanceRecord, Term, TotalLectures
+
+TODAY = date.today()
+
+
+def add_term(start, end, closed=True):
+    term = Term(name=f'{start} term', start_date=start, end_date=end, is_closed=closed)
+    db.session.add(term)
+    db.session.commit()
+    return term
+
+
+def test_writes_to_a_closed_term_are_rejected(app, school, login):
+    add_term(TODAY - timedelta(days=30), TODAY)
+    client = app.test_client()
+
+    login(client, 'staff')
+    response = client.post('/staff/mark-attendance', json={
+        'subject_id': school['subject'], 'batch_id': school['batch'], 'lecture_type': 'TH', 'absent_rolls': []})
+    assert response.status_code == 409
+
+    edit = {'date': TODAY.isoformat(), 'updates': [
+        {'assignment_id': school['assignment'], 'student_id': school['students'][0], 'attended_lectures': 1}]}
+    for role in ('admin', 'hod'):
+        login(client, role)
+        assert client.post(f'/{role}/attendance/session', json=edit).status_code == 409
+
+    assert AttendanceRecord.query.count() == AttendanceBitset.query.count() == 0
+    assert TotalLectures.query.count() == 0
+
+
+def test_open_term_still_accepts_marks(app, school, login):
+    add_term(TODAY - timedelta(days=30), TODAY, closed=False)
+    client = app.test_client()
+    login(client, 'staff')
+    response = client.post('/staff/mark-attendance', json={
+        'subject_id': school['subject'], 'batch_id': school['batch'], 'lecture_type': 'TH', 'absent_rolls': ['2']})
+    assert response.status_code == 200
+    assert AttendanceBitset.query.count() == 1
+
+
+def test_archiving_keeps_report_totals_and_freezes_the_term(app, school, login):
+    day = TODAY - timedelta(days=100)
+    term = add_term(day - timedelta(days=10), day + timedelta(days=10))
+    db.session.add(TotalLectures(assignment_id=school['assignment'], date=day, lecture_count=2))
+    for student_id, attended in zip(school['students'], (2, 1)):
+        db.session.add(AttendanceRecord(assignment_id=school['assignment'], student_id=student_id, date=day,
+                                        status='present', lecture_count=attended))
+    db.session.commit()
+
+    client = app.test_client()
+    login(client, 'admin')
+    report = lambda: client.get(f"/admin/attendance-report?batch_id={school['batch']}"
+                                f"&subject_id={school['subject']}&lecture_type=TH").get_json()
+    before = report()
+    archive_term(term)
+    assert AttendanceRecord.query.count() == 0
+    assert report() == before
+
+    edit = {'date': day.isoformat(), 'updates': [
+        {'assignment_id': school['assignment'], 'student_id': school['students'][1], 'attended_lectures': 2}]}
+    assert client.post('/admin/attendance/session', json=edit).status_code == 409
+    assert report() == before
+
+
+def test_archive_seen_without_a_cache_bump(app, school):
+    term = add_term(TODAY - timedelta(days=200), TODAY - timedelta(days=100))
+    assert archived_terms() == []
+    # As if another process (the archive CLI) archived it: no cache bump reaches this one
+    with db.engine.begin() as connection:
+        connection.execute(Term.__table__.update().where(Term.id == term.id).values(archived_at=datetime.utcnow()))
+    db.session.expire_all()
+    assert [t[0] for t in archived_terms()] == [term.name]
@@ -0,0 +1,146 @@
+"""
+Bitset storage: the encoder round-trips, marks are stored one bitset per
+session, and the reports give the same numbers from rows and bitsets.
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.archive import archive_term
+from app.bitsets import (
+    count_attended, decode_slots, encode_slots, load_sessions, migrate_rows, pack_roster, storage_stats, unpack_roster
+)
+from app.cache import cache
+from app.models import AttendanceBitset, AttendanceRecord, Term, TotalLectures
+
+TODAY = date.today()
+
+
+# --- Encoding ---
+
+@pytest.mark.parametrize('ids', [[], [7], [3, 1, 2, 3], [0, 2 ** 32 - 1], list(range(1000, 1200))])
+def test_roster_round_trip(ids):
+    blob = pack_roster(ids)
+    assert len(blob) == 4 * len(set(ids))
+    assert unpack_roster(blob) == tuple(sorted(set(ids)))
+
+
+@pytest.mark.parametrize('size', [0, 1, 7, 8, 9, 60, 257])
+@pytest.mark.parametrize('lectures', [0, 1, 3])
+def test_slots_round_trip(size, lectures):
+    rng = random.Random(size * 10 + lectures)
+    roster = unpack_roster(pack_roster(rng.sample(range(1, 10 * size + 2), size)))
+    slots = [{sid for sid in roster if rng.random() < 0.7} for _ in range(lectures)]
+
+    bits = encode_slots(roster, slots)
+    assert len(bits) == lectures * ((size + 7) // 8)
+    assert decode_slots(roster, bits, lectures) == slots
+    assert count_attended(roster, bits, lectures) == {sid: sum(sid in s for s in slots) for sid in roster}
+
+
+def test_students_outside_the_roster_are_not_encoded():
+    roster = (2, 5)
+    assert decode_slots(roster, encode_slots(roster, [{2, 9}]), 1) == [{2}]
+
+
+# --- Storage ---
+
+def mark(client, school, **body):
+    response = client.post('/staff/mark-attendance', json={
+        'subject_id': school['subject'], 'batch_id': school['batch'], 'lecture_type': 'TH', **body})
+    assert response.status_code == 200, response.get_json()
+
+
+def test_marks_are_stored_as_one_exact_bitset(app, school, login):
+    client = app.test_client()
+    login(client, 'staff')
+    first, second = school['students']
+    mark(client, school, absent_rolls=['2'])
+    mark(client, school, lecture_count=2, attended={'1': 1})
+
+    assert AttendanceRecord.query.count() == 0
+    assert load_sessions([school['assignment']]) == {(school['assignment'], TODAY): [{first}, {first, second}, {second}]}
+
+    login(client, 'admin')
+    session = client.get(f"/admin/attendance/session?batch_id={school['batch']}&subject_id={school['subject']}"
+                         f"&lecture_type=TH&date={TODAY.isoformat()}").get_json()
+    assert [(s['student_id'], s['attended_lectures'], s['total_lectures']) for s in session] == [
+        (first, 2, 3), (second, 2, 3)]
+
+    # An edit changes the bitset, keeping the lectures already marked
+    edit = {'date': TODAY.isoformat(), 'updates': [
+        {'assignment_id': school['assignment'], 'student_id': second, 'attended_lectures': 3}]}
+    assert client.post('/admin/attendance/session', json=edit).status_code == 200
+    assert load_sessions([school['assignment']])[(school['assignment'], TODAY)] == [
+        {first, second}, {first, second}, {second}]
+    assert AttendanceRecord.query.count() == 0
+
+
+def add_rows(school, day, held, attended):
+    db.session.add(TotalLectures(assignment_id=school['assignment'], date=day, lecture_count=held))
+    for student_id, count in zip(school['students'], attended):
+        db.session.add(AttendanceRecord(assignment_id=school['assignment'], student_id=student_id, date=day,
+                                        status='present' if count else 'absent', lecture_count=count))
+    db.session.commit()
+
+
+def snapshot(client, school):
+    query = f"batch_id={school['batch']}&subject_id={school['subject']}&lecture_type=TH"
+    start = (TODAY - timedelta(days=120)).isoformat()
+    paths = {
+        'report': f'/admin/attendance-report?{query}',
+        'consolidated': f"/admin/batches/{school['batch']}/consolidated",
+        'analytics': f"/admin/batches/{school['batch']}/analytics",
+        'profile': '/students/E001/attendance',
+        'grid': f'/admin/historical-attendance?{query}&start_date={start}&format=packed',
+    }
+    cache.bump_all()
+    responses = {name: client.get(path) for name, path in paths.items()}
+    assert {name: r.status_code for name, r in responses.items()} == dict.fromkeys(paths, 200)
+    return {name: r.get_json() for name, r in responses.items()}
+
+
+def test_migration_converts_rows_and_keeps_every_report(app, school, login):
+    for days_ago, held, attended in ((3, 1, (1, 0)), (2, 2, (2, 1)), (1, 3, (0, 3))):
+        add_rows(school, TODAY - timedelta(days=days_ago), held, attended)
+    client = app.test_client()
+    login(client, 'admin')
+    before = snapshot(client, school)
+    assert before['report'][0]['attended_lectures'] == 3
+
+    assert migrate_rows(batch_size=2) == (3, 6)
+    assert AttendanceRecord.query.count() == 0
+    assert storage_stats()['bitset_rows'] == 3
+    assert snapshot(client, school) == before
+
+    # A session marked again after the migration keeps its converted lectures
+    login(client, 'staff')
+    mark(client, school, date=(TODAY - timedelta(days=1)).isoformat(), absent_rolls=['1'])
+    first, second = school['students']
+    assert load_sessions([school['assignment']])[(school['assignment'], TODAY - timedelta(days=1))] == [
+        {second}, {second}, {second}, {second}]
+
+
+def test_migration_only_before_a_date(app, school):
+    add_rows(school, TODAY - timedelta(days=5), 1, (1, 1))
+    add_rows(school, TODAY, 1, (0, 1))
+    assert migrate_rows(before=TODAY) == (1, 2)
+    assert [r.date for r in AttendanceRecord.query.all()] == [TODAY, TODAY]
+
+
+def test_archived_bitsets_keep_the_report(app, school, login):
+    day = TODAY - timedelta(days=100)
+    add_rows(school, day, 2, (2, 1))
+    migrate_rows()
+    term = Term(name='old', start_date=day, end_date=day, is_closed=True)
+    db.session.add(term)
+    db.session.commit()
+
+    client = app.test_client()
+    login(client, 'admin')
+    before = snapshot(client, school)
+    archive_term(term)
+    assert AttendanceBitset.query.count() == 0
+    assert snapshot(client, school) == before
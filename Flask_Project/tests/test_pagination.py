@@ -0,0 +1,31 @@
+"""Keyset pagination: cursors page through a list, and bad ones are a 400."""
+import pytest
+
+from app.pagination import encode_cursor
+
+
+def test_pages_follow_the_cursor(app, school, login):
+    client = app.test_client()
+    login(client, 'admin')
+    first = client.get('/admin/staff?limit=1&sort=username').get_json()
+    second = client.get(f"/admin/staff?limit=1&sort=username&cursor={first['next_cursor']}").get_json()
+    assert [s['username'] for s in first['items'] + second['items']] == ['h1', 't1']
+    assert second['next_cursor'] is None
+
+
+@pytest.mark.parametrize('values', [
+    ['username', ['h1'], 1],
+    ['username', {'a': 1}, 1],
+    ['username', 'h1', [1]],
+    ['username', 'h1', '1'],
+    ['id', 'h1', 1],
+    ['id', True, 1],
+    [['username'], 'h1', 1],
+])
+def test_cursor_values_must_match_the_sort_column(app, school, login, values):
+    client = app.test_client()
+    login(client, 'admin')
+    sort = values[0] if isinstance(values[0], str) else 'username'
+    response = client.get(f"/admin/staff?limit=1&sort={sort}&cursor={encode_cursor(values)}")
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,26 @@
+"""Pool wait metrics count only checkouts that found the pool exhausted."""
+import sqlite3
+import threading
+import time
+
+from app.pool_health import TimedQueuePool, metrics
+
+
+def test_only_blocked_checkouts_count_as_waits():
+    pool = TimedQueuePool(lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                          pool_size=1, max_overflow=0, timeout=5)
+    metrics.reset()
+    for _ in range(5):
+        pool.connect().close()
+    assert metrics.snapshot()['pool_waits'] == 0
+
+    held = pool.connect()
+    waiter = threading.Thread(target=lambda: pool.connect().close())
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join()
+    snapshot = metrics.snapshot()
+    assert snapshot['pool_waits'] == 1
+    assert snapshot['pool_wait_ms_max'] >= 40
+    metrics.reset()
@@ -0,0 +1,40 @@
+"""
+Query budgets for list endpoints: the statement count must not grow with
+the number of rows, which is what an N+1 pattern would do.
+"""
+import pytest
+
+from app import db
+from app.models import Batch, Student
+
+
+@pytest.fixture
+def admin(client):
+    response = client.post('/admin/login', json={'username': 'bvp@admin', 'password': 'bvp@pass'})
+    assert response.status_code == 200
+    return client
+
+
+def make_batch(size):
+    batch = Batch(dept_name='Animation', class_number='A', academic_year='2026-27', semester=3)
+    batch.students = [Student(roll_no=str(i), enrollment_no=f'E{size}-{i:03d}', name=f'Stu {i}', batch_number=1)
+                      for i in range(1, size + 1)]
+    db.session.add(batch)
+    db.session.commit()
+    return batch.id
+
+
+@pytest.mark.parametrize('size', [2, 40])
+def test_batch_students_fixed_query_count(admin, query_budget, size):
+    batch_id = make_batch(size)
+    with query_budget(3, f'GET /admin/batches/{batch_id} ({size} students)'):
+        response = admin.get(f'/admin/batches/{batch_id}')
+    assert response.status_code == 200
+
+
+def test_budget_fails_on_a_query_per_row(app, query_budget):
+    make_batch(5)
+    with pytest.raises(AssertionError, match='budget 3'):
+        with query_budget(3, 'lazy loads'):
+            for student in Student.query.all():
+                student.batches
@@ -0,0 +1,112 @@
+"""
+Read-replica routing against two local SQLite databases.
+
+The replica is a separate file that is deliberately out of date, so every
+response shows which database answered it.
+
+    cd Flask_Project && python -m pytest -q tests/test_replica_routing.py
+"""
+from datetime import date
+
+import pytest
+
+import config
+from app import bcrypt, create_app, db
+from app.models import (
+    Assignment, AttendanceRecord, Batch, Department, HOD, Staff, Student, Subject, TotalLectures
+)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class ReplicaTestConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {'replica': {'url': f"sqlite:///{tmp_path / 'replica.db'}"}}
+        DEFAULTERS_CACHE_TTL = 300
+
+    monkeypatch.setitem(config.config_profiles, 'replica-test', ReplicaTestConfig)
+    app = create_app('replica-test')
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica'])
+        password = bcrypt.generate_password_hash('pw').decode()
+        # Same department, HOD and class on both; attendance only on the primary
+        for engine in (db.engine, db.engines['replica']):
+            with engine.begin() as connection:
+                connection.execute(Department.__table__.insert(), {'dept_code': 'AN', 'dept_name': 'Animation'})
+                connection.execute(Staff.__table__.insert(),
+                                   {'id': 1, 'username': 'h1', 'full_name': 'Head One', 'password_hash': password})
+                connection.execute(HOD.__table__.insert(), {'staff_id': 1, 'dept_code': 'AN'})
+                connection.execute(Subject.__table__.insert(), {
+                    'id': 1, 'course_code': 'C1', 'dept_code': 'AN', 'semester_number': 3,
+                    'subject_code': 'DMS', 'subject_name': 'Discrete'})
+                connection.execute(Batch.__table__.insert(), {
+                    'id': 1, 'dept_name': 'Animation', 'class_number': 'A',
+                    'academic_year': '2026-27', 'semester': 3})
+                connection.execute(Student.__table__.insert(),
+                                   {'id': 1, 'roll_no': '1', 'enrollment_no': 'E001', 'name': 'Stu 1'})
+                connection.execute(db.metadata.tables['student_batches'].insert(), {'student_id': 1, 'batch_id': 1})
+                connection.execute(Assignment.__table__.insert(),
+                                   {'id': 1, 'staff_id': 1, 'subject_id': 1, 'batch_id': 1, 'lecture_type': 'TH'})
+        with db.engine.begin() as connection:
+            connection.execute(Department.__table__.insert(), {'dept_code': 'CE', 'dept_name': 'Civil'})
+            connection.execute(TotalLectures.__table__.insert(),
+                               {'assignment_id': 1, 'date': date(2026, 8, 3), 'lecture_count': 4})
+            connection.execute(AttendanceRecord.__table__.insert(), {
+                'assignment_id': 1, 'student_id': 1, 'date': date(2026, 8, 3),
+                'status': 'present', 'lecture_count': 1})
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def login(client, role):
+    if role == 'admin':
+        response = client.post('/admin/login', json={'username': 'bvp@admin', 'password': 'bvp@pass'})
+    else:
+        response = client.post('/hod/login', json={'username': 'h1', 'password': 'pw'})
+    assert response.status_code == 200
+
+
+def dept_codes(response):
+    assert response.status_code == 200
+    return sorted(d['dept_code'] for d in response.get_json())
+
+
+def test_get_reads_the_replica(app):
+    client = app.test_client()
+    login(client, 'admin')
+    assert dept_codes(client.get('/admin/departments')) == ['AN']
+
+
+def test_per_request_override_reads_the_primary(app):
+    client = app.test_client()
+    login(client, 'admin')
+    assert dept_codes(client.get('/admin/departments?consistency=primary')) == ['AN', 'CE']
+    assert dept_codes(client.get('/admin/departments', headers={'X-DB-Target': 'primary'})) == ['AN', 'CE']
+
+
+def test_writes_go_to_the_primary_and_reads_stick_to_it(app):
+    writer, other = app.test_client(), app.test_client()
+    login(writer, 'admin')
+    login(other, 'admin')
+    assert writer.post('/admin/departments', json={'dept_code': 'ME', 'dept_name': 'Mech'}).status_code == 201
+
+    with app.app_context():
+        assert db.session.get(Department, 'ME') is not None
+        with db.engines['replica'].connect() as connection:
+            assert connection.execute(Department.__table__.select().where(Department.dept_code == 'ME')).first() is None
+
+    # The writer reads its own write; another client is still served by the replica
+    assert 'ME' in dept_codes(writer.get('/admin/departments'))
+    assert 'ME' not in dept_codes(other.get('/admin/departments'))
+
+
+def test_cached_reports_are_computed_on_the_primary(app):
+    client = app.test_client()
+    login(client, 'hod')
+    # The replica has no attendance at all; a cached report built from it would list nobody
+    body = client.get('/hod/defaulters?threshold=75').get_json()
+    assert [(d['roll_no'], d['percentage']) for d in body['defaulters']] == [('1', 25.0)]
+    assert client.get('/hod/defaulters?threshold=75').get_json() == body
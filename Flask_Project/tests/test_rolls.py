@@ -0,0 +1,83 @@
+"""Roll expressions: lists, ranges, prefixes, padding and unknown rolls."""
+from collections import namedtuple
+
+import pytest
+
+from app.rolls import MAX_RANGE, RollExpressionError, RollIndex, parse_rolls
+
+Student = namedtuple('Student', 'id roll_no')
+
+
+def index(*rolls):
+    return RollIndex([Student(i, roll) for i, roll in enumerate(rolls, start=1)])
+
+
+def rolls_of(students):
+    return [s.roll_no for s in students]
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('1-3,7', ['1', '2', '3', '7']),
+    ('1-3 7  9', ['1', '2', '3', '7', '9']),
+    ('3,1-3', ['3', '1', '2']),
+    ('01-03', ['01', '02', '03']),
+    ('A1-A3', ['A1', 'A2', 'A3']),
+    ('A1-3', ['A1', 'A2', 'A3']),
+    ('5-5', ['5']),
+    ('', []),
+    (['1-2', '4, 5'], ['1', '2', '4', '5']),
+])
+def test_parse(expression, expected):
+    assert parse_rolls(expression) == expected
+
+
+@pytest.mark.parametrize('expression', ['5-1', f'1-{MAX_RANGE + 1}'])
+def test_bad_ranges(expression):
+    with pytest.raises(RollExpressionError):
+        parse_rolls(expression)
+
+
+def test_known_rolls_are_literal():
+    known = {'A 12', '2021-07'}
+    assert parse_rolls(['A 12', '2021-07'], known) == ['A 12', '2021-07']
+    assert parse_rolls('A 12, 2021-07, 3', known) == ['A 12', '2021-07', '3']
+
+
+def test_list_elements_keep_their_spaces():
+    rolls = index('A 12', 'A 13')
+    found, invalid = rolls.resolve(rolls.parse(['A 12', ' A 13 ']))
+    assert (rolls_of(found), invalid) == (['A 12', 'A 13'], [])
+
+
+def test_ranges_match_zero_padded_rolls():
+    rolls = index('01', '02', '03', '10')
+    found, invalid = rolls.resolve(rolls.parse('1-3'))
+    assert (rolls_of(found), invalid) == (['01', '02', '03'], [])
+    assert rolls.find(10).roll_no == '10'
+    assert rolls.find('a007') is None
+
+
+def test_padding_match_keeps_the_prefix():
+    rolls = index('A07', 'B07')
+    assert rolls.find('A7').roll_no == 'A07'
+    assert rolls.find('B7').roll_no == 'B07'
+    assert rolls.find('7') is None
+
+
+def test_ambiguous_numbers_need_the_exact_roll():
+    rolls = index('7', '07')
+    assert rolls.find('7').id == 1
+    assert rolls.find('07').id == 2
+    assert rolls.find('007') is None
+
+
+def test_unknown_rolls_are_reported():
+    rolls = index('1', '2')
+    found, invalid = rolls.resolve(rolls.parse('1-4, x'))
+    assert (rolls_of(found), invalid) == (['1', '2'], ['3', '4', 'x'])
+
+
+def test_the_same_student_twice_counts_once():
+    rolls = index('01')
+    found, _ = rolls.resolve(rolls.parse('1, 01'))
+    assert rolls_of(found) == ['01']
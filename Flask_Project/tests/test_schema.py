@@ -0,0 +1,54 @@
+"""
+Schema sync at start-up: workers booting together on one database must not
+race on create_all and the schema_version row.
+"""
+import threading
+
+import pytest
+
+import config
+from app import create_app, db
+from app.models import SchemaVersion
+from app.schema import ensure_schema
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Apps on one fresh SQLite file, built without touching the schema yet."""
+    class SchemaTestConfig(config.SQLiteConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'schema.db'}"
+        SCHEMA_SYNC = 'skip'
+
+    monkeypatch.setitem(config.config_profiles, 'schema-test', SchemaTestConfig)
+    apps = [create_app('schema-test') for _ in range(6)]
+    for app in apps:
+        app.config['SCHEMA_SYNC'] = 'auto'
+    yield apps
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+def test_workers_starting_together_sync_once(workers):
+    start = threading.Barrier(len(workers))
+    statuses, errors = [], []
+
+    def boot(app):
+        with app.app_context():
+            start.wait()
+            try:
+                statuses.append(ensure_schema(app, db))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=boot, args=(app,)) for app in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(statuses) == ['created'] + ['up-to-date'] * (len(workers) - 1)
+    with workers[0].app_context():
+        assert SchemaVersion.query.count() == 1
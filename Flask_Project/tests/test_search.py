@@ -0,0 +1,19 @@
+"""Student search: ranking tiers, and results that follow batch changes."""
+from app.search import search_students
+
+
+def test_exact_number_then_prefix_then_substring(app, school):
+    results = search_students('1')
+    assert [r['roll_no'] for r in results][:1] == ['1']
+    assert results[0]['score'] == 1.0
+    assert [r['name'] for r in search_students('stu')] == ['Stu 1', 'Stu 2']
+
+
+def test_removal_from_a_batch_reaches_search(app, school, login):
+    client = app.test_client()
+    login(client, 'admin')
+    search = lambda: client.get('/admin/students/search?q=stu 1').get_json()['results'][0]['batches']
+    assert [b['id'] for b in search()] == [school['batch']]
+    response = client.delete(f"/admin/batches/{school['batch']}/students/{school['students'][0]}")
+    assert response.status_code == 200
+    assert search() == []
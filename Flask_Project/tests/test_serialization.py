@@ -0,0 +1,48 @@
+"""
+The orjson provider against Flask's default provider: the same response
+bodies for ASCII payloads, the same parsed JSON for non-ASCII text, null for NaN.
+"""
+import json
+import math
+from datetime import date, datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+from app.serialization import FastJSONProvider, orjson
+
+pytestmark = pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+
+PAYLOAD = {
+    'headers': [{'id': '2026-08-01-17-0', 'label': 'Lec no. 1 01-08-2026'}],
+    'students': [{'roll_no': '7', 'name': 'Stu 7', 'percentage': 83.33, 'attendance': {'2026-08-01-17-0': 'P'}}],
+    'generated': datetime(2026, 8, 1, 9, 30),
+    'day': date(2026, 8, 1),
+    'window': {'column_offset': 0, 'column_limit': None, 'total_columns': 1, 'next_offset': None},
+}
+
+
+@pytest.fixture
+def providers(app):
+    return FastJSONProvider(app), DefaultJSONProvider(app)
+
+
+def test_ascii_response_is_byte_identical(app, providers):
+    fast, default = providers
+    with app.test_request_context():
+        assert fast.response(PAYLOAD).get_data() == default.response(PAYLOAD).get_data()
+    # dumps() is compact; the default puts spaces after separators
+    assert json.loads(fast.dumps(PAYLOAD)) == json.loads(default.dumps(PAYLOAD))
+
+
+def test_non_ascii_is_raw_utf8_but_parses_the_same(providers):
+    fast, default = providers
+    payload = {'name': 'Śrēyā Deshmukh'}
+    assert fast.dumps(payload) != default.dumps(payload)
+    assert json.loads(fast.dumps(payload)) == json.loads(default.dumps(payload))
+
+
+def test_nan_becomes_null(providers):
+    fast, default = providers
+    assert fast.dumps({'percentage': math.nan}) == '{"percentage":null}'
+    assert default.dumps({'percentage': math.nan}) == '{"percentage": NaN}'
@@ -0,0 +1,13 @@
+"""/batch: each sub-request runs with fresh per-request state."""
+import logging
+
+
+def test_subrequests_count_their_own_queries(app, school, login, caplog):
+    client = app.test_client()
+    login(client, 'admin')
+    with caplog.at_level(logging.WARNING):
+        response = client.post('/batch', json={'requests': [f"/admin/batches/{school['batch']}"] * 10})
+    assert [r['status'] for r in response.get_json()['responses']] == [200] * 10
+    # Ten sub-requests each running the same few queries are not an N+1 in /batch
+    assert response.headers['X-Query-Count'] == '0'
+    assert 'possible N+1' not in caplog.text
@@ -17,6 +17,7 @@ import { DateRange } from 'react-day-picker';
 import { addDays, format } from 'date-fns';
 import type { Batch, Subject, Department, StaffAssignmentsResponse } from '@/types';
 import { ScrollArea, ScrollBar } from '@/components/ui/scroll-area';
+import { decodeCompactGrid } from '@/lib/compactGrid';
 
 interface SubjectIdentifier {
   id: number;
@@ -179,6 +180,7 @@ export default function HistoricalAttendancePage() {
             start_date: format(dateRange.from, 'yyyy-MM-dd'),
             end_date: format(dateRange.to, 'yyyy-MM-dd'),
             lecture_type: selectedLectureType,
+            format: 'packed',
         });
         if (selectedBatchNumber) {
             params.append('batch_number', selectedBatchNumber);
@@ -187,7 +189,7 @@ export default function HistoricalAttendancePage() {
         const res = await fetch(`/api/historical-attendance?${params.toString()}`);
         const data = await res.json();
         if (!res.ok) throw new Error(data.error || 'Failed to fetch historical data');
-        setHistoricalData(data);
+        setHistoricalData(decodeCompactGrid(data));
     } catch (error: any) {
         toast({ variant: 'destructive', title: 'Error', description: error.message });
         setHistoricalData(null);
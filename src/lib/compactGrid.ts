@@ -0,0 +1,38 @@
+import type { CompactHistoricalAttendanceData } from '@/types';
+
+// Marker for lectures that do not apply to a student (e.g. another PR sub-batch).
+const NOT_APPLICABLE = '-';
+
+/** Expand a run-length string such as "P12A1-3" into "PPPPPPPPPPPPA---". */
+export function expandRuns(runs: string): string {
+  let out = '';
+  const pattern = /([A-Z-])(\d+)/g;
+  let match: RegExpExecArray | null;
+  while ((match = pattern.exec(runs)) !== null) {
+    out += match[1].repeat(Number(match[2]));
+  }
+  return out;
+}
+
+/**
+ * Turn a compact historical grid back into the full layout, where each
+ * student's attendance is keyed by header id. Lectures marked as not
+ * applicable are left out, exactly as in the full response.
+ */
+export function decodeCompactGrid<T extends CompactHistoricalAttendanceData['students'][number]>(
+  data: CompactHistoricalAttendanceData & { students: T[] }
+) {
+  const headerIds = data.headers.map((h) => h.id);
+  const students = data.students.map((student) => {
+    const packed = data.format === 'rle' ? expandRuns(student.attendance) : student.attendance;
+    const attendance: Record<string, 'P' | 'A'> = {};
+    for (let i = 0; i < headerIds.length; i++) {
+      const status = packed[i];
+      if (status && status !== NOT_APPLICABLE) {
+        attendance[headerIds[i]] = status as 'P' | 'A';
+      }
+    }
+    return { ...student, attendance };
+  });
+  return { headers: data.headers, students, window: data.window };
+}
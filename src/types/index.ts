@@ -114,4 +114,33 @@ export interface HistoricalAttendanceData {
     name: string;
     attendance: Record<string, 'P' | 'A' | ''>;
   }[];
+  window?: HistoricalGridWindow;
+}
+
+// Present when the grid was requested with column_offset/column_limit; lecture
+// numbering is over the whole date range, so windows can be appended in order.
+export interface HistoricalGridWindow {
+  column_offset: number;
+  column_limit: number;
+  total_columns: number;
+  next_offset: number | null;
+}
+
+// `format=packed` / `format=rle` responses of the historical attendance endpoint;
+// decode with decodeCompactGrid from '@/lib/compactGrid'.
+export interface CompactHistoricalAttendanceData {
+  format: 'packed' | 'rle';
+  headers: {
+    id: string;
+    label: string;
+  }[];
+  students: {
+    id: number;
+    roll_no: string;
+    enrollment_no: string;
+    name: string;
+    batch_number?: number | null;
+    attendance: string;
+  }[];
+  window?: HistoricalGridWindow;
 }